@@ -0,0 +1,62 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+
+# memory of the optimizer states of Adam against Adafactor (with and without
+# first moment) on a wide MLP. Adam keeps two moving averages of the size of
+# each parameter, Adafactor keeps the row and column means of the second
+# moment of the matrices. The step buffers are the temporary memory of the
+# compiled training step
+
+BATCH_SIZE = 64
+WIDTH = 2048
+DEPTH = 3
+
+x = np.random.randn(BATCH_SIZE, 784).astype('float32')
+y = np.random.randint(0, 10, BATCH_SIZE).astype('int32')
+for name, optimizer in [
+        ('Adam', lambda loss, params: optimizers.Adam(
+            loss, 0.0001, params=params)),
+        ('Adafactor', lambda loss, params: optimizers.Adafactor(
+            loss, 0.01, params=params)),
+        ('Adafactor beta1', lambda loss, params: optimizers.Adafactor(
+            loss, 0.01, beta1=0.9, params=params))]:
+    np.random.seed(0)
+    images = T.Placeholder((BATCH_SIZE, 784), 'float32')
+    labels = T.Placeholder((BATCH_SIZE,), 'int32')
+    layer = [layers.Dense(images, WIDTH)]
+    for i in range(DEPTH - 1):
+        layer.append(layers.Dense(T.relu(layer[-1]), WIDTH))
+    layer.append(layers.Dense(T.relu(layer[-1]), 10))
+    loss = symjax.losses.sparse_crossentropy_logits(labels, layer[-1]).mean()
+    params = sum([lay.variables() for lay in layer], [])
+
+    opt = optimizer(loss, params)
+    train = symjax.function(images, labels, outputs=opt.loss,
+                            updates=opt.updates)
+    losses = [train(x, y) for i in range(10)]
+    t0 = time.time()
+    for i in range(10):
+        train(x, y)
+    parameters = sum(param.value.nbytes for param in params)
+    states = sum(np.asarray(var.value).nbytes for var in opt.variables)
+    executable = list(train.executables.values())[0]
+    temporary = executable.memory_analysis().temp_size_in_bytes
+    print('{:<15} parameters {:5.1f}MB, optimizer states {:5.1f}MB, '
+          'step buffers {:5.1f}MB, {:5.1f}ms per step, loss {:.4f} -> {:.4f}'
+          .format(name, parameters / 2 ** 20, states / 2 ** 20,
+                  temporary / 2 ** 20, 100 * (time.time() - t0), losses[0],
+                  losses[-1]))
+
+# Adam            parameters  38.2MB, optimizer states  76.5MB, step buffers  19.2MB,  79.5ms per step, loss 3.1880 -> 0.0015
+# Adafactor       parameters  38.2MB, optimizer states   0.1MB, step buffers  34.5MB, 111.1ms per step, loss 3.1880 -> 0.0022
+# Adafactor beta1 parameters  38.2MB, optimizer states  38.4MB, step buffers  34.5MB, 120.2ms per step, loss 3.1880 -> 0.0006
+# the optimizer states of Adafactor are the row and column statistics (0.1MB
+# for 38MB of parameters) against twice the parameters for Adam, the first
+# moment adds one copy of the parameters. The step keeps a few more
+# temporaries (for the clipping and the parameter scale) and does more
+# elementwise work, overall 73MB against 134MB for Adam
@@ -0,0 +1,60 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+
+# steps per second of a training loop with synchronous functions (each call
+# waits for its outputs to be transferred to the host) and asynchronous ones
+# (sync=False, the calls are enqueued back to back and the host only waits
+# when the losses are read at the end)
+
+BATCH_SIZE = 64
+STEPS = 200
+
+
+def mlp():
+    x = T.Placeholder((BATCH_SIZE, 784), 'float32')
+    layer = [layers.Dense(x, 256)]
+    layer.append(layers.Dense(T.relu(layer[-1]), 256))
+    layer.append(layers.Dense(T.relu(layer[-1]), 10))
+    return x, layer
+
+
+def convnet():
+    x = T.Placeholder((BATCH_SIZE, 3, 32, 32), 'float32')
+    layer = [layers.Conv2D(x, 32, (3, 3))]
+    layer.append(layers.Pool2D(T.relu(layer[-1]), (2, 2)))
+    layer.append(layers.Conv2D(layer[-1], 64, (3, 3)))
+    layer.append(layers.Pool2D(T.relu(layer[-1]), (2, 2)))
+    layer.append(layers.Dense(layer[-1], 10))
+    return x, layer
+
+
+for name, model in [('mlp', mlp), ('convnet', convnet)]:
+    x, layer = model()
+    y = T.Placeholder((BATCH_SIZE,), 'int32')
+    loss = symjax.losses.sparse_crossentropy_logits(y, layer[-1]).mean()
+    params = sum([lay.variables() for lay in layer], [])
+    updates = optimizers.Adam(loss, 0.001, params=params).updates
+
+    data = np.random.randn(*x.shape).astype('float32')
+    labels = np.random.randint(0, 10, BATCH_SIZE).astype('int32')
+    for sync in [True, False]:
+        train = symjax.function(x, y, outputs=loss, updates=updates,
+                                sync=sync)
+        train(data, labels)
+        t0 = time.time()
+        losses = [train(data, labels) for i in range(STEPS)]
+        losses = np.asarray(losses)
+        print('{} sync={}: {:.0f} steps/s'.format(
+            name, sync, STEPS / (time.time() - t0)))
+
+# on CPU (the device computation and the python dispatch share the cores,
+# the gain is larger on accelerators)
+# mlp sync=True: 353 steps/s
+# mlp sync=False: 373 steps/s
+# convnet sync=True: 7 steps/s
+# convnet sync=False: 6 steps/s
@@ -0,0 +1,64 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import contextlib
+import numpy as np
+import jax
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+
+# peak memory against compute of the gradient checkpointing on a deep 1D
+# convolutional network over long audio clips. The memory is the size of
+# the temporary buffers of the compiled training step (activations kept for
+# the backward pass), the time is the one of a step
+
+# the XLA CPU scheduler computes the recomputations as soon as their inputs
+# are available (undoing the memory savings), they are thus guarded by
+# conditionals on CPU. This makes them much slower than on GPU/TPU where the
+# default lowering is kept
+if jax.default_backend() == 'cpu':
+    jax.config.update('jax_remat_opt_barrier', False)
+
+BATCH_SIZE = 4
+LENGTH = 2 ** 13
+DEPTH = 16
+CHANNELS = 32
+
+
+def build(context):
+    np.random.seed(0)
+    signal = T.Placeholder((BATCH_SIZE, 1, LENGTH), 'float32')
+    with context:
+        layer = [layers.Conv1D(signal, CHANNELS, 3, pad='SAME')]
+        for i in range(DEPTH - 1):
+            layer.append(layers.Conv1D(T.tanh(layer[-1]), CHANNELS, 3,
+                                       pad='SAME'))
+    loss = (layer[-1] ** 2).mean()
+    params = sum([lay.variables() for lay in layer], [])
+    updates = optimizers.SGD(loss, 0.001, params=params).updates
+    return symjax.function(signal, outputs=loss, updates=updates)
+
+
+x = np.random.randn(BATCH_SIZE, 1, LENGTH).astype('float32')
+for name, context in [
+        ('none', contextlib.nullcontext()),
+        ('every layer', layers.checkpointing()),
+        ('every layer, matmul_conv', layers.checkpointing('matmul_conv')),
+        ('every 4 layers', layers.checkpointing(every=4)),
+        ('every 8 layers', layers.checkpointing(every=8))]:
+    train = build(context)
+    loss = train(x)
+    executable = list(train.executables.values())[0]
+    memory = executable.memory_analysis().temp_size_in_bytes
+    t0 = time.time()
+    for i in range(5):
+        train(x)
+    print('{:<26} peak {:7.1f}MB, {:6.1f}ms per step, loss {:.6f}'.format(
+        name, memory / 2 ** 20, 200 * (time.time() - t0), loss))
+
+# none                       peak   128.2MB,  962.1ms per step, loss 0.695869
+# every layer                peak    76.0MB, 5478.5ms per step, loss 0.695869
+# every layer, matmul_conv   peak    76.0MB, 5736.1ms per step, loss 0.695869
+# every 4 layers             peak    52.0MB, 7075.2ms per step, loss 0.695869
+# every 8 layers             peak    76.1MB, 7578.1ms per step, loss 0.695869
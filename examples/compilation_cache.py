@@ -0,0 +1,50 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+
+# persistent compilation cache: run this script twice, the first run compiles
+# the functions and stores the executables, the second one (a warm restart)
+# loads them from disk and skips the compilation
+
+cache = symjax.compilation_cache.initialize('/tmp/symjax_compilation_cache')
+
+BATCH_SIZE = 32
+images = T.Placeholder((BATCH_SIZE, 3, 32, 32), 'float32')
+labels = T.Placeholder((BATCH_SIZE,), 'int32')
+
+layer = [layers.Conv2D(images, 64, (3, 3))]
+for i in range(6):
+    layer.append(layers.Conv2D(T.relu(layer[-1]), 64, (3, 3), pad='SAME'))
+layer.append(layers.Dense(T.relu(layer[-1]), 10))
+
+loss = symjax.losses.sparse_crossentropy_logits(labels, layer[-1]).mean()
+params = sum([lay.variables() for lay in layer], [])
+optimizer = optimizers.Adam(loss, 0.001, params=params)
+
+train = symjax.function(images, labels, outputs=loss,
+                        updates=optimizer.updates)
+test = symjax.function(images, outputs=T.argmax(layer[-1], 1))
+
+x = np.random.randn(BATCH_SIZE, 3, 32, 32).astype('float32')
+y = np.random.randint(0, 10, BATCH_SIZE).astype('int32')
+
+t0 = time.time()
+train(x, y)
+test(x)
+print('first calls (compile or load): {:.2f}s'.format(time.time() - t0))
+print(cache.info())
+
+# first run
+# first calls (compile or load): 2.05s
+# {'hits': 0, 'misses': 2, 'corrupted': 0, 'evictions': 0, 'entries': 2,
+#  'size': 299567, 'max_size': 2147483648, 'compile_time': 0.91...,
+#  'load_time': 0.0}
+# second run (the remaining time is spent tracing the graphs)
+# first calls (compile or load): 1.17s
+# {'hits': 2, 'misses': 0, 'corrupted': 0, 'evictions': 0, 'entries': 2,
+#  'size': 299567, 'max_size': 2147483648, 'compile_time': 0.0,
+#  'load_time': 0.02...}
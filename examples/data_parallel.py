@@ -0,0 +1,57 @@
+import sys
+sys.path.insert(0, "../")
+import os
+import time
+import subprocess
+
+# data parallel training over N virtual CPU devices, the batch is sharded
+# over the devices, the variables replicated and the gradients all-reduced
+# within the step. The number of host devices is fixed when jax starts, each
+# count is thus run in its own process
+
+if len(sys.argv) == 1:
+    for n_devices in [1, 2, 4, 8]:
+        env = dict(os.environ)
+        env['XLA_FLAGS'] = '--xla_force_host_platform_device_count={}'.format(
+            n_devices)
+        subprocess.run([sys.executable, __file__, str(n_devices)], env=env)
+    sys.exit()
+
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+
+N_DEVICES = int(sys.argv[1])
+BATCH_SIZE = 256
+STEPS = 20
+
+images = T.Placeholder((BATCH_SIZE, 3, 32, 32), 'float32')
+labels = T.Placeholder((BATCH_SIZE,), 'int32')
+layer = [layers.Conv2D(images, 32, (3, 3))]
+layer.append(layers.Pool2D(T.relu(layer[-1]), (2, 2)))
+layer.append(layers.Conv2D(layer[-1], 64, (3, 3)))
+layer.append(layers.Pool2D(T.relu(layer[-1]), (2, 2)))
+layer.append(layers.Dense(layer[-1], 10))
+loss = symjax.losses.sparse_crossentropy_logits(labels, layer[-1]).mean()
+params = sum([lay.variables() for lay in layer], [])
+updates = optimizers.SGD(loss, 0.01, params=params).updates
+
+train = symjax.function(images, labels, outputs=loss, updates=updates,
+                        data_parallel=N_DEVICES)
+
+x = np.random.randn(BATCH_SIZE, 3, 32, 32).astype('float32')
+y = np.random.randint(0, 10, BATCH_SIZE).astype('int32')
+train(x, y)
+t0 = time.time()
+for i in range(STEPS):
+    train(x, y)
+print('{} devices: {:.2f} steps/s'.format(N_DEVICES,
+                                         STEPS / (time.time() - t0)))
+
+# on a sandbox with a single physical core the virtual devices share it, the
+# throughput stays flat (the numbers scale with the physical cores)
+# 1 devices: 2.10 steps/s
+# 2 devices: 2.14 steps/s
+# 4 devices: 1.97 steps/s
+# 8 devices: 2.28 steps/s
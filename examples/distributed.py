@@ -0,0 +1,61 @@
+import sys
+sys.path.insert(0, "../")
+import os
+import time
+import numpy as np
+
+# multi-process data parallel training on one machine: the script launches
+# itself in 1, 2 and 4 processes, each process initializes its parameters
+# with its own seed (they are broadcasted from the rank 0) and trains on its
+# rows of the global batch. The losses are the same whatever the number of
+# processes, the variables stay in sync across the processes
+
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+import symjax.distributed as dist
+
+if 'SYMJAX_PROCESS_ID' not in os.environ:
+    for n_processes in [1, 2, 4]:
+        dist.launch(__file__, num_processes=n_processes)
+    sys.exit()
+
+dist.initialize()
+np.random.seed(dist.rank())
+
+GLOBAL_BATCH_SIZE = 64
+STEPS = 20
+
+images = T.Placeholder((GLOBAL_BATCH_SIZE, 784), 'float32')
+labels = T.Placeholder((GLOBAL_BATCH_SIZE,), 'int32')
+layer = [layers.Dense(images, 256)]
+layer.append(layers.Dense(T.relu(layer[-1]), 10))
+loss = symjax.losses.sparse_crossentropy_logits(labels, layer[-1]).mean()
+params = sum([lay.variables() for lay in layer], [])
+optimizer = dist.DistributedOptimizer(
+    optimizers.Adam(loss, 0.001, params=params))
+
+train = dist.function(images, labels, outputs=loss,
+                      updates=optimizer.updates)
+
+data = np.random.RandomState(0)
+x = data.randn(GLOBAL_BATCH_SIZE, 784).astype('float32')
+y = data.randint(0, 10, GLOBAL_BATCH_SIZE).astype('int32')
+local_x, local_y = dist.shard(x, y)
+
+losses = [train(local_x, local_y)]
+t0 = time.time()
+for i in range(STEPS):
+    losses.append(train(local_x, local_y))
+elapsed = time.time() - t0
+synced = dist.in_sync(params)
+if dist.rank() == 0:
+    print('{} processes: first loss {:.6f}, last loss {:.6f}, {:.1f} steps/s'
+          ', in sync: {}'.format(dist.size(), losses[0], losses[-1],
+                                STEPS / elapsed, synced))
+
+# on a sandbox with a single physical core the processes share it and the
+# gloo collectives dominate the step time of this small network
+# 1 processes: first loss 2.978279, last loss 0.000483, 936.5 steps/s, in sync: True
+# 2 processes: first loss 2.978280, last loss 0.000483, 28.4 steps/s, in sync: True
+# 4 processes: first loss 2.978280, last loss 0.000483, 13.7 steps/s, in sync: True
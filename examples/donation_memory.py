@@ -0,0 +1,54 @@
+import sys
+sys.path.insert(0, "../")
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+
+# device memory of an Adam training step with and without donation of the
+# buffers of the updated variables (parameters and Adam moments). Without
+# donation the step holds both the old and the new values, with donation the
+# updates are written in place of the old values, the buffers of the old
+# values are then invalidated
+
+BATCH_SIZE = 64
+x = T.Placeholder((BATCH_SIZE, 1024), 'float32')
+y = T.Placeholder((BATCH_SIZE,), 'int32')
+layer = [layers.Dense(x, 2048)]
+layer.append(layers.Dense(T.relu(layer[-1]), 2048))
+layer.append(layers.Dense(T.relu(layer[-1]), 10))
+loss = symjax.losses.sparse_crossentropy_logits(y, layer[-1]).mean()
+params = sum([lay.variables() for lay in layer], [])
+updates = optimizers.Adam(loss, 0.001, params=params).updates
+
+state = sum(var.value.nbytes for var in updates)
+print('parameters and optimizer state: {:.1f}MB'.format(state / 2 ** 20))
+
+data = np.random.randn(BATCH_SIZE, 1024).astype('float32')
+labels = np.random.randint(0, 10, BATCH_SIZE).astype('int32')
+for donate in [False, True]:
+    train = symjax.function(x, y, outputs=loss, updates=updates,
+                            donate=donate)
+    train(data, labels)
+    previous = [var.value for var in updates]
+    train(data, labels)
+    deleted = [value.is_deleted() for value in previous]
+    assert all(deleted) if donate else not any(deleted)
+    executable = list(train.executables.values())[0]
+    stats = executable.memory_analysis()
+    assert (stats.alias_size_in_bytes >= state) == donate
+    peak = stats.argument_size_in_bytes + stats.output_size_in_bytes +\
+        stats.temp_size_in_bytes - stats.alias_size_in_bytes
+    print('donate={}: arguments {:.1f}MB, outputs {:.1f}MB, aliased {:.1f}MB'
+          ', peak {:.1f}MB'.format(
+              donate, stats.argument_size_in_bytes / 2 ** 20,
+              stats.output_size_in_bytes / 2 ** 20,
+              stats.alias_size_in_bytes / 2 ** 20, peak / 2 ** 20))
+    print('donate={}: previous values invalidated: {}'.format(
+        donate, all(deleted)))
+
+# parameters and optimizer state: 72.3MB
+# donate=False: arguments 72.5MB, outputs 72.3MB, aliased 0.0MB, peak 146.3MB
+# donate=False: previous values invalidated: False
+# donate=True: arguments 72.5MB, outputs 72.3MB, aliased 72.3MB, peak 90.7MB
+# donate=True: previous values invalidated: True
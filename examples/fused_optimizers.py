@@ -0,0 +1,57 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+
+# compilation and step time of the optimizers on a 200 layers network (400
+# parameters) with one update per parameter against the fused updates on
+# flat buffers of all the parameters and optimizer states (SGD has no state
+# and no fused option)
+
+DEPTH = 200
+WIDTH = 32
+BATCH_SIZE = 16
+
+x = np.random.randn(BATCH_SIZE, WIDTH).astype('float32')
+for name, optimizer in [
+        ('Nesterov', lambda loss, params, fused: optimizers.NesterovMomentum(
+            loss, 0.001, 0.9, params=params, fused=fused)),
+        ('Adam', lambda loss, params, fused: optimizers.Adam(
+            loss, 0.001, params=params, fused=fused))]:
+    for fused in [False, True]:
+        np.random.seed(0)
+        inputs = T.Placeholder((BATCH_SIZE, WIDTH), 'float32')
+        layer = [layers.Dense(inputs, WIDTH)]
+        for i in range(DEPTH - 1):
+            layer.append(layers.Dense(T.tanh(layer[-1]), WIDTH))
+        loss = (layer[-1] ** 2).mean()
+        params = sum([lay.variables() for lay in layer], [])
+
+        t0 = time.time()
+        opt = optimizer(loss, params, fused)
+        train = symjax.function(inputs, outputs=opt.loss,
+                                updates=opt.updates)
+        build = time.time() - t0
+        t0 = time.time()
+        train(x)
+        compile_time = time.time() - t0
+        t0 = time.time()
+        for i in range(100):
+            value = train(x)
+        print('{:<9} fused={:<5} graph {:5.2f}s, compilation {:5.2f}s, '
+              '{:5.2f}ms per step, {:3} updated variables, loss {:.6f}'.format(
+                  name, str(fused), build, compile_time,
+                  10 * (time.time() - t0), len(opt.updates), value))
+
+# Nesterov  fused=False graph  1.49s, compilation 73.59s,  9.93ms per step, 800 updated variables, loss 0.014538
+# Nesterov  fused=True  graph  1.47s, compilation 29.20s,  8.41ms per step, 401 updated variables, loss 0.014538
+# Adam      fused=False graph  2.92s, compilation 69.52s,  9.86ms per step, 1201 updated variables, loss 0.000118
+# Adam      fused=True  graph  1.33s, compilation 23.95s,  6.25ms per step, 403 updated variables, loss 0.000118
+# same losses with and without fusion. The optimizers with states (Nesterov,
+# Adam) compile 2.5-3x faster and step faster since their states are a few
+# flat buffers. Fusing SGD, which has no state to pack, only added the copies
+# of the flat gradient (compilation 27.52s against 21.07s, 6.50ms per step
+# against 5.29ms), SGD therefore has no fused option
@@ -0,0 +1,55 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+
+# trace and compile time of a function with and without the graph passes.
+# The graph contains a constant filterbank (folded once at construction)
+# and the batch statistics of a normalization computed several times
+# (merged by the common subexpression elimination)
+
+BATCH_SIZE = 16
+signal = T.Placeholder((BATCH_SIZE, 128, 256), 'float32')
+
+outputs = []
+for i in range(8):
+    filterbank = T.signal.mel_filterbank(256, 64, 20, 8000, 8000)
+    spectrum = T.dot(signal ** 2, T.transpose(filterbank))
+    mean = T.mean(spectrum, (0, 1), keepdims=True)
+    var = T.var(spectrum, (0, 1), keepdims=True)
+    normalized = (spectrum - T.mean(spectrum, (0, 1), keepdims=True)) /\
+        T.sqrt(T.var(spectrum, (0, 1), keepdims=True) + 1e-4)
+    outputs.append((normalized * 1 + mean * var).sum())
+loss = T.stack(outputs).sum()
+
+x = np.random.randn(BATCH_SIZE, 128, 256).astype('float32')
+for passes in [[], None]:
+    t0 = time.time()
+    f = symjax.function(signal, outputs=loss, passes=passes)
+    t1 = time.time()
+    value = f(x)
+    t2 = time.time()
+    for i in range(10):
+        f(x)
+    t3 = time.time()
+    print('passes: {}'.format('none' if passes == [] else 'default'))
+    print(f.report)
+    print('construction {:.3f}s, trace+compile {:.3f}s, run {:.4f}s'.format(
+        t1 - t0, t2 - t1, (t3 - t2) / 10))
+    print('output', value)
+
+# passes: none
+# construction 0.087s, trace+compile 0.597s, run 0.0016s
+# passes: default
+# pass                  before   after   time (ms)
+# value_and_gradients      435     435        0.24
+# cse                      435      55        3.30
+# simplify                  55      54        0.32
+# constant_folding          54      15      109.62
+# dce                       15      15        0.09
+# removed 420 nodes out of 435
+# construction 0.121s, trace+compile 0.131s, run 0.0016s
+# the constant subgraph (the filterbanks) is evaluated in a single jitted
+# call, folding it op by op took 547ms
@@ -0,0 +1,40 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers
+
+# largest eigenvalue of the hessian of a loss w.r.t. the parameters of an
+# MLP by power iteration, the hessian (here 42k x 42k) is never materialized,
+# each iteration costs one hessian-vector product (about two gradients)
+
+np.random.seed(0)
+x = T.Placeholder((128, 64), 'float32')
+y = T.Placeholder((128,), 'int32')
+layer = [layers.Dense(x, 256)]
+layer.append(layers.Dense(T.tanh(layer[-1]), 100))
+loss = symjax.losses.sparse_crossentropy_logits(y, layer[-1]).mean()
+params = sum([lay.variables() for lay in layer], [])
+print('number of parameters:', sum(np.prod(p.shape) for p in params))
+
+vectors = [T.Placeholder(p.shape, 'float32') for p in params]
+hvp = symjax.hessian_vector_product(loss, params, vectors)
+f = symjax.function(x, y, *vectors, outputs=list(hvp))
+
+data = np.random.randn(128, 64).astype('float32')
+labels = np.random.randint(0, 100, 128).astype('int32')
+v = [np.random.randn(*p.shape).astype('float32') for p in params]
+t0 = time.time()
+for i in range(50):
+    norm = np.sqrt(sum((u ** 2).sum() for u in v))
+    v = [u / norm for u in v]
+    hv = f(data, labels, *v)
+    eigenvalue = sum((a * b).sum() for a, b in zip(v, hv))
+    v = hv
+print('largest eigenvalue {:.4f} ({:.2f}ms per product)'.format(
+    eigenvalue, 1000 * (time.time() - t0) / 50))
+
+# number of parameters: 42340
+# largest eigenvalue 0.3393 (5.24ms per product)
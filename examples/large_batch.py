@@ -0,0 +1,84 @@
+import sys
+sys.path.insert(0, "../")
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers, schedules
+
+# convergence of momentum SGD, Adam, LARS and LAMB on a subset of CIFAR-10
+# when the batch size grows for a fixed number of epochs (thus fewer steps).
+# The learning rates are scaled with the batch size (linearly for SGD and
+# LARS, with its square root for Adam and LAMB) and divided by 10 for the
+# last third of the training with a PiecewiseConstant schedule. LARS and
+# LAMB do not adapt the biases and the BatchNormalization parameters
+
+N_TRAIN = 10000
+N_TEST = 2000
+EPOCHS = 10
+
+images_train, labels_train, images_test, labels_test =\
+    symjax.datasets.cifar10.load()
+images_train = images_train[:N_TRAIN] / 255.
+labels_train = labels_train[:N_TRAIN].astype('int32')
+images_test = images_test[:N_TEST] / 255.
+labels_test = labels_test[:N_TEST].astype('int32')
+
+OPTIMIZERS = {
+    'nesterov': (0.01, 1., lambda loss, lr, params:
+                 optimizers.NesterovMomentum(loss, lr, 0.9, params=params)),
+    'adam': (0.001, 0.5, lambda loss, lr, params:
+             optimizers.Adam(loss, lr, params=params)),
+    'lars': (1., 1., lambda loss, lr, params:
+             optimizers.LARS(loss, lr, weight_decay=5e-4, params=params)),
+    'lamb': (0.002, 0.5, lambda loss, lr, params:
+             optimizers.LAMB(loss, lr, weight_decay=0.01, params=params))}
+train_mode, test_mode = np.array([False]), np.array([True])
+
+
+def run(name, batch_size):
+    base_lr, power, optimizer = OPTIMIZERS[name]
+    np.random.seed(0)
+    images = T.Placeholder((batch_size, 3, 32, 32), 'float32')
+    labels = T.Placeholder((batch_size,), 'int32')
+    deterministic = T.Placeholder((1,), 'bool')
+    layer = [images]
+    for n_filters in [32, 64]:
+        layer.append(layers.Conv2D(layer[-1], n_filters, (3, 3), pad='SAME'))
+        layer.append(layers.BatchNormalization(layer[-1], [0, 2, 3],
+                                               deterministic))
+        layer.append(layers.Pool2D(T.relu(layer[-1]), (2, 2)))
+    layer.append(layers.Dense(layer[-1], 10))
+
+    loss = symjax.losses.sparse_crossentropy_logits(labels, layer[-1]).mean()
+    accuracy = symjax.losses.accuracy(labels, layer[-1])
+    params = sum([lay.variables() for lay in layer[1:]], [])
+
+    steps = EPOCHS * (N_TRAIN // batch_size)
+    lr = base_lr * (batch_size / 32) ** power
+    schedule = schedules.PiecewiseConstant(lr, {2 * steps // 3: lr / 10})
+    opt = optimizer(loss, schedule, params)
+    updates = dict(opt.updates)
+    for lay in layer[1:]:
+        updates.update(lay.updates)
+    train = symjax.function(images, labels, deterministic, outputs=loss,
+                            updates=updates)
+    test = symjax.function(images, labels, deterministic, outputs=accuracy)
+
+    for epoch in range(EPOCHS):
+        losses = list()
+        for x, y in symjax.utils.batchify(images_train, labels_train,
+                                          batch_size=batch_size,
+                                          option='random_see_all'):
+            losses.append(train(x, y, train_mode))
+            schedule.update()
+    accuracies = [test(x, y, test_mode) for x, y in symjax.utils.batchify(
+        images_test, labels_test, batch_size=batch_size,
+        option='continuous')]
+    return np.mean(losses), np.mean(accuracies)
+
+
+for batch_size in [32, 128, 512]:
+    for name in OPTIMIZERS:
+        loss, accuracy = run(name, batch_size)
+        print('batch {:3} {:<8} train loss {:.3f}, test accuracy {:.3f}'
+              .format(batch_size, name, loss, accuracy))
@@ -0,0 +1,57 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+
+# gradient accumulation: a batch of 128 images is either computed at once or
+# split in microbatches within the compiled step, the gradients being
+# accumulated by a scan and the optimizer update applied once. The memory is
+# the size of the temporary buffers of the compiled step
+
+BATCH_SIZE = 128
+
+
+def build(microbatches):
+    np.random.seed(0)
+    size = BATCH_SIZE // microbatches
+    images = T.Placeholder((size, 3, 32, 32), 'float32')
+    labels = T.Placeholder((size,), 'int32')
+    layer = [layers.Conv2D(images, 32, (3, 3), pad='SAME')]
+    layer.append(layers.Pool2D(T.relu(layer[-1]), (2, 2)))
+    layer.append(layers.Conv2D(layer[-1], 64, (3, 3), pad='SAME'))
+    layer.append(layers.Pool2D(T.relu(layer[-1]), (2, 2)))
+    layer.append(layers.Dense(layer[-1], 10))
+    loss = symjax.losses.sparse_crossentropy_logits(labels, layer[-1]).mean()
+    params = sum([lay.variables() for lay in layer], [])
+    opt = optimizers.Adam(loss, 0.001, params=params)
+    return symjax.function(images, labels, outputs=opt.loss,
+                           updates=opt.updates,
+                           microbatches=None if microbatches == 1 else
+                           microbatches)
+
+
+x = np.random.randn(BATCH_SIZE, 3, 32, 32).astype('float32')
+y = np.random.randint(0, 10, BATCH_SIZE).astype('int32')
+for microbatches in [1, 4, 16]:
+    train = build(microbatches)
+    losses = [train(x, y) for i in range(3)]
+    executable = list(train.executables.values())[0]
+    memory = executable.memory_analysis().temp_size_in_bytes
+    t0 = time.time()
+    for i in range(5):
+        train(x, y)
+    print('{:2} microbatches of {:3}: peak {:6.1f}MB, {:6.1f}ms per step, '
+          'losses {}'.format(microbatches, BATCH_SIZE // microbatches,
+                             memory / 2 ** 20, 200 * (time.time() - t0),
+                             np.round(losses, 5)))
+
+#  1 microbatches of 128: peak  120.0MB,  452.8ms per step, losses [2.45905 2.43363 2.90089]
+#  4 microbatches of  32: peak   35.6MB, 3387.6ms per step, losses [2.45905 2.43363 2.90089]
+# 16 microbatches of   8: peak   10.2MB, 3457.1ms per step, losses [2.45905 2.43363 2.90089]
+# the training is unchanged and the memory of the activations scales with the
+# microbatch size. The XLA CPU backend runs the convolutions within a loop
+# (the scan) much slower than at the top level (see multistep.py), this
+# overhead is specific to CPU
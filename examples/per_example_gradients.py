@@ -0,0 +1,91 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers
+
+# per example gradients of an MLP: a python loop compiling the gradient of a
+# single example and calling it for each example, against a single function
+# computing all of them (or only their clipped sum, as in DP-SGD). The
+# times are averaged over REPEATS calls
+
+BATCH_SIZE = 64
+REPEATS = 20
+np.random.seed(0)
+x = T.Placeholder((BATCH_SIZE, 128), 'float32')
+y = T.Placeholder((BATCH_SIZE,), 'int32')
+layer = [layers.Dense(x, 256)]
+layer.append(layers.Dense(T.relu(layer[-1]), 10))
+params = sum([lay.variables() for lay in layer], [])
+losses = symjax.losses.sparse_crossentropy_logits(y, layer[-1])
+
+data = np.random.randn(BATCH_SIZE, 128).astype('float32')
+labels = np.random.randint(0, 10, BATCH_SIZE).astype('int32')
+
+# python loop over the examples
+index = T.Placeholder((), 'int32')
+loop = symjax.function(x, y, index, outputs=list(symjax.gradients(
+    T.take(losses, index), params)))
+loop(data, labels, 0)
+t0 = time.time()
+for i in range(REPEATS):
+    reference = [loop(data, labels, i) for i in range(BATCH_SIZE)]
+print('python loop: {:.1f}ms'.format(1000 * (time.time() - t0) / REPEATS))
+
+# all the per example gradients at once
+grads = symjax.per_example_gradients(losses, params)
+f = symjax.function(x, y, outputs=list(grads))
+f(data, labels)
+t0 = time.time()
+for i in range(REPEATS):
+    per_example = f(data, labels)
+print('per_example_gradients: {:.1f}ms, shapes {}, max error {:.1e}'.format(
+    1000 * (time.time() - t0) / REPEATS, [g.shape for g in per_example],
+    max(np.abs(g[i] - r).max() for i, ref in enumerate(reference)
+        for g, r in zip(per_example, ref))))
+
+# only the sum of the clipped per example gradients
+clipped = symjax.per_example_gradients(losses, params, clip_norm=1.,
+                                       aggregate='sum')
+g = symjax.function(x, y, outputs=list(clipped))
+g(data, labels)
+t0 = time.time()
+for i in range(REPEATS):
+    clipped_sum = g(data, labels)
+norms = np.sqrt(sum((p.reshape((BATCH_SIZE, -1)) ** 2).sum(1)
+                    for p in per_example))
+expected = [(p * np.minimum(1, 1 / norms).reshape((-1,) + (1,) * (p.ndim - 1))
+             ).sum(0) for p in per_example]
+print('clipped sum: {:.1f}ms, max error {:.1e}'.format(
+    1000 * (time.time() - t0) / REPEATS,
+    max(np.abs(a - b).max() for a, b in zip(clipped_sum, expected))))
+
+# a convolutional network, the convolution output is flattened (reshaped to
+# the batch size) before the dense layer
+images = T.Placeholder((BATCH_SIZE, 1, 12, 12), 'float32')
+conv = layers.Conv2D(images, 8, (3, 3))
+dense = layers.Dense(T.relu(conv), 10)
+conv_params = conv.variables() + dense.variables()
+conv_losses = symjax.losses.sparse_crossentropy_logits(y, dense)
+conv_grads = symjax.function(images, y, outputs=list(
+    symjax.per_example_gradients(conv_losses, conv_params)))
+conv_loop = symjax.function(images, y, index, outputs=list(
+    symjax.gradients(T.take(conv_losses, index), conv_params)))
+conv_data = np.random.randn(BATCH_SIZE, 1, 12, 12).astype('float32')
+per_example = conv_grads(conv_data, labels)
+error = max(np.abs(g[i] - r).max() for i in range(BATCH_SIZE)
+            for g, r in zip(per_example, conv_loop(conv_data, labels, i)))
+print('conv per_example_gradients: shapes {}, max error {:.1e}'.format(
+    [g.shape for g in per_example], error))
+assert error < 1e-5
+
+
+# python loop: 22.4ms
+# per_example_gradients: 5.8ms, shapes [(64, 128, 256), (64, 256), (64, 256, 10), (64, 10)], max error 0.0e+00
+# clipped sum: 10.3ms, max error 1.2e-07
+# conv per_example_gradients: shapes [(64, 8, 1, 3, 3), (64, 8), (64, 800, 10), (64, 10)], max error 4.2e-07
+# each example costs a backward pass of a single example. The clipped sum
+# also computes the norm of every per example gradient, which reads them all
+# once more
@@ -0,0 +1,56 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers
+
+# the random tensors (dropout masks, augmentation) are sampled within the
+# compiled function from the rng state variable, which the function
+# advances at each call: there is no host side sampling or transfer and the
+# samples are reproducible given a seed
+
+BATCH_SIZE = 64
+
+images = T.Placeholder((BATCH_SIZE, 3, 32, 32), 'float32')
+deterministic = T.Placeholder((1,), 'bool')
+layer = [layers.RandomCrop(images, (3, 28, 28), deterministic,
+                                   padding=(0, 2, 2))]
+layer.append(layers.Dense(layer[-1], 512))
+layer.append(layers.Dropout(T.relu(layer[-1]), 0.5, deterministic))
+layer.append(layers.Dense(layer[-1], 10))
+f = symjax.function(images, deterministic, outputs=layer[-1])
+
+x = np.random.randn(BATCH_SIZE, 3, 32, 32).astype('float32')
+train = np.array([False])
+
+T.random.seed(0)
+first = [f(x, train) for i in range(3)]
+T.random.seed(0)
+second = [f(x, train) for i in range(3)]
+print('reproducible from the seed:',
+      all(np.array_equal(a, b) for a, b in zip(first, second)))
+print('new samples at each call:', not np.array_equal(first[0], first[1]))
+
+# the eager evaluation of a random tensor also advances the rng state
+noise = T.random.normal((4,))
+T.random.seed(0)
+eager = [noise.get() for i in range(2)]
+T.random.seed(0)
+print('new samples at each get, reproducible from the seed:',
+      not np.array_equal(eager[0], eager[1]) and
+      np.array_equal(eager[0], noise.get()))
+
+f(x, train)
+t0 = time.time()
+for i in range(100):
+    f(x, train)
+print('{:.2f}ms per call'.format(10 * (time.time() - t0)))
+
+# reproducible from the seed: True
+# new samples at each call: True
+# new samples at each get, reproducible from the seed: True
+# 2.39ms per call
+# (3.39ms per call when the masks and crops were sampled on the host and fed
+# to the compiled function, and the samples were not reproducible)
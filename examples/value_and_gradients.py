@@ -0,0 +1,44 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+
+# a training step returning the loss and updating the parameters from its
+# gradients: with the value_and_gradients pass the loss is an output of the
+# node computing the gradients and the forward pass is traced once, without
+# it the forward pass is traced twice (once for the loss, once inside the
+# gradients) and left to XLA to merge. Each variant is measured twice
+
+BATCH_SIZE = 32
+x = T.Placeholder((BATCH_SIZE, 256), 'float32')
+y = T.Placeholder((BATCH_SIZE,), 'int32')
+layer = [layers.Dense(x, 256)]
+for i in range(20):
+    layer.append(layers.Dense(T.tanh(layer[-1]), 256))
+layer.append(layers.Dense(T.tanh(layer[-1]), 10))
+loss = symjax.losses.sparse_crossentropy_logits(y, layer[-1]).mean()
+params = sum([lay.variables() for lay in layer], [])
+updates = optimizers.SGD(loss, 0.001, params=params).updates
+
+data = np.random.randn(BATCH_SIZE, 256).astype('float32')
+labels = np.random.randint(0, 10, BATCH_SIZE).astype('int32')
+for name, passes in 2 * [('two forward passes', ['cse', 'simplify', 'dce']),
+                     ('value_and_gradients', None)]:
+    train = symjax.function(x, y, outputs=loss, updates=updates,
+                            passes=passes)
+    t0 = time.time()
+    jitargs = [data, labels] + [var.value for var in train.input_variables]
+    lowered = train.jitfn.lower(*jitargs)
+    t1 = time.time()
+    compiled = lowered.compile()
+    t2 = time.time()
+    print('{}: trace {:.3f}s, compile {:.3f}s, HLO {} lines ({} after XLA)'
+          .format(name, t1 - t0, t2 - t1, len(lowered.as_text().split('\n')),
+                  len(compiled.as_text().split('\n'))))
+
+# (second round, the first one includes the warm up of jax)
+# two forward passes: trace 0.183s, compile 0.840s, HLO 845 lines (1398 after XLA)
+# value_and_gradients: trace 0.235s, compile 0.857s, HLO 705 lines (1398 after XLA)
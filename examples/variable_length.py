@@ -0,0 +1,37 @@
+import sys
+sys.path.insert(0, "../")
+import time
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers
+
+# functions on inputs with unknown (None) dimensions: variable length audio
+# clips and a smaller final batch are given to the same function. Without
+# buckets one executable is compiled per shape, with buckets the inputs are
+# padded and the outputs sliced back, bounding the number of compilations
+
+signal = T.Placeholder((None, 1, None), 'float32')
+layer = [layers.Conv1D(signal, 16, 64, stride=16)]
+layer.append(layers.Conv1D(T.relu(layer[-1]), 16, 3, pad='SAME'))
+frames = T.relu(layer[-1]).mean(1)
+
+np.random.seed(0)
+lengths = np.random.randint(4000, 16000, 50)
+batch_sizes = [32] * 49 + [7]
+clips = [np.random.randn(b, 1, n).astype('float32')
+         for b, n in zip(batch_sizes, lengths)]
+
+for buckets in [None, [8, 32, 4096, 8192, 16384]]:
+    f = symjax.function(signal, outputs=frames, buckets=buckets)
+    t0 = time.time()
+    for clip in clips:
+        out = f(clip)
+    print('buckets: {}'.format(buckets))
+    print('time {:.2f}s, {} compilations, last output {}'.format(
+        time.time() - t0, sum(f.compilations.values()), out.shape))
+
+# buckets: None
+# time 3.85s, 50 compilations, last output (7, 942)
+# buckets: [8, 32, 4096, 8192, 16384]
+# time 0.98s, 3 compilations, last output (7, 942)
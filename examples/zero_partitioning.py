@@ -0,0 +1,79 @@
+import sys
+sys.path.insert(0, "../")
+import os
+import subprocess
+
+# data parallel training on a virtual mesh of 4 CPU devices with the Adam
+# states replicated on every device, partitioned over the devices (each
+# device updates its block of the moving averages, the new parameters are
+# gathered) and with the gradients partitioned as well. The losses and the
+# parameters match the unpartitioned training while each device only holds
+# a quarter of the optimizer states
+
+if 'XLA_FLAGS' not in os.environ:
+    env = dict(os.environ)
+    env['XLA_FLAGS'] = '--xla_force_host_platform_device_count=4'
+    sys.exit(subprocess.run([sys.executable, __file__], env=env).returncode)
+
+import numpy as np
+import symjax
+import symjax.tensor as T
+from symjax import layers, optimizers
+
+BATCH_SIZE = 32
+STEPS = 5
+
+
+def train(partition):
+    np.random.seed(0)
+    images = T.Placeholder((BATCH_SIZE, 3, 16, 16), 'float32')
+    labels = T.Placeholder((BATCH_SIZE,), 'int32')
+    layer = [layers.Conv2D(images, 32, (3, 3))]
+    layer.append(layers.Pool2D(T.relu(layer[-1]), (2, 2)))
+    layer.append(layers.Dense(layer[-1], 1024))
+    layer.append(layers.Dense(T.relu(layer[-1]), 10))
+    loss = symjax.losses.sparse_crossentropy_logits(labels, layer[-1]).mean()
+    params = sum([lay.variables() for lay in layer], [])
+    opt = optimizers.Adam(loss, 0.001, params=params, partition=partition)
+    f = symjax.function(images, labels, outputs=loss, updates=opt.updates,
+                        data_parallel=True)
+    data = np.random.RandomState(1)
+    x = data.randn(BATCH_SIZE, 3, 16, 16).astype('float32')
+    y = data.randint(0, 10, BATCH_SIZE).astype('int32')
+    losses = [f(x, y) for i in range(STEPS)]
+    usage = symjax.sharding.device_bytes([var.value for var in opt.variables])
+    return losses, [np.asarray(p.value) for p in params], usage, opt.variables
+
+
+losses, values, usage, states = train(None)
+total = sum(var.value.nbytes for var in states)
+print('replicated states: {:.2f}MB per device'.format(
+    max(usage.values()) / 2 ** 20))
+assert min(usage.values()) == total
+for partition in ['states', 'gradients']:
+    partitioned_losses, partitioned_values, usage, states = train(partition)
+    # the same training, each device holding a quarter of every partitioned
+    # state (only the step counter is replicated)
+    assert np.allclose(losses, partitioned_losses, atol=1e-6)
+    assert all(np.allclose(a, b, atol=1e-6)
+               for a, b in zip(values, partitioned_values))
+    for var in states:
+        if var.sharding is not None:
+            assert all(4 * shard.data.size == var.value.size
+                       for shard in var.value.addressable_shards)
+    assert max(usage.values()) < 0.26 * total
+    print('partition={:<9}: {:.2f}MB per device, max difference of the '
+          'losses {:.2e} and parameters {:.2e}'.format(
+              partition, max(usage.values()) / 2 ** 20,
+              np.abs(np.array(losses) - np.array(partitioned_losses)).max(),
+              max(np.abs(a - b).max()
+                  for a, b in zip(values, partitioned_values))))
+print('losses', np.round(losses, 5))
+
+# replicated states: 12.34MB per device
+# partition=states   : 3.09MB per device, max difference of the losses 0.00e+00 and parameters 0.00e+00
+# partition=gradients: 3.09MB per device, max difference of the losses 0.00e+00 and parameters 0.00e+00
+# losses [2.58643 2.8144  3.32814 3.59684 3.12177]
+# the XLA CPU backend implements the reduce-scatter of the partitioned
+# gradients as an all-reduce followed by a slice per device, GPU and TPU
+# backends combine them in a single reduce-scatter
@@ -30,6 +30,8 @@ setuptools.setup(
 
      packages=setuptools.find_packages(),
 
+     install_requires=['jax>=0.4.30', 'jaxlib>=0.4.30', 'numpy>=1.22'],
+
      classifiers=[
          "Natural Language :: English",
 
@@ -13,6 +13,10 @@ __all__ = [
     "initializers",
     "layers",
     "schedules",
-    "optimizers"]
+    "optimizers",
+    "compilation_cache",
+    "distributed",
+    "sharding",
+    "precision"]
 
 from . import *
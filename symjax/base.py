@@ -5,9 +5,13 @@
 import jax
 import jax.numpy as np
 import warnings
+import copy
 import numpy
+from collections import OrderedDict
 
 from symjax import tensor as t
+from symjax import compilation_cache
+from symjax import sharding
 from jax import jacfwd, jacrev
 
 global current_graph
@@ -56,8 +60,52 @@ class Graph:
         for var in self.variables:
             var.reset()
 
-def gradients(scalar, variables):
-    """Compute the gradients of a scalar w.r.t to a given list of variables.
+def _graph_function(outputs, variables):
+    """the jax function computing the outputs from all their roots (and the
+    given variables), the roots and the positions of the variables in them"""
+    # get all the roots of the outputs, this is needed as otherwise they are
+    # not as the input of the function and thus a change of their value will
+    # not change the derivative computation, we also ensure uniqueness
+    all_roots = list(set(t.getroots(outputs) + list(variables)))
+
+    # get the argnum of the variables that we differentiate one
+    argnums = [all_roots.index(var) for var in variables]
+
+    # the evaluation schedule is computed once here
+    executor = t.Executor(outputs, all_roots)
+    executor.optimize(t.passes.NESTED_PASSES)
+
+    def fn(*args):
+        return executor(*args)
+
+    return all_roots, argnums, fn
+
+
+def _of_variables(fn, roots, argnums):
+    """fn as a function of the variables only, the other roots being fixed
+    to the given values"""
+    def variables_fn(*variables):
+        args = list(roots)
+        for argnum, variable in zip(argnums, variables):
+            args[argnum] = variable
+        return fn(*args)
+    return variables_fn
+
+
+def _as_list(variables):
+    if isinstance(variables, t.Tensor):
+        return [variables], False
+    return list(variables), True
+
+
+def value_and_gradients(scalar, variables, aux=None):
+    """Compute the value and the gradients of a scalar w.r.t to a given list
+    of variables from a single forward pass.
+
+    The value is an item of the same node as the gradients, a function
+    computing the scalar and some updates derived from its gradients thus
+    traces the forward pass only once. Auxiliary tensors depending on the
+    same forward pass can be given to also be computed within it.
 
     Arguments
     ---------
@@ -67,11 +115,25 @@ def gradients(scalar, variables):
     variables: List or Tuple
         the variables used to compute the derivative.
 
+    aux: List (optional)
+        auxiliary tensors (e.g. accuracy, predictions) computed along the
+        scalar
+
     Returns
     -------
 
+        value: Tensor
+            the scalar value, or the (value, aux) pair if aux is given
+
         gradients: Tuple
             the sequency of gradients ordered as given in the input variables
+
+    Examples
+    --------
+
+        >>> loss, grads = symjax.value_and_gradients(loss, params)
+        >>> (loss, accu), grads = symjax.value_and_gradients(
+        >>>     loss, params, aux=[accuracy])
     """
     if numpy.prod(scalar.shape) != 1:
         raise RuntimeError("the variable to differentiate is not a scalar")
@@ -85,44 +147,82 @@ def gradients(scalar, variables):
         input_variables = [variables]
         input_list = False
     else:
-        input_variables = variables
+        input_variables = list(variables)
         input_list = True
-
-    # get all the roots of the scalar, this is needed as otherwise they are not
-    # as the input of the gradient function and thus a change of
-    # their value will not change the gradient computation, we also ensure
-    # uniqueness
-    all_roots = list(set(scalar.roots + input_variables))
-
-    # get the argnum of the variables that we differentiate one
-    argnums = [all_roots.index(var) for var in input_variables]
+    aux_list = [] if aux is None else list(aux)
 
     # create a dummy function that is needed for jax to compute a gradient func
     # this function is the one that builds the graph of computation from all
     # roots
     # to the scalar varible s.t. automatic diffenrentiation can be applied
+    all_roots, argnums, graph_fn = _graph_function([scalar, aux_list],
+                                                   input_variables)
+
     def fn(*args):
-        return scalar.get(dict(zip(all_roots, list(args))))
+        value, aux_values = graph_fn(*args)
+        return value, aux_values
 
-    # now we obtain the grad function. In fact, Jax returns a function that,
-    # when it is called, returns the gradient values, this function is then
-    # used to generate the Tuple of symbolic variables
-    grad_fn = jax.grad(fn, argnums)
-    wrap_fn = t.jax_wrap(grad_fn, False)
-    if input_list:
-        return wrap_fn(*all_roots)
-    else:
-        return wrap_fn(*all_roots)[0]
+    # now we obtain the value and grad function, jax returns a function that,
+    # when it is called, returns the value, the auxiliary values and the
+    # gradients, their flat sequence is used to generate the Tuple of
+    # symbolic variables
+    value_and_grad_fn = jax.value_and_grad(fn, argnums, has_aux=True)
+
+    def flat_fn(*args):
+        (value, aux_values), grads = value_and_grad_fn(*args)
+        return (value,) + tuple(aux_values) + tuple(grads)
+
+    wrap_fn = t.jax_wrap(flat_fn, False)
+    outputs = wrap_fn(*all_roots)
+
+    # the tensors computed by the first items, used by the graph passes to
+    # share the forward pass with other outputs of a function
+    outputs.value_of = [scalar] + aux_list
+
+    value = outputs[0]
+    aux_values = list(outputs[1:1 + len(aux_list)])
+    grads = outputs[1 + len(aux_list):]
+    if not input_list:
+        grads = grads[0]
+    if aux is None:
+        return value, grads
+    return (value, aux_values), grads
+
+
+def gradients(scalar, variables):
+    """Compute the gradients of a scalar w.r.t to a given list of variables.
+
+    The gradients are computed along the value of the scalar, see
+    :func:`value_and_gradients`.
+
+    Arguments
+    ---------
+    scalar: :class:`symjax.tensor.base.Tensor`
+        the variable to differentiate
+
+    variables: List or Tuple
+        the variables used to compute the derivative.
+
+    Returns
+    -------
+
+        gradients: Tuple
+            the sequency of gradients ordered as given in the input variables
+    """
+    return value_and_gradients(scalar, variables)[1]
 
 
-def jacobians(tensor, variables, mode='forward'):
+def jacobians(tensor, variables, mode='auto'):
     """Compute the jacobians of a tensor w.r.t to a given list of variables.
 
     The tensor needs not to be a vector, but will be treated as such. For
     example if tensor.shape is (10, 3, 3) and a variable shape if (10, 10)
     the resulting jacobian has shape (10, 3, 3, 10, 10). It is possible
     to specify the mode forward or backward. For tall jacobians, forward
-    is faster and vice-versa.
+    is faster and vice-versa. The auto mode (default) picks forward if the
+    tensor has more elements than the variables and backward otherwise.
+    When only products with the jacobians are needed, see :func:`jvp` and
+    :func:`vjp` which do not materialize them.
 
     Arguments
     ---------
@@ -133,42 +233,579 @@ def jacobians(tensor, variables, mode='forward'):
         variables: List or Tuple
             the variables used to compute the derivative.
 
+        mode: 'auto', 'forward' or 'backward'
+            the differentiation mode
+
     Returns
     -------
 
         jacobians: Tuple
             the sequency of gradients ordered as given in the input variables
     """
-    # get all the roots of the scalar, this is needed as otherwise they are not
-    # as the input of the gradient function and thus a change of
-    # their value will not change the gradient computation, we also ensure
-    # uniqueness
-    all_roots = list(set(tensor.roots + variables))
-
-    # get the argnum of the variables that we differentiate one
-    argnums = [all_roots.index(var) for var in variables]
+    if mode == 'auto':
+        inputs_size = sum(numpy.prod(var.shape) for var in variables)
+        mode = 'forward' if numpy.prod(tensor.shape) >= inputs_size\
+            else 'backward'
 
     # create a dummy function that is needed for jax to compute a gradient func
     # this function is the one that builds the graph of computation from
     # all roots
     # to the scalar varible s.t. automatic diffenrentiation can be applied
-    def fn(*args):
-        return tensor.get(dict(zip(all_roots, list(args))))
+    all_roots, argnums, fn = _graph_function(tensor, variables)
 
     # now we obtain the jacobian function. In fact, Jax returns a function that
     # when it is called, returns the jacobian values, this function is then
     # used to generate the Tuple of symbolic variables
     if mode == 'forward':
         jacob_fn = jacfwd(fn, argnums)
-    elif mode == 'backward':
+    elif mode in ['backward', 'reverse']:
         jacob_fn = jacrev(fn, argnums)
     else:
         raise RuntimeError(
-            "mode {} not recognized, use forward or backward".format(mode))
+            "mode {} not recognized, use auto, forward or backward".format(
+                mode))
     wrap_fn = t.jax_wrap(jacob_fn, False)
     return wrap_fn(*all_roots)
 
 
+def jvp(outputs, variables, tangents):
+    """Compute the jacobian-vector products of some tensors w.r.t to a given
+    list of variables (forward mode differentiation).
+
+    The jacobians are never materialized, the products cost about one
+    evaluation of the outputs.
+
+    Arguments
+    ---------
+
+        outputs: Tensor or List
+            the tensors to differentiate
+
+        variables: List or Tuple
+            the variables used to compute the derivative.
+
+        tangents: List or Tuple
+            the vectors (one per variable, with the same shape) multiplied
+            by the jacobians
+
+    Returns
+    -------
+
+        products: Tensor or Tuple
+            the sum over the variables of the jacobian-vector products, with
+            the structure (and shapes) of the outputs
+
+    Examples
+    --------
+
+        >>> w = T.Variable(numpy.ones(3))
+        >>> y = T.sin(w) * 2
+        >>> jv = symjax.jvp(y, [w], [T.ones(3)])  # 2 * cos(w)
+    """
+    variables, _ = _as_list(variables)
+    tangents, _ = _as_list(tangents)
+    all_roots, argnums, fn = _graph_function(outputs, variables)
+    n_roots = len(all_roots)
+
+    def jvp_fn(*args):
+        roots, tangents = args[:n_roots], args[n_roots:]
+        primals = tuple(roots[argnum] for argnum in argnums)
+        return jax.jvp(_of_variables(fn, roots, argnums), primals,
+                       tuple(tangents))[1]
+
+    return t.jax_wrap(jvp_fn, False)(*all_roots, *tangents)
+
+
+def vjp(outputs, variables, cotangents):
+    """Compute the vector-jacobian products of some tensors w.r.t to a given
+    list of variables (reverse mode differentiation).
+
+    The jacobians are never materialized, the products cost about one
+    gradient evaluation.
+
+    Arguments
+    ---------
+
+        outputs: Tensor or List
+            the tensors to differentiate
+
+        variables: List or Tuple
+            the variables used to compute the derivative.
+
+        cotangents: Tensor or List
+            the vectors multiplied by the jacobians, with the structure and
+            shapes of the outputs
+
+    Returns
+    -------
+
+        products: Tuple
+            the vector-jacobian products ordered as given in the input
+            variables
+    """
+    variables, input_list = _as_list(variables)
+    all_roots, argnums, fn = _graph_function(outputs, variables)
+    n_roots = len(all_roots)
+    output_list = not isinstance(outputs, t.Tensor)
+    if output_list:
+        cotangents = list(cotangents)
+    else:
+        cotangents = [cotangents]
+
+    def vjp_fn(*args):
+        roots, cotangents = args[:n_roots], args[n_roots:]
+        primals = tuple(roots[argnum] for argnum in argnums)
+        primals_out, vjp_f = jax.vjp(_of_variables(fn, roots, argnums),
+                                     *primals)
+        if output_list:
+            cotangents = type(primals_out)(cotangents)
+        else:
+            cotangents = cotangents[0]
+        return tuple(vjp_f(cotangents))
+
+    products = t.jax_wrap(vjp_fn, False)(*all_roots, *cotangents)
+    if input_list:
+        return products
+    return products[0]
+
+
+def hessian_vector_product(scalar, variables, vectors):
+    """Compute the hessian-vector products of a scalar w.r.t to a given list
+    of variables, using forward over reverse differentiation.
+
+    The hessian is never materialized, the products cost about two gradient
+    evaluations.
+
+    Arguments
+    ---------
+
+        scalar: Tensor
+            the scalar to differentiate twice
+
+        variables: List or Tuple
+            the variables used to compute the derivative.
+
+        vectors: List or Tuple
+            the vectors (one per variable, with the same shape) multiplied by
+            the hessian
+
+    Returns
+    -------
+
+        products: Tuple
+            the blocks of the hessian-vector product ordered as given in the
+            input variables
+    """
+    if numpy.prod(scalar.shape) != 1:
+        raise RuntimeError("the variable to differentiate is not a scalar")
+    if scalar.shape != ():
+        scalar = scalar.sum()
+    variables, input_list = _as_list(variables)
+    vectors, _ = _as_list(vectors)
+    all_roots, argnums, fn = _graph_function(scalar, variables)
+    n_roots = len(all_roots)
+
+    def hvp_fn(*args):
+        roots, vectors = args[:n_roots], args[n_roots:]
+        primals = tuple(roots[argnum] for argnum in argnums)
+        grad_fn = jax.grad(_of_variables(fn, roots, argnums),
+                           tuple(range(len(primals))))
+        return tuple(jax.jvp(grad_fn, primals, tuple(vectors))[1])
+
+    products = t.jax_wrap(hvp_fn, False)(*all_roots, *vectors)
+    if input_list:
+        return products
+    return products[0]
+
+
+def _example_shape(spec, batch_size):
+    """a (nested) argument where the constant shapes with a leading batch
+    dimension are given a leading dimension of one"""
+    kind = type(spec)
+    if kind is t.executor._Constant:
+        value = spec.value
+        if isinstance(value, (tuple, list)) and len(value) and\
+                all(isinstance(item, (int, numpy.integer))
+                    for item in value) and value[0] == batch_size:
+            return t.executor._Constant(type(value)([1] + list(value[1:])))
+        return spec
+    elif kind in [list, tuple]:
+        return kind([_example_shape(item, batch_size) for item in spec])
+    return spec
+
+
+def _example_executor(executor, batch_size):
+    """a copy of the executor of a batch graph evaluating a single example
+    (a batch of one row): the shapes given to the batch shaped nodes (such
+    as the reshape of flatten2d) are rewritten for one row"""
+    program = list()
+    for kind, index, a, b, c in executor.program:
+        node = executor.nodes[index]
+        if kind in [t.executor._OP, t.executor._TUPLE] and node.ndim and\
+                node.shape[0] == batch_size:
+            b = _example_shape(b, batch_size)
+            if c is not None:
+                c = dict((name, _example_shape(spec, batch_size))
+                         for name, spec in c.items())
+        program.append((kind, index, a, b, c))
+    example = copy.copy(executor)
+    example.program = program
+    return example
+
+
+def per_example_gradients(loss_per_sample, params, clip_norm=None,
+                          aggregate=None):
+    """Compute the gradients of each sample of a loss w.r.t to a given list
+    of parameters.
+
+    The loss of a single example is obtained by evaluating the graph with
+    the rows of that example only (the roots and random tensors with a
+    leading axis of the batch size), its gradient is vectorized over the
+    examples (with jax.vmap semantics), each example costing one backward
+    pass of a single example. The shapes given to the batch shaped nodes
+    (such as the reshape of a convolution output before a dense layer) are
+    rewritten for one row, a graph depending otherwise on the batch size
+    raises a RuntimeError. The examples must be independent: the loss of
+    an example only depends on its rows (no batch statistics). If
+    only the (clipped) sum or mean of the per example gradients is needed,
+    they are clipped and reduced within the same computation, as needed for
+    example by differentially private SGD.
+
+    Arguments
+    ---------
+
+        loss_per_sample: Tensor
+            the vector of losses of the examples
+
+        params: List or Tuple
+            the variables used to compute the derivative.
+
+        clip_norm: scalar (optional)
+            if given, the gradients of each example are rescaled such that
+            their global norm (over all the parameters) is at most clip_norm
+
+        aggregate: None, 'sum' or 'mean'
+            if given, the per example gradients are summed (or averaged)
+            over the examples
+
+    Returns
+    -------
+
+        gradients: Tuple
+            the per example gradients ordered as given in the input
+            variables, each with a leading batch axis, or their aggregate
+    """
+    if loss_per_sample.ndim != 1:
+        raise RuntimeError("the loss per sample must be a vector")
+    if aggregate not in [None, 'sum', 'mean']:
+        raise RuntimeError(
+            "aggregate {} not recognized, use None, sum or mean".format(
+                aggregate))
+    params, input_list = _as_list(params)
+    n_samples = loss_per_sample.shape[0]
+    all_roots = list(set(t.getroots(loss_per_sample) + list(params)))
+    argnums = [all_roots.index(param) for param in params]
+
+    # the batch shaped random tensors are drawn once for the whole batch,
+    # each example then takes its rows as for the other batched roots
+    randoms = [node for node in t.topological_sort(loss_per_sample,
+                                                   all_roots)
+               if isinstance(node, t.RandomOp) and node.ndim and
+               node.shape[0] == n_samples]
+    givens = all_roots + randoms
+    batched = [i for i, node in enumerate(givens) if i not in argnums and
+               node.ndim and node.shape[0] == n_samples]
+    if not batched:
+        raise RuntimeError("the loss per sample does not depend on an input "
+                           "with a leading axis of size {}".format(n_samples))
+    random_executor = t.Executor(randoms, all_roots)
+    executor = t.Executor(loss_per_sample, givens)
+    random_executor.optimize(t.passes.NESTED_PASSES)
+    executor.optimize(t.passes.NESTED_PASSES)
+    executor = _example_executor(executor, n_samples)
+
+    def per_example_fn(*roots):
+        values = list(roots) + list(random_executor(*roots))
+        primals = tuple(roots[argnum] for argnum in argnums)
+
+        def example_loss(variables, rows):
+            args = list(values)
+            for position, row in zip(batched, rows):
+                args[position] = row
+            for argnum, variable in zip(argnums, variables):
+                args[argnum] = variable
+            loss = executor(*args)
+            if loss.shape != (1,):
+                raise RuntimeError(
+                    "the loss of a single example has shape {}".format(
+                        loss.shape))
+            return loss.sum()
+
+        # each example is a batch of one row
+        rows = [values[position][:, None] for position in batched]
+        grads = jax.vmap(jax.grad(example_loss), in_axes=(None, 0))(
+            primals, rows)
+        if clip_norm is not None:
+            norm = np.sqrt(sum((grad.reshape((n_samples, -1)) ** 2).sum(1)
+                               for grad in grads))
+            scale = np.minimum(1., clip_norm / (norm + 1e-12))
+            grads = [grad * scale.reshape((-1,) + (1,) * (grad.ndim - 1))
+                     for grad in grads]
+        if aggregate == 'sum':
+            grads = [grad.sum(0) for grad in grads]
+        elif aggregate == 'mean':
+            grads = [grad.mean(0) for grad in grads]
+        return tuple(grads)
+
+    try:
+        grads = t.jax_wrap(per_example_fn, False)(*all_roots)
+    except Exception as e:
+        raise RuntimeError(
+            "the loss of a single example can not be computed from the "
+            "graph of the batch, it depends on the batch size other than "
+            "through the shapes of the batch shaped nodes ({})".format(e))
+    if input_list:
+        return grads
+    return grads[0]
+
+
+def vectorize(outputs, over, size=None):
+    """Vectorize a graph written for a single example over a batch axis.
+
+    The nodes in over (typically placeholders) are the per example inputs
+    of the graph, each is mapped to its batched counterpart. The per example
+    outputs are turned into batched ones computed as a single vectorized
+    kernel (with jax.vmap semantics) instead of a python loop over the
+    examples. The other roots of the graph (variables, random tensors, other
+    placeholders) are shared by all the examples.
+
+    Arguments
+    ---------
+
+        outputs: Tensor or List
+            the per example outputs
+
+        over: dict
+            maps each per example input to either a batched tensor (batched
+            along the first axis), a (tensor, axis) pair, or an int axis in
+            which case a new placeholder with a batch axis of the given size
+            inserted at that position is created
+
+        size: int (optional)
+            the batch size, only needed to create placeholders
+
+    Returns
+    -------
+
+        batched_outputs: Tensor or Tuple
+            the outputs with a leading batch axis
+
+        batched_inputs: list
+            the batched tensors given (or created) for the nodes of over, in
+            the same order
+
+    Examples
+    --------
+
+        >>> x = T.Placeholder((3,), 'float32')
+        >>> y = T.outer(x, x).sum(0)
+        >>> batched_y, (batched_x,) = symjax.vectorize(y, {x: 0}, size=16)
+        >>> f = symjax.function(batched_x, outputs=batched_y)
+    """
+    nodes = list(over.keys())
+    batched_inputs = list()
+    in_axes = list()
+    for node in nodes:
+        batched = over[node]
+        if isinstance(batched, int):
+            if size is None:
+                raise RuntimeError(
+                    "size must be given to create batched placeholders")
+            axis = batched % (len(node.shape) + 1)
+            shape = node.shape[:axis] + (size,) + node.shape[axis:]
+            batched = t.Placeholder(shape, node.dtype,
+                                    name=getattr(node, 'name', ''))
+        elif isinstance(batched, (tuple, list)):
+            batched, axis = batched
+        else:
+            axis = 0
+        batched_inputs.append(batched)
+        in_axes.append(axis)
+
+    all_roots, argnums, fn = _graph_function(outputs, nodes)
+    in_axes = [in_axes[argnums.index(i)] if i in argnums else None
+               for i in range(len(all_roots))]
+    args = [batched_inputs[argnums.index(i)] if i in argnums else root
+            for i, root in enumerate(all_roots)]
+
+    vectorized_fn = jax.vmap(fn, in_axes=in_axes)
+    return t.jax_wrap(vectorized_fn, False)(*args), batched_inputs
+
+
+def _function_shardings(mesh, data_parallel, inputs):
+    """the mesh, the replicated sharding and the shardings of the inputs of
+    a function compiled over a device mesh. The variables follow their
+    sharding spec (replicated by default), in data parallel mode the leading
+    (batch) axis of the other inputs is sharded over the mesh axis 'batch'"""
+    if mesh is None or (data_parallel and data_parallel is not True):
+        if data_parallel is True or not data_parallel:
+            devices = jax.devices()
+        elif isinstance(data_parallel, int):
+            devices = jax.devices()[:data_parallel]
+        else:
+            devices = list(data_parallel)
+        mesh = sharding.create_mesh({'batch': len(devices)}, devices)
+    replicated = sharding.named_sharding(mesh)
+
+    batch_size = None
+    if data_parallel:
+        if 'batch' not in mesh.axis_names:
+            raise ValueError("data parallelism requires a mesh with a "
+                             "'batch' axis, got {}".format(mesh.axis_names))
+        batch_size = next((node.shape[0] for node in inputs
+                           if isinstance(node, t.Placeholder) and node.ndim),
+                          None)
+        n_devices = mesh.shape['batch']
+        if batch_size is not None and batch_size % n_devices:
+            raise RuntimeError(
+                "the batch size {} is not a multiple of the number of "
+                "devices {}".format(batch_size, n_devices))
+        sharded = sharding.named_sharding(mesh, ('batch',))
+    shardings = list()
+    for node in inputs:
+        if isinstance(node, t.Variable):
+            shardings.append(sharding.named_sharding(mesh, node.sharding))
+        elif batch_size is not None and node.ndim and\
+                node.shape[0] == batch_size:
+            shardings.append(sharded)
+        else:
+            shardings.append(replicated)
+    if data_parallel and batch_size is None:
+        warnings.warn(
+            "data_parallel is set but no input placeholder has a known "
+            "leading (batch) dimension, all the inputs are replicated and "
+            "the computation is not split over the devices")
+    return mesh, replicated, shardings
+
+
+def _put(value, sharding):
+    """place a value with a sharding, a sharding spanning the devices of
+    several processes is filled from the (identical) value of each process"""
+    if getattr(sharding, 'is_fully_addressable', True):
+        return jax.device_put(value, sharding)
+    value = numpy.asarray(value)
+    return jax.make_array_from_callback(value.shape, sharding,
+                                        lambda index: value[index])
+
+
+def _is_value_item(node):
+    """whether the node is an item of a value and gradients node (see
+    :func:`value_and_gradients`)"""
+    return isinstance(node, t.TupleItem) and\
+        getattr(node.parent, 'value_of', None) is not None
+
+
+def _microbatch_step(outputs, updates_values, inputs, batched, microbatches,
+                     passes=None):
+    """the jax function computing the outputs and updates of a function from
+    its inputs by splitting the batched inputs (given by their positions) in
+    microbatches. The nodes depending on them are computed for each
+    microbatch within a scan, up to the values and gradients of the
+    :func:`value_and_gradients` nodes which are averaged over the
+    microbatches, the remaining nodes (such as the updates of the optimizers)
+    are then computed once. Returns the function and the pass report of its
+    two programs"""
+    batched_nodes = [inputs[i] for i in batched]
+    size = batched_nodes[0].shape[0]
+    rng_state = t.random.get_state(create=False)
+    rng_position = next((i for i, node in enumerate(inputs)
+                         if node is rng_state), None)
+
+    # the nodes computed per microbatch: the ones depending on the batched
+    # inputs, or batch shaped random tensors, up to the value and gradients
+    # items (their consumers are computed once from their average)
+    nodes = t.topological_sort([outputs, updates_values], inputs)
+    per_micro = set(id(node) for node in batched_nodes)
+    consumed = list()
+    for node in nodes:
+        if id(node) in per_micro:
+            continue
+        parents = t.executor._parents(node)
+        if any(id(p) in per_micro and not _is_value_item(p)
+               for p in parents) or (isinstance(node, t.RandomOp) and
+                                     node.ndim and node.shape[0] == size):
+            per_micro.add(id(node))
+        else:
+            consumed += [p for p in parents if id(p) in per_micro]
+
+    # the per microbatch values used by the other nodes, the update values
+    # and the outputs are averaged over the microbatches, except the batch
+    # shaped outputs which are concatenated back to the full batch
+    output_nodes = t.executor._nodes(outputs)
+    stacked, averaged, seen = list(), list(), set()
+    for node in output_nodes + list(updates_values) + consumed:
+        if id(node) not in per_micro or id(node) in seen:
+            continue
+        seen.add(id(node))
+        if any(node is o for o in output_nodes) and node.ndim and\
+                node.shape[0] == size and not _is_value_item(node) and\
+                not any(node is u for u in updates_values):
+            stacked.append(node)
+        else:
+            averaged.append(node)
+
+    micro_executor = t.Executor([averaged, stacked], inputs)
+    executor = t.Executor([outputs, updates_values],
+                          list(inputs) + averaged + stacked)
+    micro_report = micro_executor.optimize(passes)
+    report = executor.optimize(passes)
+    report.passes = [(name, before + micro[1], after + micro[2],
+                      seconds + micro[3]) for (name, before, after, seconds),
+                     micro in zip(report.passes, micro_report.passes)]
+
+    def step(*args):
+        args = list(args)
+        # the microbatch i is made of the rows i, i + M, i + 2M, ... which
+        # keeps a batch sharded over devices sharded within each microbatch
+        blocks = [np.swapaxes(np.reshape(
+            args[i], (-1, microbatches) + args[i].shape[1:]), 0, 1)
+            for i in batched]
+
+        def body(sums, xs):
+            index, micro = xs
+            micro_args = list(args)
+            for i, value in zip(batched, micro):
+                micro_args[i] = value
+            if rng_position is not None:
+                micro_args[rng_position] = jax.random.fold_in(
+                    args[rng_position], index)
+            averaged_values, stacked_values = micro_executor(*micro_args)
+            sums = [total + value.astype(total.dtype) for total, value in
+                    zip(sums, averaged_values)]
+            return sums, stacked_values
+
+        sums = [np.zeros(node.shape, node.dtype if np.issubdtype(
+            node.dtype, np.inexact) else 'float32') for node in averaged]
+        sums, stacked_values = jax.lax.scan(
+            body, sums, (np.arange(microbatches), blocks))
+        averaged_values = [(total / microbatches).astype(node.dtype)
+                           for total, node in zip(sums, averaged)]
+        stacked_values = [np.reshape(np.swapaxes(value, 0, 1),
+                                     (-1,) + value.shape[2:])
+                          for value in stacked_values]
+        return executor(*args, *averaged_values, *stacked_values)
+
+    return step, report
+
+
+def _match_shape(shape, symbolic_shape):
+    """whether a shape matches a symbolic one with possibly unknown (None)
+    dimensions"""
+    if len(shape) != len(symbolic_shape):
+        return False
+    return all(s is None or s == d for d, s in zip(shape, symbolic_shape))
+
+
 class function:
     """Generate a user function that compiles a computational graph.
 
@@ -202,6 +839,92 @@ class function:
         default_value: not implemented
             not implemented
 
+        passes: list (optional)
+            the graph passes applied before compilation, see
+            :func:`symjax.tensor.passes.optimize`, by default common
+            subexpressions are merged, constant subgraphs folded and unused
+            nodes removed. Use an empty list to compile the graph as is. The
+            number of nodes removed by each pass is given in the report
+            attribute
+
+        validate: bool (optional)
+            whether the number and shapes of the given arguments are checked
+            at each call, disabling it reduces the per call overhead of
+            functions called many times
+
+        data_parallel: int, list of devices or True (optional)
+            the devices (the first n ones if an int, all if True) over which
+            the computation is parallelized. The leading (batch) axis of the
+            inputs having the same leading dimension as the first input
+            placeholder is sharded over the devices (a warning is issued
+            if that dimension is unknown or there is none, nothing is then
+            split), the variables are replicated. The layout of the intermediate values (including the
+            random tensors) is left to XLA, which propagates it from the
+            sharded inputs. The gradients are all-reduced within
+            the step thus the updates are applied identically on all the
+            devices, the outputs are given as if computed on a single device.
+            With a mesh (given or set as default) and True, the batch is
+            sharded over its 'batch' axis
+
+        mesh: jax.sharding.Mesh (optional)
+            the named device mesh over which the sharded variables (see
+            :class:`symjax.tensor.Variable`) are split, defaults to the one
+            set with :func:`symjax.sharding.set_mesh`
+
+        max_executables: int (optional)
+            placeholders can have unknown (None) dimensions, in which case
+            an executable is compiled for each shape given to the function.
+            At most max_executables of them are kept (least recently used
+            first evicted), the number of compilations per input shapes is
+            given in the compilations attribute
+
+        buckets: list or dict (optional)
+            sizes to which the unknown dimensions of the inputs are padded
+            (to the smallest bucket large enough, inputs larger than all
+            buckets are not padded) to limit the number of compilations. It
+            is either a list used for all the placeholders or a dict mapping
+            placeholders to their list. The unknown dimensions of the outputs
+            are sliced back to their size without padding. Padding is only
+            exact for computations independent along the padded dimensions
+            (per example or per frame), in particular reductions over those
+            dimensions and updates see the padded values
+
+        pad_value: scalar (optional)
+            the value used to pad the inputs
+
+        sync: bool (optional)
+            if True (default) the outputs are transferred to the host as
+            numpy arrays, waiting for the end of the computation. If False
+            the outputs are returned as device arrays as soon as the
+            computation is enqueued, the host only blocks when their value
+            is read (numpy.asarray, printing, ...) allowing to enqueue many
+            calls back to back. In both cases the updated variables stay on
+            the device
+
+        donate: bool (optional)
+            whether the buffers of the updated variables are donated to the
+            compiled function, their updates are then computed in place
+            which divides by about two the memory used by the parameters and
+            optimizer states. Disabled by default since a reference kept on
+            a previous value of an updated variable (var.value) can then not
+            be read after the call
+
+        microbatches: int (optional)
+            gradient accumulation: the graph is built for a microbatch and
+            the function is given batches of microbatches times more rows
+            (for the placeholders having the same leading dimension as the
+            first one), which are split in microbatches within the compiled
+            function. The part of the graph depending on them is computed
+            for one microbatch at a time by a scan, the values and
+            gradients of :func:`value_and_gradients` (thus of the
+            optimizers) being averaged over the microbatches, and the
+            updates are applied once per call. The activations only take the
+            memory of a microbatch. The outputs depending on the batch are
+            averaged, or concatenated if they have one row per example, the
+            updates depending on the batch other than through the gradients
+            (such as the moving averages of the batch normalization) are
+            averaged
+
     Returns
     -------
 
@@ -230,7 +953,10 @@ class function:
 
     def __init__(self, *classargs, outputs=[], updates=None,   # noqa
                  device=None,
-                 backend=None, default_value=None):
+                 backend=None, default_value=None, passes=None,
+                 max_executables=32, buckets=None, pad_value=0, sync=True,
+                 donate=False, validate=True, data_parallel=None, mesh=None,
+                 microbatches=None):
         """Initialize."""
         # check the given updates (if any) and ensure that they only
         # update Variable objects
@@ -257,6 +983,14 @@ class function:
         outs = list(updates.values())
         outs += [outputs] if isinstance(outputs, t.Tensor) else outputs
         self.all_roots = set(t.getroots(outs))
+
+        # the random tensors derive their keys from the rng state, it is
+        # advanced within each call thus each call draws new samples
+        rng_state = t.random.get_state(create=False)
+        if rng_state is not None and rng_state in self.all_roots and\
+                rng_state not in updates:
+            updates = dict(updates)
+            updates[rng_state] = t.random.next_state(rng_state)
         self.classargs = classargs
         self.outputs = outputs
 
@@ -298,59 +1032,401 @@ class function:
         # function. Now we must ensure that the other ones will also be given
         # as inputs to not be treated as constants by jax.
         # we also remove update keys because we will expicitly feed them
+        # they are ordered as in the graph (and not as in a set) such that
+        # the same script gives the same compiled function in all the
+        # processes of a distributed run
         self.extra_inputs = set(self.all_roots)\
             - (set(self.classargs).union(self.updates_keys))
-        self.extra_inputs = list(self.extra_inputs)
+        order = dict((id(node), i) for i, node in
+                     enumerate(t.topological_sort(outs)))
+        self.extra_inputs = sorted(self.extra_inputs,
+                                   key=lambda node: order[id(node)])
+
+        # the evaluation schedule of the graph is computed only once and
+        # traced by jax, the values of the variables (all the roots that are
+        # not placeholders) are fed to the compiled function
+        allargs = list(self.classargs) + self.updates_keys + self.extra_inputs
+        self.input_variables = self.updates_keys + self.extra_inputs
+        self.input_shapes = [arg.shape for arg in self.classargs]
+        self.microbatches = microbatches
+        if microbatches:
+            if buckets is not None:
+                raise ValueError("microbatches and buckets can not be used "
+                                 "together")
+            size = next((arg.shape[0] for arg in self.classargs
+                         if isinstance(arg, t.Placeholder) and arg.ndim),
+                        None)
+            batched = [i for i, arg in enumerate(self.classargs)
+                       if isinstance(arg, t.Placeholder) and arg.ndim and
+                       arg.shape[0] == size]
+            if len(batched) == 0:
+                raise ValueError("microbatches require a batched "
+                                 "placeholder input")
+            for i in batched:
+                self.input_shapes[i] = (
+                    None if size is None else size * microbatches,) +\
+                    tuple(self.classargs[i].shape[1:])
+            self.executor = None
+            self._step, self.report = _microbatch_step(
+                self.outputs, self.updates_values, allargs, batched,
+                microbatches, passes)
+        else:
+            self.executor = t.Executor([self.outputs, self.updates_values],
+                                       allargs)
+            self.report = self.executor.optimize(passes)
+            self._step = self.executor
 
         def jitfn(*jitargs):
-            allargs = list(self.classargs) + self.updates_keys +\
-                self.extra_inputs
-            return t.get([self.outputs, self.updates_values],
-                         dict(zip(allargs, jitargs)))
-
-        # we compile our underlying function using jit for performances
-        self.jitfn = jax.jit(jitfn, device=device, backend=backend)
+            return self._step(*jitargs)
+
+        # the current values of the updated variables are replaced by their
+        # updates after each call and can thus be donated, except if the
+        # update is itself a variable as jax may return its buffer as is
+        if donate:
+            start = len(self.classargs)
+            self.donate_argnums = tuple(
+                start + i for i, value in enumerate(self.updates_values)
+                if not isinstance(value, t.Variable))
+        else:
+            self.donate_argnums = ()
+
+        # in data parallel mode the batch axis of the inputs is sharded over
+        # the devices and the variables are replicated, XLA partitions the
+        # computation and all-reduces the gradients such that the updates
+        # are the same on all the devices. The variables with a sharding
+        # spec are split over the mesh and keep their sharding when updated
+        jit_kwargs = dict(device=device, backend=backend)
+        if mesh is None and not data_parallel:
+            mesh = sharding.get_mesh()
+        sharded_variables = [node for node in allargs
+                             if isinstance(node, t.Variable) and
+                             node.sharding is not None]
+        # without mesh the variables sharded over their own mesh (such as
+        # the partitioned optimizer states) give it
+        if mesh is None and (data_parallel is True or not data_parallel):
+            mesh = next((node.mesh for node in sharded_variables
+                         if node.mesh is not None), None)
+        if len(sharded_variables) and mesh is None and not data_parallel:
+            raise RuntimeError(
+                "the variables {} are sharded but no mesh is given or set "
+                "with symjax.sharding.set_mesh".format(sharded_variables))
+        self.mesh = None
+        self.in_shardings = None
+        if data_parallel or len(sharded_variables):
+            self.mesh, replicated, in_shardings = _function_shardings(
+                mesh, data_parallel, allargs)
+            start = len(self.classargs)
+            updates_shardings = in_shardings[start:start +
+                                             len(self.updates_keys)]
+            jit_kwargs = dict(in_shardings=tuple(in_shardings),
+                              out_shardings=[replicated,
+                                             list(updates_shardings)])
+            self.in_shardings = in_shardings
+            for var, var_sharding in zip(allargs[start:], in_shardings[start:]):
+                if isinstance(var, t.Variable):
+                    var.value = _put(var.value, var_sharding)
+
+        # we compile our underlying function using jit for performances, if
+        # the persistent compilation cache is enabled the executables are
+        # looked up on disk (per input signature) before being compiled
+        try:
+            self.jitfn = jax.jit(jitfn, donate_argnums=self.donate_argnums,
+                                 **jit_kwargs)
+        except TypeError:
+            # older jax versions without buffer donation
+            self.donate_argnums = ()
+            self.jitfn = jax.jit(jitfn, **jit_kwargs)
+        self.backend = backend
+        self.max_executables = max_executables
+        self.executables = OrderedDict()
+        self.output_shapes = OrderedDict()
+        self.compilations = dict()
+
+        # the bucket sizes of each input, sorted, None if not padded
+        if isinstance(buckets, dict):
+            self.buckets = [sorted(buckets[arg]) if arg in buckets else None
+                            for arg in self.classargs]
+        elif buckets is not None:
+            self.buckets = [sorted(buckets)] * len(self.classargs)
+        else:
+            self.buckets = [None] * len(self.classargs)
+        self.pad_value = pad_value
+        self.padding = any(bucket is not None for bucket in self.buckets)
+        self.sync = sync
+        self.validate = validate
 
         # define the frontend function that takes as input the inputs variables
         # and internally compute and update the variables from updates if any
-        def meta(*fnargs, rng):
+        def meta(*fnargs):
 
             # ensure that the number of arguments is correct
-            assert len(fnargs) == len(self.classargs)
-            for fnarg, classarg in zip(fnargs, self.classargs):
-                if hasattr(fnarg, 'shape'):
-                    if fnarg.shape != classarg.shape:
-                        raise RuntimeError(
-                            "wrong input given for {}".format(classarg) +
-                            ", given is {}".format(fnarg) +
-                            ", shape={}".format(fnarg.shape))
+            if self.validate:
+                assert len(fnargs) == len(self.classargs)
+                for fnarg, classarg, shape in zip(fnargs, self.classargs,
+                                                  self.input_shapes):
+                    if hasattr(fnarg, 'shape'):
+                        if not _match_shape(fnarg.shape, shape):
+                            raise RuntimeError(
+                                "wrong input given for {}".format(classarg) +
+                                ", given is {}".format(fnarg) +
+                                ", shape={}".format(fnarg.shape))
 
             # retreive the function outputs, updated values and apply them
-            jitoutputs, jitupdates = self.jitfn(
-                *fnargs,
-                *t.get(self.updates_keys + self.extra_inputs,
-                       {'rng': rng}))
+            inputs = [var.value for var in self.input_variables]
+            padded = self._pad(fnargs) if self.padding else fnargs
+            jitoutputs, jitupdates = self._call_jitfn(padded, inputs)
             for key, update in zip(self.updates_keys, jitupdates):
                 key.value = update
-            if isinstance(jitoutputs, jax.interpreters.xla.DeviceArray):
-                return jax.api.device_get(jitoutputs)
-            else:
-                npy_jitoutputs = [jax.api.device_get(arr) if isinstance(arr, jax.interpreters.xla.DeviceArray) else arr  for arr in jitoutputs]
-                return npy_jitoutputs
+            if not self.sync:
+                if padded is not fnargs:
+                    return self._unpad(jitoutputs, fnargs, inputs)
+                return jitoutputs
+            # all the outputs are transferred at once, they are sliced on the
+            # host to not compile a slicing op per input size
+            npy_jitoutputs = jax.device_get(jitoutputs)
+            if padded is not fnargs:
+                return self._unpad(npy_jitoutputs, fnargs, inputs)
+            return npy_jitoutputs
 
         self.meta = meta
 
-    def __call__(self, *args, rng=None):
-        """Callable fn."""
-        # in the presence of RandomTensor(s) in the graph, we keep track of the
-        # number of functions calls to keep accumulating the PRNGKey of the jax
-        # key, otherwise each function call returns the same realisation
-        if rng is None:
-            if '_rng' not in globals():
-                globals()['_rng'] = 0
-            globals()['_rng'] += 1
-            _rng = globals()['_rng']
+    def _compile(self, jitargs):
+        shapes = tuple(numpy.shape(arg)
+                       for arg in jitargs[:len(self.classargs)])
+        self.compilations[shapes] = self.compilations.get(shapes, 0) + 1
+        cache = compilation_cache.get_cache()
+        if cache is not None:
+            return cache.compile(self.jitfn, jitargs, self.backend)
+        elif hasattr(self.jitfn, 'lower'):
+            return self.jitfn.lower(*jitargs).compile()
+        # older jax versions, the jitted function keeps its own executables
+        return self.jitfn
+
+    def _call_jitfn(self, fnargs, inputs):
+        # the variables and random tensors have a fixed shape and dtype, the
+        # executable only depends on the signature of the given arguments
+        key = compilation_cache.signature(fnargs)
+        executable = self.executables.get(key)
+        if executable is None:
+            executable = self._compile(list(fnargs) + list(inputs))
+            self.executables[key] = executable
+            while len(self.executables) > self.max_executables:
+                self.executables.popitem(last=False)
+        elif len(self.executables) > 1:
+            self.executables.move_to_end(key)
+        return executable(*fnargs, *inputs)
+
+    def _pad(self, fnargs):
+        """pad the unknown dimensions of the inputs to their bucket size,
+        the given arguments are returned if there is nothing to pad"""
+        padded = list(fnargs)
+        for i, (arg, classarg) in enumerate(zip(fnargs, self.classargs)):
+            if self.buckets[i] is None or not hasattr(arg, 'shape'):
+                continue
+            pad_width = list()
+            for dim, symbolic in zip(arg.shape, classarg.shape):
+                size = dim
+                if symbolic is None:
+                    size = next((b for b in self.buckets[i] if b >= dim), dim)
+                pad_width.append((0, size - dim))
+            if any(width[1] for width in pad_width):
+                padded[i] = numpy.pad(numpy.asarray(arg), pad_width,
+                                      constant_values=self.pad_value)
+        if all(a is b for a, b in zip(padded, fnargs)):
+            return fnargs
+        return padded
+
+    def _unpad(self, jitoutputs, fnargs, inputs):
+        """slice the unknown dimensions of the outputs back to the size they
+        have without padding"""
+        key = compilation_cache.signature(list(fnargs) + list(inputs))
+        shapes = self.output_shapes.get(key)
+        if shapes is None:
+            shapes = jax.eval_shape(self.executor, *fnargs, *inputs)[0]
+            self.output_shapes[key] = shapes
+            while len(self.output_shapes) > self.max_executables:
+                self.output_shapes.popitem(last=False)
         else:
-            _rng = rng
-        pargs = [numpy.array(arg) if type(arg) == list else arg for arg in args]
-        return self.meta(*pargs, rng=_rng)
+            self.output_shapes.move_to_end(key)
+
+        def crop(output, shape):
+            if output.shape == shape.shape:
+                return output
+            return output[tuple(slice(0, dim) for dim in shape.shape)]
+
+        if isinstance(jitoutputs, (list, tuple)):
+            return [crop(output, shape)
+                    for output, shape in zip(jitoutputs, shapes)]
+        return crop(jitoutputs, shapes)
+
+    def __call__(self, *args, rng=None):
+        """Callable fn. If rng is given, the rng state is first set from this
+        seed (see :func:`symjax.tensor.random.seed`)"""
+        # the random tensors are sampled within the compiled function from
+        # the rng state variable, which is advanced by each call
+        if rng is not None:
+            t.random.seed(rng)
+        if self.validate:
+            args = [numpy.array(arg) if type(arg) == list else arg
+                    for arg in args]
+        return self.meta(*args)
+
+    def multistep(self, steps, reduce=None, stacked=None, unroll=1):
+        """the function applied to a block of steps consecutive batches in a
+        single call
+
+        The steps are run by a scan within one compiled function, the
+        variables are updated on the device from a step to the next and
+        only the final values are kept, removing the per call overhead (the
+        dispatch and the synchronization with the host) of all the steps
+        but one.
+
+        Parameters:
+        -----------
+
+            steps: int
+                the number of steps per call
+
+            reduce: str or callable (optional)
+                how the outputs of the steps are combined: None to return
+                them stacked along a leading axis of size steps, 'mean',
+                'sum', 'last' or a function of the stacked output
+
+            stacked: list of Placeholder (optional)
+                the inputs given as blocks of steps values stacked along a
+                leading axis, the other ones are the same for all the steps.
+                Defaults to all the inputs
+
+            unroll: int or bool (optional)
+                the number of steps per iteration of the scan loop, True to
+                trace the steps one after the other without a loop (the
+                compilation time grows with steps). The XLA CPU backend runs
+                the convolutions within a loop several times slower than
+                outside, the convolutional networks are faster with one call
+                per step or unrolled on CPU
+
+        Returns:
+        --------
+
+            callable:
+                takes the same inputs as the function (the stacked ones with
+                the leading axis of size steps)
+
+        Example:
+        --------
+
+            >>> train = symjax.function(x, y, outputs=loss, updates=updates)
+            >>> train_block = train.multistep(16, reduce='mean')
+            >>> for x_block, y_block in ...:  # shapes (16,) + x.shape, ...
+            >>>     loss_value = train_block(x_block, y_block)
+        """
+        return _MultiStep(self, steps, reduce, stacked, unroll)
+
+
+_REDUCTIONS = {'mean': lambda output: np.mean(output, 0),
+               'sum': lambda output: np.sum(output, 0),
+               'last': lambda output: output[-1]}
+
+
+class _MultiStep:
+    """a function scanned over blocks of steps inputs, see
+    :meth:`function.multistep`"""
+
+    def __init__(self, fn, steps, reduce=None, stacked=None, unroll=1):
+        if fn.padding:
+            raise ValueError("multistep does not support buckets")
+        if isinstance(reduce, str):
+            reduce = _REDUCTIONS[reduce]
+        if stacked is None:
+            stacked = fn.classargs
+        self.fn = fn
+        self.steps = steps
+        self.classargs = fn.classargs
+        self.stacked = [any(arg is node for node in stacked)
+                        for arg in fn.classargs]
+        self.backend = fn.backend
+        self.max_executables = fn.max_executables
+        self.executables = OrderedDict()
+        self.compilations = dict()
+
+        n_args, n_updates = len(fn.classargs), len(fn.updates_keys)
+        executor = fn._step
+
+        def jitfn(*jitargs):
+            args = jitargs[:n_args]
+            carry = list(jitargs[n_args:n_args + n_updates])
+            extra = jitargs[n_args + n_updates:]
+            blocks = [arg for arg, s in zip(args, self.stacked) if s]
+
+            def step(carry, block):
+                block = iter(block)
+                stepargs = [next(block) if s else arg
+                            for arg, s in zip(args, self.stacked)]
+                outputs, updates = executor(*stepargs, *carry, *extra)
+                # the carried values keep the dtypes of the variables
+                updates = [jax.lax.convert_element_type(update, value.dtype)
+                           for update, value in zip(updates, carry)]
+                return updates, outputs
+
+            if unroll is True:
+                steps_outputs = list()
+                for i in range(steps):
+                    carry, outputs = step(carry, [b[i] for b in blocks])
+                    steps_outputs.append(outputs)
+                outputs = jax.tree_util.tree_map(lambda *o: np.stack(o),
+                                                 *steps_outputs)
+            else:
+                carry, outputs = jax.lax.scan(step, carry, blocks,
+                                              length=steps, unroll=unroll)
+            if reduce is not None:
+                outputs = jax.tree_util.tree_map(reduce, outputs)
+            return [outputs, carry]
+
+        # the stacked inputs are sharded as the inputs of a step, along their
+        # second axis
+        jit_kwargs = dict(backend=fn.backend)
+        self.mesh = fn.mesh
+        self.in_shardings = None
+        if fn.in_shardings is not None:
+            in_shardings = list(fn.in_shardings)
+            for i, s in enumerate(self.stacked):
+                if s:
+                    in_shardings[i] = sharding.named_sharding(
+                        fn.mesh, (None,) + tuple(in_shardings[i].spec))
+            start = len(fn.classargs)
+            jit_kwargs = dict(in_shardings=tuple(in_shardings),
+                              out_shardings=[
+                                  sharding.named_sharding(fn.mesh),
+                                  list(in_shardings[start:start + n_updates])])
+            self.in_shardings = in_shardings
+        self.jitfn = jax.jit(jitfn, donate_argnums=fn.donate_argnums,
+                             **jit_kwargs)
+
+    _compile = function._compile
+    _call_jitfn = function._call_jitfn
+
+    def __call__(self, *args, rng=None):
+        fn = self.fn
+        if rng is not None:
+            t.random.seed(rng)
+        args = [numpy.array(arg) if type(arg) == list else arg
+                for arg in args]
+        if fn.validate:
+            assert len(args) == len(self.classargs)
+            for arg, classarg, s, shape in zip(args, self.classargs,
+                                               self.stacked, fn.input_shapes):
+                shape = (self.steps,) + tuple(shape) if s else shape
+                if hasattr(arg, 'shape') and not _match_shape(arg.shape,
+                                                              shape):
+                    raise RuntimeError(
+                        "wrong input given for {}".format(classarg) +
+                        ", given shape={}, expected {}".format(arg.shape,
+                                                               shape))
+
+        inputs = [var.value for var in fn.input_variables]
+        outputs, updates = self._call_jitfn(args, inputs)
+        for key, update in zip(fn.updates_keys, updates):
+            key.value = update
+        if not fn.sync:
+            return outputs
+        return jax.device_get(outputs)
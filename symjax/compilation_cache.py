@@ -0,0 +1,342 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Persistent on-disk cache of the executables compiled by
+:class:`symjax.function`.
+
+The cache is opt-in, it is enabled for the whole process either with
+:func:`initialize` or by setting the environment variable
+``SYMJAX_COMPILATION_CACHE`` to a directory. Each compiled executable is
+stored in its own file, named after a fingerprint of the traced graph (its
+lowered XLA module), the shapes and dtypes of the inputs, the backend and the
+jax/jaxlib versions. A process restarting with the same graphs thus loads the
+executables from disk instead of compiling them again.
+
+The entries are unpickled and executed: anyone able to write in the cache
+directory can run arbitrary code in the processes using it. The directory
+is therefore created private (mode 0700) and a directory not owned by the
+user or writable by other users is refused, do not share a cache between
+users that do not trust each other.
+
+Example:
+--------
+
+    >>> import symjax
+    >>> symjax.compilation_cache.initialize('/tmp/symjax_cache')
+    >>> f = symjax.function(x, outputs=y)
+    >>> f(data)  # compiled and stored on the first run, loaded afterwards
+    >>> symjax.compilation_cache.get_cache().info()
+    {'hits': 1, 'misses': 0, 'corrupted': 0, ...}
+"""
+
+import os
+import time
+import pickle
+import hashlib
+import tempfile
+import warnings
+import jax
+
+try:
+    from jax.experimental import serialize_executable
+except ImportError:
+    serialize_executable = None
+
+__all__ = ['CompilationCache', 'initialize', 'get_cache', 'disable',
+           'signature']
+
+_MAGIC = b'SYMJAX-EXECUTABLE-1\n'
+_SUFFIX = '.xla'
+_ENV = 'SYMJAX_COMPILATION_CACHE'
+
+
+def _versions():
+    try:
+        import jaxlib.version
+        jaxlib_version = jaxlib.version.__version__
+    except ImportError:
+        import jaxlib
+        jaxlib_version = getattr(jaxlib, '__version__', 'unknown')
+    return jax.__version__, jaxlib_version
+
+
+def _backend_description(backend):
+    """platform, platform version and device kinds of a backend"""
+    devices = jax.devices(backend)
+    client = getattr(devices[0], 'client', None)
+    return (devices[0].platform,
+            getattr(client, 'platform_version', ''),
+            tuple(sorted(set(device.device_kind for device in devices))))
+
+
+def _private(stat):
+    """whether a file is owned by the user and only writable by them"""
+    if not hasattr(os, 'getuid'):
+        return True
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def signature(args):
+    """the types, shapes and dtypes of the arguments, an executable compiled
+    for some arguments can be called with any others of same signature"""
+    return tuple((type(arg), getattr(arg, 'shape', None),
+                  getattr(arg, 'dtype', None)) for arg in args)
+
+
+class CompilationCache:
+    """directory of serialized XLA executables with a bounded size
+
+    Once the total size of the entries exceeds max_size, the least recently
+    used entries (from their modification time, refreshed at each hit) are
+    deleted. Each entry starts with a checksum of its content, an entry
+    that can not be read back (truncated write, disk error, incompatible
+    runtime) is counted as corrupted, deleted and compiled again. The
+    checksum only detects corruption, not tampering: the directory must only
+    be writable by the user (see the module documentation), entries owned
+    by another user or writable by others are ignored.
+
+    Parameters:
+    -----------
+
+        path: str
+            the directory of the cache, created with mode 0700 if needed.
+            A PermissionError is raised if it is not owned by the user or if
+            it is writable by the group or by others
+
+        max_size: int
+            the maximum size in bytes of the cache
+
+    Attributes:
+    -----------
+
+        hits: int
+            the number of executables loaded from the cache
+
+        misses: int
+            the number of executables that had to be compiled
+
+        corrupted: int
+            the number of unreadable entries that were discarded
+
+        evictions: int
+            the number of entries deleted to bound the size of the cache
+    """
+
+    def __init__(self, path, max_size=2 ** 31):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.max_size = max_size
+        os.makedirs(self.path, mode=0o700, exist_ok=True)
+        if not _private(os.stat(self.path)):
+            raise PermissionError(
+                'the compilation cache directory {} must be owned by the user '
+                'and not writable by the group or others, its entries are '
+                'executed'.format(self.path))
+        self.hits = 0
+        self.misses = 0
+        self.corrupted = 0
+        self.evictions = 0
+        self.compile_time = 0.
+        self.load_time = 0.
+
+    def _filename(self, key):
+        return os.path.join(self.path, key + _SUFFIX)
+
+    def _entries(self):
+        entries = list()
+        for name in os.listdir(self.path):
+            if not name.endswith(_SUFFIX):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.path, name))
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        return entries
+
+    def __len__(self):
+        return len(self._entries())
+
+    def size(self):
+        """total size in bytes of the entries"""
+        return sum(entry[1] for entry in self._entries())
+
+    def key(self, lowered, backend=None):
+        """fingerprint of a lowered computation on a given backend"""
+        description = [_MAGIC, _versions(), _backend_description(backend),
+                       str(lowered.in_tree), lowered.as_text()]
+        return hashlib.sha256(repr(description).encode()).hexdigest()
+
+    def load(self, key):
+        """the executable stored under key, or None if there is no valid
+        entry"""
+        filename = self._filename(key)
+        try:
+            with open(filename, 'rb') as f:
+                if not _private(os.fstat(f.fileno())):
+                    warnings.warn('ignoring compilation cache entry {} not '
+                                  'owned by the user or writable by others'
+                                  .format(filename))
+                    return None
+                data = f.read()
+        except OSError:
+            return None
+        try:
+            if not data.startswith(_MAGIC):
+                raise ValueError('unknown header')
+            digest = data[len(_MAGIC):len(_MAGIC) + 32]
+            payload = data[len(_MAGIC) + 32:]
+            if hashlib.sha256(payload).digest() != digest:
+                raise ValueError('checksum mismatch')
+            serialized, in_tree, out_tree = pickle.loads(payload)
+            compiled = serialize_executable.deserialize_and_load(
+                serialized, in_tree, out_tree)
+        except Exception as e:
+            warnings.warn('discarding corrupted compilation cache entry '
+                          '{}: {}'.format(filename, e))
+            self.corrupted += 1
+            self._remove(filename)
+            return None
+        try:
+            os.utime(filename)
+        except OSError:
+            pass
+        return compiled
+
+    def store(self, key, compiled):
+        """serialize an executable under key, the file is written atomically
+        thus concurrent processes sharing the cache never read a partial
+        entry"""
+        try:
+            payload = pickle.dumps(serialize_executable.serialize(compiled))
+        except Exception as e:
+            warnings.warn('executable can not be serialized: {}'.format(e))
+            return
+        data = _MAGIC + hashlib.sha256(payload).digest() + payload
+        if len(data) > self.max_size:
+            return
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp, self._filename(key))
+        except OSError as e:
+            warnings.warn('compilation cache entry not written: {}'.format(e))
+            self._remove(tmp)
+            return
+        self._evict()
+
+    def _remove(self, filename):
+        try:
+            os.remove(filename)
+        except OSError:
+            pass
+
+    def _evict(self):
+        entries = sorted(self._entries())
+        total = sum(entry[1] for entry in entries)
+        for mtime, size, name in entries:
+            if total <= self.max_size:
+                break
+            self._remove(os.path.join(self.path, name))
+            self.evictions += 1
+            total -= size
+
+    def compile(self, jitted, args, backend=None):
+        """the executable of a jitted function for the given arguments,
+        loaded from the cache if possible, compiled (and stored) otherwise"""
+        lowered = jitted.lower(*args)
+        key = self.key(lowered, backend)
+        t0 = time.time()
+        compiled = self.load(key)
+        if compiled is not None:
+            self.hits += 1
+            self.load_time += time.time() - t0
+            return compiled
+        self.misses += 1
+        t0 = time.time()
+        compiled = lowered.compile()
+        self.compile_time += time.time() - t0
+        self.store(key, compiled)
+        return compiled
+
+    def clear(self):
+        """delete all the entries and reset the statistics"""
+        for entry in self._entries():
+            self._remove(os.path.join(self.path, entry[2]))
+        self.hits = 0
+        self.misses = 0
+        self.corrupted = 0
+        self.evictions = 0
+        self.compile_time = 0.
+        self.load_time = 0.
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'corrupted': self.corrupted, 'evictions': self.evictions,
+                'entries': len(self), 'size': self.size(),
+                'max_size': self.max_size,
+                'compile_time': self.compile_time,
+                'load_time': self.load_time}
+
+
+def _supported():
+    return serialize_executable is not None and\
+        hasattr(jax.jit(lambda x: x), 'lower')
+
+
+_cache = None
+
+
+def initialize(path=None, max_size=2 ** 31):
+    """enable the persistent compilation cache for all the functions
+    compiled afterwards
+
+    Parameters:
+    -----------
+
+        path: str (optional)
+            the directory of the cache, defaults to the environment variable
+            SYMJAX_COMPILATION_CACHE
+
+        max_size: int
+            the maximum size in bytes of the cache
+
+    Returns:
+    --------
+
+        cache: CompilationCache or None
+            None if the installed jax can not serialize executables or if
+            the directory is not private to the user (see
+            :class:`CompilationCache`), in which case functions are compiled
+            as usual
+    """
+    global _cache
+    if path is None:
+        path = os.environ.get(_ENV)
+    if path is None:
+        raise ValueError('no path given and {} is not set'.format(_ENV))
+    if not _supported():
+        warnings.warn('the installed jax can not serialize executables, the '
+                      'compilation cache is disabled')
+        _cache = None
+        return None
+    try:
+        _cache = CompilationCache(path, max_size)
+    except PermissionError as e:
+        warnings.warn('{}, the compilation cache is disabled'.format(e))
+        _cache = None
+    return _cache
+
+
+def get_cache():
+    """the cache in use, None if the cache is disabled"""
+    return _cache
+
+
+def disable():
+    """disable the cache (its entries are kept on disk)"""
+    global _cache
+    _cache = None
+
+
+if os.environ.get(_ENV):
+    initialize()
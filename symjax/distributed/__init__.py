@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Multi-process data parallel training.
+
+Each process runs the same script on its own shard of the data. The
+processes are connected with :func:`initialize` (through
+``jax.distributed``), the devices of all the processes then form a single
+mesh over which :class:`function` shards the batch axis: the gradients are
+all-reduced by the compiled step itself and all the processes apply the same
+updates to their replica of the variables. The variables enter the runtime
+with the values of the process of rank 0, thus the processes can initialize
+their parameters independently.
+
+The processes are started with the launcher, for example 4 local processes
+(the environment variables used by :func:`initialize` are set by the
+launcher)::
+
+    python -m symjax.distributed -n 4 train.py --epochs 10
+
+Example:
+--------
+
+    >>> import symjax.distributed as dist
+    >>> dist.initialize()
+    >>> x = T.Placeholder((GLOBAL_BATCH, 32), 'float32')
+    >>> ...
+    >>> optimizer = dist.DistributedOptimizer(
+    ...     symjax.optimizers.Adam(loss, 0.001))
+    >>> train = dist.function(x, y, outputs=loss, updates=optimizer.updates)
+    >>> train(*dist.shard(x_batch, y_batch))  # the rows of this process
+"""
+
+import os
+import sys
+import time
+import socket
+import hashlib
+import subprocess
+import numpy
+import jax
+
+from symjax import base, tensor as t
+from symjax.optimizers import Optimizer
+
+try:
+    from jax.experimental import multihost_utils
+except ImportError:
+    multihost_utils = None
+
+__all__ = ['initialize', 'is_initialized', 'rank', 'size', 'shard',
+           'broadcast', 'in_sync', 'function', 'DistributedOptimizer',
+           'launch']
+
+_COORDINATOR = 'SYMJAX_COORDINATOR_ADDRESS'
+_NUM_PROCESSES = 'SYMJAX_NUM_PROCESSES'
+_PROCESS_ID = 'SYMJAX_PROCESS_ID'
+
+_initialized = False
+
+
+def initialize(coordinator_address=None, num_processes=None,
+               process_id=None):
+    """connect this process to the others, must be called before any
+    computation
+
+    Parameters:
+    -----------
+
+        coordinator_address: str (optional)
+            host:port of the coordinator (run by the process 0), defaults to
+            the environment variable SYMJAX_COORDINATOR_ADDRESS
+
+        num_processes: int (optional)
+            the number of processes, defaults to the environment variable
+            SYMJAX_NUM_PROCESSES
+
+        process_id: int (optional)
+            the rank of this process, defaults to the environment variable
+            SYMJAX_PROCESS_ID
+    """
+    global _initialized
+    if coordinator_address is None:
+        coordinator_address = os.environ.get(_COORDINATOR)
+    if num_processes is None and _NUM_PROCESSES in os.environ:
+        num_processes = int(os.environ[_NUM_PROCESSES])
+    if process_id is None and _PROCESS_ID in os.environ:
+        process_id = int(os.environ[_PROCESS_ID])
+    if not hasattr(jax, 'distributed') or multihost_utils is None:
+        raise RuntimeError(
+            "multi-process training requires a jax version with "
+            "jax.distributed")
+    # the CPU backend only supports cross-process collectives with gloo
+    try:
+        jax.config.update('jax_cpu_collectives_implementation', 'gloo')
+    except (AttributeError, KeyError):
+        pass
+    jax.distributed.initialize(coordinator_address, num_processes,
+                               process_id)
+    _initialized = True
+
+
+def is_initialized():
+    return _initialized
+
+
+def rank():
+    """the rank of this process"""
+    return jax.process_index()
+
+
+def size():
+    """the number of processes"""
+    return jax.process_count()
+
+
+def shard(*arrays):
+    """the rows of the arrays (sharing their leading dimension) given to this
+    process, one contiguous block per process in rank order"""
+    shards = list()
+    for array in arrays:
+        length = len(array) // size()
+        shards.append(array[rank() * length:(rank() + 1) * length])
+    return shards if len(shards) > 1 else shards[0]
+
+
+def _is_global(value):
+    return isinstance(value, jax.Array) and not value.is_fully_addressable
+
+
+def _local(value):
+    """the value of a replicated variable held by this process"""
+    if _is_global(value):
+        return numpy.asarray(value.addressable_data(0))
+    return numpy.asarray(value)
+
+
+def broadcast(variables, root=0):
+    """set the variables of all the processes to their value on the process
+    of rank root
+
+    Parameters:
+    -----------
+
+        variables: list of Variable
+
+        root: int
+            the rank of the process whose values are broadcasted
+    """
+    variables = list(variables)
+    if size() == 1 or len(variables) == 0:
+        return
+    values = multihost_utils.broadcast_one_to_all(
+        [_local(var.value) for var in variables], is_source=rank() == root)
+    for var, value in zip(variables, values):
+        var.value = jax.numpy.array(value, dtype=var.dtype)
+
+
+def in_sync(variables):
+    """whether the variables have the same value on all the processes (and
+    all their devices), compared from the sha256 digest of their bytes"""
+    fingerprints = list()
+    for var in variables:
+        value = var.value
+        if isinstance(value, jax.Array):
+            shards = [numpy.asarray(s.data) for s in value.addressable_shards]
+        else:
+            shards = [numpy.asarray(value)]
+        digests = set(hashlib.sha256(s.tobytes()).digest() for s in shards)
+        if len(digests) > 1:
+            return False
+        # the 256 bits of the digest as 8 int32 words (without x64 the
+        # gathered integers are at most 32 bits)
+        fingerprints.append(numpy.frombuffer(digests.pop(), dtype='int32'))
+    if size() == 1:
+        return True
+    gathered = multihost_utils.process_allgather(
+        numpy.array(fingerprints, dtype='int32').reshape((-1, 8)))
+    return bool((gathered == gathered[0]).all())
+
+
+class function(base.function):
+    """:class:`symjax.function` data parallel over the devices of all the
+    processes
+
+    The graph is built for the global batch (the concatenation of the
+    batches of all the processes), each process calls the function with its
+    own rows of the inputs sharded over the batch axis (see
+    :func:`symjax.function` data_parallel for which inputs are sharded) and
+    with the full value of the other ones. The outputs are computed on the
+    global batch and returned by all the processes. Inputs with unknown
+    dimensions can not be padded to buckets.
+
+    The variables used by the function that are not yet in the runtime are
+    first broadcasted from the process of rank 0, afterwards they are
+    replicated on all the devices and updated by the compiled step.
+
+    Parameters:
+    -----------
+
+        same as :class:`symjax.function`, data_parallel defaults to all the
+        devices of all the processes
+    """
+
+    def __init__(self, *classargs, outputs=[], updates=None,  # noqa
+                 data_parallel=True, **kwargs):
+        if size() > 1 and kwargs.get('buckets') is not None:
+            raise ValueError("buckets are not supported with several "
+                             "processes")
+        updates = {} if updates is None else updates
+        outs = list(updates.values()) + list(updates.keys())
+        outs += [outputs] if isinstance(outputs, t.Tensor) else outputs
+        broadcast([node for node in t.topological_sort(outs)
+                   if isinstance(node, t.Variable) and
+                   not _is_global(node.value)])
+        super().__init__(*classargs, outputs=outputs, updates=updates,
+                         data_parallel=data_parallel, **kwargs)
+
+    def _call_jitfn(self, fnargs, inputs):
+        return super()._call_jitfn(fnargs, _put_variables(self, inputs))
+
+    def __call__(self, *args, rng=None):
+        return super().__call__(*_global_args(self, args), rng=rng)
+
+    def multistep(self, steps, reduce=None, stacked=None, unroll=1):
+        """same as :meth:`symjax.function.multistep`, each process gives its
+        rows of the stacked inputs (sharded along their second axis)"""
+        return _MultiStep(self, steps, reduce, stacked, unroll)
+
+
+class _MultiStep(base._MultiStep):
+
+    def _call_jitfn(self, fnargs, inputs):
+        return super()._call_jitfn(fnargs, _put_variables(self, inputs))
+
+    def __call__(self, *args, rng=None):
+        return super().__call__(*_global_args(self, args), rng=rng)
+
+
+def _put_variables(fn, inputs):
+    """the values of the variables of a compiled function, the variables
+    assigned on the host (such as the rng state when reseeded) have the same
+    value on all the processes, each one fills its devices with its part"""
+    if size() == 1:
+        return inputs
+    start = len(fn.classargs)
+    return [value if _is_global(value) else base._put(value, s)
+            for value, s in zip(inputs, fn.in_shardings[start:])]
+
+
+def _global_args(fn, args):
+    """the global arrays of the arguments of a compiled function, the local
+    rows of the sharded inputs form the global batch"""
+    if size() == 1:
+        return args
+    return [arg if _is_global(arg) else
+            multihost_utils.host_local_array_to_global_array(
+                numpy.asarray(arg), fn.mesh, sharding.spec)
+            for arg, sharding in zip(args, fn.in_shardings)]
+
+
+class DistributedOptimizer(Optimizer):
+    """data parallel wrapper of an optimizer of :mod:`symjax.optimizers`
+
+    The parameters and the optimizer states (the updated variables) are
+    broadcasted from the process of rank root when wrapping, all the
+    processes then start from the same state. When the updates are compiled
+    with :class:`function`, the gradients are the ones of the loss over the
+    global batch: they are averaged (all-reduced) across the processes within
+    the step, and all the replicas apply the same updates.
+
+    Parameters:
+    -----------
+
+        optimizer: Optimizer
+            the wrapped optimizer
+
+        root: int
+            the rank of the process whose initial values are used
+
+    Attributes:
+    -----------
+
+        updates: dict
+            the updates of the wrapped optimizer
+
+        variables: list of variables
+
+        loss: Tensor or None
+    """
+
+    def __init__(self, optimizer, root=0):
+        self.optimizer = optimizer
+        self.updates = optimizer.updates
+        self.loss = getattr(optimizer, 'loss', None)
+        self.variables = getattr(optimizer, 'variables', [])
+        broadcast(self.updates.keys(), root)
+
+    def update(self):
+        if '_update' not in self.__dict__:
+            self._update = function(updates=self.updates)
+        self._update()
+
+
+def _free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('localhost', 0))
+        return s.getsockname()[1]
+
+
+def launch(script, args=(), num_processes=2, port=None):
+    """run num_processes local copies of a python script (with the
+    environment variables read by :func:`initialize`) and wait for them. If
+    a process fails, the others are terminated
+
+    Returns:
+    --------
+
+        code: int
+            0 if all the processes succeeded, otherwise the exit code of the
+            first one that failed
+    """
+    if port is None:
+        port = _free_port()
+    processes = list()
+    for process_id in range(num_processes):
+        env = dict(os.environ)
+        env[_COORDINATOR] = 'localhost:{}'.format(port)
+        env[_NUM_PROCESSES] = str(num_processes)
+        env[_PROCESS_ID] = str(process_id)
+        processes.append(subprocess.Popen(
+            [sys.executable, script] + list(args), env=env))
+    code = 0
+    try:
+        running = list(processes)
+        while running:
+            for process in list(running):
+                if process.poll() is None:
+                    continue
+                running.remove(process)
+                if process.returncode != 0 and code == 0:
+                    code = process.returncode
+                    for other in running:
+                        other.terminate()
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        for process in processes:
+            process.terminate()
+        code = 1
+    for process in processes:
+        process.wait()
+    return code
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Launcher of local processes for :mod:`symjax.distributed`.
+
+Usage::
+
+    python -m symjax.distributed -n 4 script.py [script arguments]
+
+runs 4 copies of the script, the address of the coordinator, the number of
+processes and the rank of each process are given through environment
+variables read by :func:`symjax.distributed.initialize`. If a process fails,
+the others are terminated and its exit code is returned.
+"""
+
+import sys
+import argparse
+
+from symjax.distributed import launch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m symjax.distributed',
+        description='run a symjax script in several local processes')
+    parser.add_argument('-n', '--num-processes', type=int, default=2)
+    parser.add_argument('--port', type=int, default=None,
+                        help='port of the coordinator (default: a free one)')
+    parser.add_argument('script')
+    parser.add_argument('args', nargs=argparse.REMAINDER)
+    options = parser.parse_args(argv)
+    return launch(options.script, options.args, options.num_processes,
+                  options.port)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
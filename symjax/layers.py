@@ -1,9 +1,11 @@
 from symjax.tensor import ops_methods
 from symjax import tensor as T
 from symjax import initializers
-from symjax import get_graph
+from symjax import get_graph, vectorize
+from symjax import precision
 import numpy
 import inspect
+from contextlib import contextmanager
 
 
 def _is_shape(x):
@@ -46,10 +48,77 @@ def get_updates(layers):
     return updates
 
 
+# the gradient checkpointing of the layers being created, see checkpointing
+_checkpointing = None
+
+
+@contextmanager
+def checkpointing(policy=None, every=1):
+    """gradient checkpointing of the layers created within the context
+
+    The layers are grouped in consecutive segments of every layers, the
+    gradients recompute the intermediate values of each segment (see
+    :func:`symjax.tensor.checkpoint`) and only keep the inputs of the
+    segments (and the values saved by the policy). every=1 checkpoints each
+    layer, larger values trade more memory for less recomputation on deep
+    networks. The output of a layer closing a segment is the checkpointed
+    one, the outputs of the other layers of the segment are only used within
+    it
+
+    Parameters:
+    -----------
+
+        policy: str or callable (optional)
+            the intermediate values kept in each segment, see
+            :func:`symjax.tensor.checkpoint`, 'matmul_conv' keeps the outputs
+            of the Dense and convolution layers and recomputes the
+            activations, normalizations and poolings
+
+        every: int
+            the number of layers per segment
+
+    Example:
+    --------
+
+        >>> with symjax.layers.checkpointing(every=4):
+        >>>     for i in range(32):
+        >>>         layer.append(layers.Conv1D(T.relu(layer[-1]), 32, 3))
+    """
+    global _checkpointing
+    previous = _checkpointing
+    _checkpointing = dict(policy=policy, every=every, count=0, start=None)
+    try:
+        yield
+    finally:
+        _checkpointing = previous
+
+
+def _checkpoint_segment(layer, output):
+    """the output of a layer, checkpointed if it closes a segment"""
+    state = _checkpointing
+    if state is None or not isinstance(getattr(layer, 'input', None),
+                                       T.Tensor):
+        return output
+    if state['start'] is None:
+        state['start'] = layer.input
+    state['count'] += 1
+    if state['count'] % state['every']:
+        return output
+    start, state['start'] = state['start'], None
+    return T.checkpoint(output, [start], state['policy'])
+
+
 class Layer(T.Tensor):
 
+    # whether the layer computes in the param dtype of the precision policy
+    # instead of its compute dtype (normalization layers)
+    full_precision = False
+
     def __init__(self, output):
-        super().__init__(output.shape, output.dtype, output.roots, copyof=output)
+        if hasattr(self, 'policy'):
+            output = self.policy.cast_to_output(output)
+        output = _checkpoint_segment(self, output)
+        super().__init__(output.shape, output.dtype, output._roots, copyof=output)
 
     def variables(self, trainable=True):
         if not hasattr(self, '_variables'):
@@ -60,6 +129,7 @@ class Layer(T.Tensor):
             return self._variables
 
     def init_input(self, input_or_shape):
+        self.policy = precision.get_policy()
         if _is_shape(input_or_shape):
             self.input = T.Placeholder(input_or_shape, 'float32')
         else:
@@ -75,7 +145,8 @@ class Layer(T.Tensor):
             else:
                 return tensor_or_func
         if dtype is None:
-            dtype = 'float32'
+            dtype = self.policy.param_dtype if hasattr(self, 'policy')\
+                else 'float32'
         try:
             tensor = tensor_or_func(shape=shape, dtype=dtype)
         except:
@@ -83,7 +154,7 @@ class Layer(T.Tensor):
         return tensor
 
     def create_variable(self, name, tensor_or_func, shape, trainable,
-                        dtype=None):
+                        dtype=None, sharding=None):
         if tensor_or_func is None:
             return None
         t = self.create_tensor(tensor_or_func, shape, dtype)
@@ -91,9 +162,20 @@ class Layer(T.Tensor):
         if not trainable:
             self.__dict__[name] = t
         else:
-            self.__dict__[name] = T.Variable(t, name=name, trainable=True)
+            self.__dict__[name] = T.Variable(t, name=name, trainable=True,
+                                             sharding=sharding)
             self.add_variable(self.__dict__[name])
 
+    def to_compute(self, *tensors):
+        """the tensors cast to the compute dtype of the precision policy (the
+        param dtype for full_precision layers), used at the start of the
+        forward pass"""
+        policy = getattr(self, 'policy', precision.get_policy())
+        if self.full_precision:
+            tensors = [policy.cast_to_param(x) for x in tensors]
+        else:
+            tensors = [policy.cast_to_compute(x) for x in tensors]
+        return tensors if len(tensors) > 1 else tensors[0]
 
     @property
     def updates(self):
@@ -207,16 +289,20 @@ class Dense(Layer):
     """Fully-connected/Dense layer
 
     perform a dense matrix multiplication and bias shifting of the
-    input
+    input. W_sharding and b_sharding split the parameters over a device
+    mesh (see :mod:`symjax.sharding`), for example (None, 'model') splits
+    the units of W
     """
     def __init__(self, input_or_shape, units, W=initializers.he,
-                 b=numpy.zeros, trainable_W=True, trainable_b=True):
+                 b=numpy.zeros, trainable_W=True, trainable_b=True,
+                 W_sharding=None, b_sharding=None):
 
         self.init_input(input_or_shape)
 
         self.create_variable('W', W, (numpy.prod(self.input.shape[1:]), units),
-                            trainable=trainable_W)
-        self.create_variable('b', b, (units,), trainable=trainable_b)
+                            trainable=trainable_W, sharding=W_sharding)
+        self.create_variable('b', b, (units,), trainable=trainable_b,
+                             sharding=b_sharding)
 
         super().__init__(self.forward(self.input))
 
@@ -224,10 +310,11 @@ class Dense(Layer):
         if numpy.prod(input.shape[1:]) != self.W.shape[0]:
             raise RuntimeError(
                 'input to Dense layer {} has different dim'.format(self))
+        input, W = self.to_compute(input, self.W)
         if hasattr(self, 'b'):
-            return T.dot(T.flatten2d(input), self.W) + self.b
+            return T.dot(T.flatten2d(input), W) + self.to_compute(self.b)
         else:
-            return T.dot(T.flatten2d(input), self.W)
+            return T.dot(T.flatten2d(input), W)
 
 
 class Conv1D(Layer):
@@ -254,10 +341,11 @@ class Conv1D(Layer):
         super().__init__(self.forward(self.input))
 
     def forward(self, input):
-        conv = T.convNd(input, self.W, strides=self.stride, padding=self.pad,
+        input, W, b = self.to_compute(input, self.W, self.b)
+        conv = T.convNd(input, W, strides=self.stride, padding=self.pad,
                         input_dilation=self.input_dilation,
                         filter_dilation=self.filter_dilation)
-        return conv + self.b[:, None]
+        return conv + b[:, None]
 
 
 class Conv2DTranspose(Layer):
@@ -283,22 +371,26 @@ class Conv2DTranspose(Layer):
         super().__init__(self.forward(self.input))
 
     def forward(self, input):
-        conv = T.convNd_transpose(input, self.W, strides=self.strides, padding=self.pad,
+        input, W, b = self.to_compute(input, self.W, self.b)
+        conv = T.convNd_transpose(input, W, strides=self.strides, padding=self.pad,
                         transpose_kernel=self.transpose_W,
                         filter_dilation=self.filter_dilation)
 
-        return conv + self.b.reshape((-1, 1, 1))
+        return conv + b.reshape((-1, 1, 1))
 
 
 
 class Conv2D(Layer):
     """2-D (spatial) convolution
 
+    W_sharding and b_sharding split the parameters over a device mesh (see
+    :mod:`symjax.sharding`), for example ('model',) splits the filters
     """
     def __init__(self, input_or_shape, n_filters, filter_shape, pad='VALID',
                  strides=1, W=initializers.he, b=numpy.zeros,
                  trainable_W=True, trainable_b=True,
-                 input_dilations=None, filter_dilations=None):
+                 input_dilations=None, filter_dilations=None,
+                 W_sharding=None, b_sharding=None):
 
         self.init_input(input_or_shape)
         self.input_dilation = input_dilations
@@ -308,17 +400,19 @@ class Conv2D(Layer):
 
         self.create_variable('W', W,
                         (n_filters, self.input.shape[1]) + tuple(filter_shape),
-                            trainable=trainable_W)
-        self.create_variable('b', b, (n_filters,), trainable=trainable_b)
+                            trainable=trainable_W, sharding=W_sharding)
+        self.create_variable('b', b, (n_filters,), trainable=trainable_b,
+                             sharding=b_sharding)
 
         super().__init__(self.forward(self.input))
 
     def forward(self, input):
-        conv = T.convNd(input, self.W, strides=self.strides, padding=self.pad,
+        input, W = self.to_compute(input, self.W)
+        conv = T.convNd(input, W, strides=self.strides, padding=self.pad,
                         input_dilation=self.input_dilation,
                         filter_dilation=self.filter_dilation)
         if hasattr(self, 'b'):
-            return conv + self.b.reshape((-1, 1, 1))
+            return conv + self.to_compute(self.b).reshape((-1, 1, 1))
         else:
             return conv
 
@@ -551,22 +645,15 @@ class RandomCrop(Layer):
         # pad the input
         pinput = T.pad(input, [(0,0)] + self.pad_shape)
 
-        routput = T.stack(
-            [
-                T.dynamic_slice(
-                    pinput[n],
-                    self.start_indices[n],
-                    self.crop_shape) for n in range(
-                    self.input.shape[0])],
-            0)
-        doutput = T.stack(
-            [
-                T.dynamic_slice(
-                    pinput[n],
-                    self.fixed_indices[n],
-                    self.crop_shape) for n in range(
-                    self.input.shape[0])],
-            0)
+        # the crop of a single example, vectorized over the batch
+        image = T.Placeholder(pinput.shape[1:], pinput.dtype)
+        indices = T.Placeholder((len(self.crop_shape),), 'int32')
+        crop = T.dynamic_slice(image, indices, self.crop_shape)
+
+        routput = vectorize(crop, {image: pinput,
+                                   indices: self.start_indices})[0]
+        doutput = vectorize(crop, {image: pinput,
+                                   indices: self.fixed_indices})[0]
 
 
         return doutput * dirac +  (1 - dirac) * routput
@@ -576,6 +663,9 @@ class BatchNormalization(Layer):
     """
     batch-normalization layer
 
+    the normalization is computed in the param dtype of the precision policy
+    (see :mod:`symjax.precision`) whatever its compute dtype
+
 
     Parameters:
     -----------
@@ -608,6 +698,8 @@ class BatchNormalization(Layer):
     output: the layer output with attributes given by the layer options
 
     """
+    full_precision = True
+
     def __init__(self, input_or_shape, axis, deterministic, const=0.001,
                  beta1=0.99, beta2=0.99, W=numpy.ones, b=numpy.zeros,
                  trainable_W=True, trainable_b=True):
@@ -633,6 +725,7 @@ class BatchNormalization(Layer):
         if deterministic is None:
             deterministic = self.deterministic
         dirac = T.cast(deterministic, 'float32')
+        input = self.to_compute(input)
 
         self.mean = T.mean(input, self.axis, keepdims=True)
         self.var = T.var(input, self.axis, keepdims=True)
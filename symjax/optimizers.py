@@ -1,9 +1,120 @@
 import numpy
-from . import tensor
-from .base import gradients, function, get_graph
+import jax
+import jax.numpy as jnp
+from collections import OrderedDict
+from . import tensor, precision, sharding
+from .base import value_and_gradients, function, get_graph
+
+
+def _flat(values):
+    """the values concatenated in a flat buffer"""
+    return jnp.concatenate([jnp.ravel(value) for value in values])
+
+
+def _views(flat, like):
+    """the slices of a flat buffer with the shapes of the given values"""
+    views, offset = list(), 0
+    for value in like:
+        views.append(jnp.reshape(flat[offset:offset + value.size],
+                                 value.shape))
+        offset += value.size
+    return views
+
+
+def _fused_nesterov(learning_rate, momentum, velocity, *tensors):
+    params, grads = tensors[:len(tensors) // 2], tensors[len(tensors) // 2:]
+    param = _flat(params)
+    update = param - learning_rate * _flat(grads)
+    x = momentum * velocity + update - param
+    return [x] + _views(momentum * x + update, params)
+
+
+def _fused_adam(learning_rate, beta1, beta2, epsilon, step, m, v, *tensors):
+    params, grads = tensors[:len(tensors) // 2], tensors[len(tensors) // 2:]
+    grad = _flat(grads)
+    first = jnp.reshape(step, ()) == 0
+    m = jnp.where(first, grad, m * beta1 + (1 - beta1) * grad)
+    v = jnp.where(first, grad ** 2, v * beta2 + (1 - beta2) * grad ** 2)
+    update = m / (jnp.sqrt(v) + epsilon)
+    return [m, v] + _views(_flat(params) - learning_rate * update, params)
+
+
+def _constrain(value, named_sharding):
+    return jax.lax.with_sharding_constraint(value, named_sharding)
+
+
+def _factored_axes(shape, min_dim_size):
+    """the two largest axes of a parameter along which its second moment is
+    factored, None if it has less than two axes of size min_dim_size"""
+    if len(shape) < 2:
+        return None
+    axes = sorted(numpy.argsort(shape, kind='stable')[-2:])
+    if min(shape[axes[0]], shape[axes[1]]) < min_dim_size:
+        return None
+    return int(axes[0]), int(axes[1])
+
+
+def _trust_ratio(param, update, epsilon=0., coefficient=1.):
+    """the ratio of the norms of a parameter and of its update scaled by
+    coefficient (the layer-wise adaptation of LARS and LAMB), 1 if either
+    norm is zero"""
+    param_norm = tensor.sqrt(tensor.square(param).sum())
+    update_norm = tensor.sqrt(tensor.square(update).sum())
+    nonzero = tensor.logical_and(tensor.greater(param_norm, 0),
+                                 tensor.greater(update_norm, 0))
+    ratio = coefficient * param_norm / (
+        tensor.where(nonzero, update_norm, 1.) + epsilon)
+    return tensor.where(nonzero, ratio, 1.)
+
+
+def _excluded(params, exclude):
+    """the parameters not adapted layer-wise: the given variables and the
+    variables of the given layers, by default the parameters with at most
+    one non singleton dimension (biases, normalization scales and shifts)"""
+    if exclude is None:
+        return set(param for param in params
+                   if sum(dim > 1 for dim in param.shape) <= 1)
+    excluded = set()
+    for item in exclude:
+        if isinstance(item, tensor.Variable):
+            excluded.add(item)
+        else:
+            excluded.update(item.variables())
+    return excluded
 
 
 class Optimizer:
+    """base class of the optimizers
+
+    The optimizers share the following options of their constructor.
+
+    Parameters
+    ----------
+
+    loss_scale: float or DynamicLossScale (optional)
+        the scale of the loss for the differentiation (see
+        :mod:`symjax.precision`), the steps whose gradients are not finite
+        are skipped
+
+    partition: 'states' or 'gradients' (optional)
+        whether the optimizer states are partitioned over the data parallel
+        devices (the 'batch' axis of the default mesh, if no mesh is set
+        one over all the devices is created and kept as the mesh attribute
+        of the partitioned states): each device holds and updates a
+        block of every state and the new values of the parameters are
+        gathered. With 'gradients' the gradients are also split, they are
+        reduce-scattered instead of all-reduced
+
+    fused: bool (optional)
+        whether the parameters and the optimizer states are packed per
+        dtype in flat buffers updated by a few vector operations, the new
+        values of the parameters being views of the buffer. This keeps the
+        graph small (one node per dtype instead of a few per parameter)
+        for models with many parameters. Only the optimizers with states
+        (:class:`NesterovMomentum`, :class:`Adam`) take it, :class:`SGD`
+        has no state to pack and a fused update would only add the copies
+        of the flat gradients
+    """
 
     def reset(self):
         if hasattr(self, 'variables'):
@@ -17,13 +128,128 @@ class Optimizer:
             self._update = function(updates=self.updates)
             self._update()
 
-    def _get_grads(self, grads_or_loss, params):
-        # get grads if given is loss
+    def _get_grads(self, grads_or_loss, params, loss_scale=None,
+                   partition=None):
+        # get grads if given is loss, the loss value is computed along them
+        # and kept as the loss attribute. With a loss scale, the loss is
+        # scaled before the differentiation and the gradients scaled back
+        self.loss_scale = loss_scale
+        self._masters = dict()
+        self._set_partition(partition)
+        scale = getattr(loss_scale, 'scale', loss_scale)
         if isinstance(grads_or_loss, tensor.Tensor):
-            grads = gradients(grads_or_loss, params)
+            if scale is None:
+                self.loss, grads = value_and_gradients(grads_or_loss, params)
+            else:
+                loss, grads = value_and_gradients(grads_or_loss * scale,
+                                                  params)
+                self.loss = loss / scale
         else:
+            self.loss = None
             grads = grads_or_loss
+        if scale is not None:
+            grads = [grad / scale for grad in grads]
+        # the low precision parameters are updated from float32 gradients
+        grads = [tensor.cast(grad, 'float32')
+                 if precision.is_low_precision(param.dtype) else grad
+                 for param, grad in zip(params, grads)]
+        if partition == 'gradients':
+            grads = [self._partitioned(grad) for grad in grads]
         return grads
+
+    def _set_partition(self, partition):
+        """the mesh and the number of data parallel devices over which the
+        states (and gradients) are partitioned"""
+        if partition not in (None, 'states', 'gradients'):
+            raise ValueError("partition should be None, 'states' or "
+                             "'gradients', got {}".format(partition))
+        self.partition = partition
+        if partition is None:
+            return
+        # the created mesh is kept on the partitioned states (see
+        # _finalize), the default mesh is left unchanged
+        self._mesh = sharding.get_mesh()
+        if self._mesh is None:
+            self._mesh = sharding.create_mesh({'batch': -1})
+        if 'batch' not in self._mesh.axis_names:
+            raise ValueError("partitioning requires a mesh with a 'batch' "
+                             "axis, got {}".format(self._mesh.axis_names))
+        self._partitions = self._mesh.shape['batch']
+
+    def _partitioned(self, grad):
+        """the gradient constrained to be split over the data parallel
+        devices"""
+        spec = sharding.partition_spec(grad.shape, self._partitions)
+        if spec is None:
+            return grad
+        return tensor.jax_wrap(_constrain, False)(
+            grad, sharding.named_sharding(self._mesh, spec))
+
+    def _master(self, param):
+        """the parameter on which the update is computed: a float32 copy
+        (master weights) of a float16/bfloat16 parameter, the parameter
+        itself otherwise"""
+        if not precision.is_low_precision(param.dtype):
+            return param
+        master = tensor.Variable(numpy.asarray(param.value, dtype='float32'),
+                                 name=param.name + '_master', trainable=False)
+        self._masters[param] = master
+        return master
+
+    def _fused_updates(self, fn, args, states, params, grads):
+        """the updates of the parameters packed (per dtype) in flat buffers,
+        as well as their flat states, computed by a single node per dtype:
+        fn(*args, *states, *params, *grads) returns the new states and
+        params. states is a list of (name, initial value) of the states,
+        they are created per dtype and returned with the updates"""
+        groups = OrderedDict()
+        for param, grad in zip(params, grads):
+            groups.setdefault(jnp.dtype(param.dtype).name, []).append(
+                (param, grad))
+        updates, variables = dict(), list()
+        for dtype, group in groups.items():
+            size = sum(int(numpy.prod(param.shape)) for param, _ in group)
+            flat = [tensor.Variable(numpy.full(size, init, dtype=dtype),
+                                    name=name, trainable=False)
+                    for name, init in states]
+            values = tensor.jax_wrap(fn, False)(
+                *args, *flat, *[param for param, _ in group],
+                *[grad for _, grad in group])
+            for var, value in zip(flat, values[:len(flat)]):
+                updates[var] = value
+            for (param, _), value in zip(group, values[len(flat):]):
+                updates[param] = value
+            variables += flat
+        return updates, variables
+
+    def _finalize(self, updates, grads, variables=()):
+        # the low precision parameters take the value of their master copy.
+        # With a loss scale the steps with non finite gradients are skipped
+        # (all the variables keep their values) and the scale is adjusted
+        variables = list(variables) + list(self._masters.values())
+        for param, master in self._masters.items():
+            updates[param] = tensor.cast(updates[master], param.dtype)
+        if self.loss_scale is not None:
+            finite = precision.all_finite(grads)
+            updates = {var: tensor.where(finite, update, var)
+                       for var, update in updates.items()}
+            if isinstance(self.loss_scale, precision.DynamicLossScale):
+                updates.update(self.loss_scale.adjust(finite))
+                variables += self.loss_scale.variables
+
+        # the partitioned states are split over the data parallel devices,
+        # XLA then computes the updates of each block on its device
+        if self.partition is not None:
+            for var in variables:
+                spec = sharding.partition_spec(var.shape, self._partitions)
+                if var.sharding is None and spec is not None:
+                    var.sharding = spec
+                    var.mesh = self._mesh
+
+        self.variables = variables
+        self.updates = updates
+        if get_graph() is not None:
+            get_graph().updates.update(updates)
  
 
 # class PiecewiseConstant(Optimizer):
@@ -59,6 +285,12 @@ class SGD(Optimizer):
     learning_rate: constant or Tensor
         the learning rate use to update the parameters
 
+    loss_scale: float or DynamicLossScale (optional)
+        see :class:`Optimizer`
+
+    partition: 'states' or 'gradients' (optional)
+        see :class:`Optimizer`
+
     Attributes
     ----------
 
@@ -66,26 +298,31 @@ class SGD(Optimizer):
 
     variables: list of variables
 
+    loss: Tensor or None
+        the value of the loss computed in the same forward pass as the
+        gradients, None if the gradients were given
+
     """
  
-    def __init__(self, grads_or_loss, learning_rate, params=None):
+    def __init__(self, grads_or_loss, learning_rate, params=None,
+                 loss_scale=None, partition=None):
 
         if params is None:
             params = [v for k, v in get_graph().variables.items() if v.trainable]
 
-        grads = self._get_grads(grads_or_loss, params)
+        grads = self._get_grads(grads_or_loss, params, loss_scale,
+                                partition)
 
         if not numpy.isscalar(learning_rate) and not isinstance(
                 learning_rate, tensor.Placeholder):
             learning_rate = learning_rate()
 
+        masters = [self._master(param) for param in params]
         updates = dict()
-        for param, grad in zip(params, grads):
+        for param, grad in zip(masters, grads):
             updates[param] = param - learning_rate * grad
 
-        self.updates = updates
-        if get_graph() is not None:
-            get_graph().updates.update(updates)
+        self._finalize(updates, grads)
 
 
 class NesterovMomentum(Optimizer):
@@ -106,6 +343,15 @@ class NesterovMomentum(Optimizer):
     learning_rate: constant or Tensor
         the learning rate use to update the parameters
 
+    loss_scale: float or DynamicLossScale (optional)
+        see :class:`Optimizer`
+
+    partition: 'states' or 'gradients' (optional)
+        see :class:`Optimizer`
+
+    fused: bool (optional)
+        see :class:`Optimizer`
+
     Attributes
     ----------
 
@@ -113,22 +359,36 @@ class NesterovMomentum(Optimizer):
 
     variables: list of variables
 
+    loss: Tensor or None
+        the value of the loss computed in the same forward pass as the
+        gradients, None if the gradients were given
+
     """
  
-    def __init__(self, grads_or_loss, learning_rate, momentum, params=None):
+    def __init__(self, grads_or_loss, learning_rate, momentum, params=None,
+                 loss_scale=None, fused=False, partition=None):
 
         if params is None:
             params = [v for k, v in get_graph().variables.items() if v.trainable]
 
-        grads = self._get_grads(grads_or_loss, params)
+        grads = self._get_grads(grads_or_loss, params, loss_scale,
+                                partition)
 
         if not numpy.isscalar(learning_rate) and not isinstance(
                 learning_rate, tensor.Placeholder):
             learning_rate = learning_rate()
 
+        masters = [self._master(param) for param in params]
+        if fused:
+            updates, variables = self._fused_updates(
+                _fused_nesterov, [learning_rate, momentum],
+                [('velocity', 0)], masters, grads)
+            self._finalize(updates, grads, variables)
+            return
+
         updates = dict()
         variables = []
-        for param, grad in zip(params, grads):
+        for param, grad in zip(masters, grads):
             velocity = tensor.Variable(numpy.zeros(param.shape, dtype=param.dtype),
                                     trainable=False)
             variables.append(velocity)
@@ -136,11 +396,8 @@ class NesterovMomentum(Optimizer):
             x = momentum * velocity + update - param
             updates[velocity] = x
             updates[param] = momentum * x + update
-        
-        self.variables = variables
-        self.updates = updates
-        if get_graph() is not None:
-            get_graph().updates.update(updates)
+
+        self._finalize(updates, grads, variables)
 
 
 class Adam(Optimizer):
@@ -161,6 +418,15 @@ class Adam(Optimizer):
     learning_rate: constant or Tensor
         the learning rate use to update the parameters
 
+    loss_scale: float or DynamicLossScale (optional)
+        see :class:`Optimizer`
+
+    partition: 'states' or 'gradients' (optional)
+        see :class:`Optimizer`
+
+    fused: bool (optional)
+        see :class:`Optimizer`
+
     beta1: constant or Tensor
         the value of the exponential moving average of the average of the
         gradients through time (updates)
@@ -176,14 +442,20 @@ class Adam(Optimizer):
 
     variables: list of variables
 
+    loss: Tensor or None
+        the value of the loss computed in the same forward pass as the
+        gradients, None if the gradients were given
+
     """
     def __init__(self, grads_or_loss, learning_rate, beta1=0.9,
-                 beta2=0.999, epsilon=1e-6, params=None):
+                 beta2=0.999, epsilon=1e-6, params=None, loss_scale=None,
+                 fused=False, partition=None):
 
         if params is None:
             params = [v for k, v in get_graph().variables.items() if v.trainable]
 
-        grads = self._get_grads(grads_or_loss, params)
+        grads = self._get_grads(grads_or_loss, params, loss_scale,
+                                partition)
         step = tensor.Variable([[0.]], trainable=False, name='step')
         variables = [step]
         # get the learning rate
@@ -191,8 +463,17 @@ class Adam(Optimizer):
                 learning_rate, tensor.Placeholder):
             learning_rate = learning_rate()
 
+        masters = [self._master(param) for param in params]
+        if fused:
+            updates, states = self._fused_updates(
+                _fused_adam, [learning_rate, beta1, beta2, epsilon, step],
+                [('m', 0), ('v', 1)], masters, grads)
+            updates[step] = step + 1
+            self._finalize(updates, grads, variables + states)
+            return
+
         updates = dict()
-        for param, grad in zip(params, grads):
+        for param, grad in zip(masters, grads):
             m, update_m, _ = tensor.ExponentialMovingAverage(grad, beta1,
                                                              step=step)
             v, update_v, _ = tensor.ExponentialMovingAverage(
@@ -204,7 +485,339 @@ class Adam(Optimizer):
             updates[param] = param - learning_rate * update
         updates[step] = step + 1
 
-        self.variables = variables
-        self.updates = updates
-        if get_graph() is not None:
-            get_graph().updates.update(updates)
+        self._finalize(updates, grads, variables)
+
+
+class Adafactor(Optimizer):
+    """Adaptive Gradient Based Optimization with factored second moments
+
+    The second moment of the gradients of the matrices (and of the
+    convolution kernels and other tensors, along their two largest axes) is
+    estimated from its moving averages over the rows and over the columns
+    only, thus the state of a (n, m) weight is n + m values instead of the
+    2 * n * m of :class:`Adam`. The vectors and small tensors keep a full
+    second moment. The updates are clipped by their root mean square and,
+    by default, scaled by the one of the parameter. There is no first moment
+    unless beta1 is given.
+
+    Parameters
+    ----------
+
+    grads_or_loss: scalar tensor or list of gradients
+        either the loss (scalar of Tensor type) to be differentied
+        or the list of gradients already computed and possibly altered
+        manually (such as clipping)
+
+    params: list of parameters to update
+        if grads_or_loss is al list then it should be ordered w.r.t. the
+        given parameters
+
+    learning_rate: constant or Tensor
+        the learning rate use to update the parameters
+
+    decay_rate: float
+        the decay of the moving averages of the second moment at step t is
+        1 - t ** -decay_rate
+
+    beta1: constant or Tensor (optional)
+        the value of the exponential moving average of the updates (the
+        first moment), None to not keep a first moment
+
+    clipping_threshold: float (optional)
+        the updates are scaled down to have a root mean square of at most
+        clipping_threshold, None to not clip them
+
+    epsilon1: float
+        added to the squared gradients
+
+    epsilon2: float
+        the smallest parameter scale
+
+    multiply_by_parameter_scale: bool
+        whether the learning rate is relative to the root mean square of the
+        parameter (at least epsilon2)
+
+    min_dim_size_to_factor: int
+        the second moment of a parameter is factored if it has two axes of
+        at least this size
+
+    loss_scale: float or DynamicLossScale (optional)
+        see :class:`Optimizer`
+
+    partition: 'states' or 'gradients' (optional)
+        see :class:`Optimizer`
+
+    Attributes
+    ----------
+
+    updates: list of updates
+
+    variables: list of variables
+
+    loss: Tensor or None
+        the value of the loss computed in the same forward pass as the
+        gradients, None if the gradients were given
+
+    """
+    def __init__(self, grads_or_loss, learning_rate, decay_rate=0.8,
+                 beta1=None, clipping_threshold=1., epsilon1=1e-30,
+                 epsilon2=1e-3, multiply_by_parameter_scale=True,
+                 min_dim_size_to_factor=128, params=None, loss_scale=None,
+                 partition=None):
+
+        if params is None:
+            params = [v for k, v in get_graph().variables.items() if v.trainable]
+
+        grads = self._get_grads(grads_or_loss, params, loss_scale,
+                                partition)
+        step = tensor.Variable(numpy.float32(0), trainable=False, name='step')
+        variables = [step]
+        if not numpy.isscalar(learning_rate) and not isinstance(
+                learning_rate, tensor.Placeholder):
+            learning_rate = learning_rate()
+
+        decay = 1 - (step + 1) ** (-decay_rate)
+        masters = [self._master(param) for param in params]
+        updates = dict()
+        for param, grad in zip(masters, grads):
+            square = tensor.square(grad) + epsilon1
+            axes = _factored_axes(param.shape, min_dim_size_to_factor)
+            if axes is None:
+                v = tensor.Variable(numpy.zeros(param.shape, dtype='float32'),
+                                    trainable=False, name='v')
+                updates[v] = decay * v + (1 - decay) * square
+                variables.append(v)
+                update = grad / tensor.sqrt(updates[v])
+            else:
+                # the moving averages of the means of the squared gradients
+                # over the second axis (rows) and over the first (columns)
+                row_shape, col_shape = list(param.shape), list(param.shape)
+                row_shape[axes[1]] = col_shape[axes[0]] = 1
+                row = tensor.Variable(numpy.zeros(row_shape, dtype='float32'),
+                                      trainable=False, name='v_row')
+                col = tensor.Variable(numpy.zeros(col_shape, dtype='float32'),
+                                      trainable=False, name='v_col')
+                updates[row] = decay * row + (1 - decay) * square.mean(
+                    axes[1], keepdims=True)
+                updates[col] = decay * col + (1 - decay) * square.mean(
+                    axes[0], keepdims=True)
+                variables += [row, col]
+                # the estimate row * col / mean(row) of the second moment is
+                # applied as two factors, their product underflows when the
+                # gradients of a row and a column are both zero
+                row_factor = tensor.sqrt(updates[row] / updates[row].mean(
+                    axes[0], keepdims=True))
+                update = grad / row_factor / tensor.sqrt(updates[col])
+            if clipping_threshold is not None:
+                rms = tensor.sqrt(tensor.square(update).mean())
+                update = update / tensor.maximum(1., rms / clipping_threshold)
+            rate = learning_rate
+            if multiply_by_parameter_scale:
+                rate = learning_rate * tensor.maximum(
+                    epsilon2, tensor.sqrt(tensor.square(param).mean()))
+            if beta1 is not None:
+                m = tensor.Variable(numpy.zeros(param.shape, dtype='float32'),
+                                    trainable=False, name='m')
+                updates[m] = beta1 * m + (1 - beta1) * update
+                variables.append(m)
+                update = updates[m]
+            updates[param] = param - rate * update
+        updates[step] = step + 1
+
+        self._finalize(updates, grads, variables)
+
+
+class LARS(Optimizer):
+    """Layer-wise Adaptive Rate Scaling, momentum optimization for large
+    batches
+
+    The learning rate of each parameter is scaled by the trust ratio
+    trust_coefficient * ||param|| / ||grad + weight_decay * param|| (1 if
+    either norm is zero), computed in the training step, which keeps the
+    size of the updates relative to the parameters whatever the batch size.
+    The excluded parameters (by default the biases and the scales and
+    shifts of :class:`symjax.layers.BatchNormalization`) are updated with
+    plain momentum and without weight decay.
+
+    Parameters
+    ----------
+
+    grads_or_loss: scalar tensor or list of gradients
+        either the loss (scalar of Tensor type) to be differentied
+        or the list of gradients already computed and possibly altered
+        manually (such as clipping)
+
+    params: list of parameters to update
+        if grads_or_loss is al list then it should be ordered w.r.t. the
+        given parameters
+
+    learning_rate: constant, Tensor or Schedule
+        the learning rate use to update the parameters
+
+    momentum: float
+        the momentum of the updates
+
+    weight_decay: float
+        the L2 penalty added to the gradients of the adapted parameters
+
+    trust_coefficient: float
+        the scale of the trust ratio
+
+    epsilon: float
+        added to the norm of the gradients in the trust ratio
+
+    exclude: list of Variable or Layer (optional)
+        the parameters (or the parameters of the layers) that are not
+        adapted, defaults to the parameters with at most one non singleton
+        dimension
+
+    loss_scale: float or DynamicLossScale (optional)
+        see :class:`Optimizer`
+
+    partition: 'states' or 'gradients' (optional)
+        see :class:`Optimizer`
+
+    Attributes
+    ----------
+
+    updates: list of updates
+
+    variables: list of variables
+
+    loss: Tensor or None
+        the value of the loss computed in the same forward pass as the
+        gradients, None if the gradients were given
+
+    """
+    def __init__(self, grads_or_loss, learning_rate, momentum=0.9,
+                 weight_decay=0., trust_coefficient=0.001, epsilon=0.,
+                 exclude=None, params=None, loss_scale=None,
+                 partition=None):
+
+        if params is None:
+            params = [v for k, v in get_graph().variables.items() if v.trainable]
+
+        grads = self._get_grads(grads_or_loss, params, loss_scale,
+                                partition)
+        excluded = _excluded(params, exclude)
+        if not numpy.isscalar(learning_rate) and not isinstance(
+                learning_rate, tensor.Placeholder):
+            learning_rate = learning_rate()
+
+        updates = dict()
+        variables = []
+        for param, grad in zip(params, grads):
+            master = self._master(param)
+            if param not in excluded:
+                grad = grad + weight_decay * master
+                grad = _trust_ratio(master, grad, epsilon,
+                                    trust_coefficient) * grad
+            velocity = tensor.Variable(
+                numpy.zeros(master.shape, dtype=master.dtype),
+                trainable=False, name='velocity')
+            variables.append(velocity)
+            updates[velocity] = momentum * velocity + learning_rate * grad
+            updates[master] = master - updates[velocity]
+
+        self._finalize(updates, grads, variables)
+
+
+class LAMB(Optimizer):
+    """Layer-wise Adaptive Moments, Adam optimization for large batches
+
+    The Adam update (with bias correction) plus the weight decay of each
+    parameter is scaled by the trust ratio ||param|| / ||update||, computed
+    in the training step. The excluded parameters (by default the biases
+    and the scales and shifts of :class:`symjax.layers.BatchNormalization`)
+    get the Adam update without weight decay.
+
+    Parameters
+    ----------
+
+    grads_or_loss: scalar tensor or list of gradients
+        either the loss (scalar of Tensor type) to be differentied
+        or the list of gradients already computed and possibly altered
+        manually (such as clipping)
+
+    params: list of parameters to update
+        if grads_or_loss is al list then it should be ordered w.r.t. the
+        given parameters
+
+    learning_rate: constant, Tensor or Schedule
+        the learning rate use to update the parameters
+
+    beta1: float
+        the value of the exponential moving average of the average of the
+        gradients through time (updates)
+
+    beta2: float
+        the value of the exponential moving average of the variance of the
+        gradients through time
+
+    epsilon: float
+        added to the square root of the second moment
+
+    weight_decay: float
+        the weight decay added to the updates of the adapted parameters
+
+    exclude: list of Variable or Layer (optional)
+        the parameters (or the parameters of the layers) that are not
+        adapted, defaults to the parameters with at most one non singleton
+        dimension
+
+    loss_scale: float or DynamicLossScale (optional)
+        see :class:`Optimizer`
+
+    partition: 'states' or 'gradients' (optional)
+        see :class:`Optimizer`
+
+    Attributes
+    ----------
+
+    updates: list of updates
+
+    variables: list of variables
+
+    loss: Tensor or None
+        the value of the loss computed in the same forward pass as the
+        gradients, None if the gradients were given
+
+    """
+    def __init__(self, grads_or_loss, learning_rate, beta1=0.9, beta2=0.999,
+                 epsilon=1e-6, weight_decay=0., exclude=None, params=None,
+                 loss_scale=None, partition=None):
+
+        if params is None:
+            params = [v for k, v in get_graph().variables.items() if v.trainable]
+
+        grads = self._get_grads(grads_or_loss, params, loss_scale,
+                                partition)
+        excluded = _excluded(params, exclude)
+        step = tensor.Variable(numpy.float32(0), trainable=False, name='step')
+        variables = [step]
+        if not numpy.isscalar(learning_rate) and not isinstance(
+                learning_rate, tensor.Placeholder):
+            learning_rate = learning_rate()
+
+        # the bias corrections of the moving averages
+        correction1 = 1 - tensor.power(beta1, step + 1)
+        correction2 = 1 - tensor.power(beta2, step + 1)
+        updates = dict()
+        for param, grad in zip(params, grads):
+            master = self._master(param)
+            m = tensor.Variable(numpy.zeros(master.shape, dtype=master.dtype),
+                                trainable=False, name='m')
+            v = tensor.Variable(numpy.zeros(master.shape, dtype=master.dtype),
+                                trainable=False, name='v')
+            variables += [m, v]
+            updates[m] = beta1 * m + (1 - beta1) * grad
+            updates[v] = beta2 * v + (1 - beta2) * tensor.square(grad)
+            update = (updates[m] / correction1) / (
+                tensor.sqrt(updates[v] / correction2) + epsilon)
+            if param not in excluded:
+                update = update + weight_decay * master
+                update = _trust_ratio(master, update) * update
+            updates[master] = master - learning_rate * update
+        updates[step] = step + 1
+
+        self._finalize(updates, grads, variables)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Mixed precision training.
+
+A precision policy sets the dtypes of the layers of :mod:`symjax.layers`
+created while it is active: their parameters are created in the param dtype,
+their computations are done in the compute dtype (the inputs and parameters
+are cast at the start of the forward pass) and their outputs are cast to the
+output dtype. With the 'mixed_bfloat16' policy the parameters stay float32
+(the master weights updated by the optimizers, their gradients are float32)
+while the matrix multiplications and convolutions run in bfloat16, halving
+the memory of the activations. The normalization layers always compute in the
+param dtype.
+
+float16 has a small range and the gradients of a float16 network underflow,
+the loss is thus scaled up before the differentiation and the gradients
+scaled back down, see :class:`DynamicLossScale` and the loss_scale argument
+of the optimizers of :mod:`symjax.optimizers`.
+
+Example:
+--------
+
+    >>> symjax.precision.set_policy('mixed_bfloat16')
+    >>> layer = symjax.layers.Dense(x, 256)  # bfloat16 output, float32 W
+    >>> loss = T.cast(..., 'float32').mean()
+    >>> symjax.optimizers.Adam(loss, 0.001)
+"""
+
+import numpy
+import jax.numpy as jnp
+
+from symjax import tensor as T
+
+__all__ = ['Policy', 'set_policy', 'get_policy', 'is_low_precision',
+           'DynamicLossScale', 'all_finite']
+
+_LOW_PRECISION = ('float16', 'bfloat16')
+
+
+def is_low_precision(dtype):
+    """whether the dtype is a 16 bits floating point one"""
+    return jnp.dtype(dtype).name in _LOW_PRECISION
+
+
+class Policy:
+    """the dtypes of the layers
+
+    Parameters:
+    -----------
+
+        param_dtype: str
+            the dtype of the parameters of the layers
+
+        compute_dtype: str (optional)
+            the dtype of the computations, defaults to param_dtype
+
+        output_dtype: str (optional)
+            the dtype of the layer outputs, defaults to compute_dtype
+    """
+
+    def __init__(self, param_dtype='float32', compute_dtype=None,
+                 output_dtype=None):
+        self.param_dtype = jnp.dtype(param_dtype).name
+        self.compute_dtype = jnp.dtype(
+            compute_dtype or param_dtype).name
+        self.output_dtype = jnp.dtype(
+            output_dtype or self.compute_dtype).name
+
+    @classmethod
+    def from_name(cls, name):
+        """the policy 'float32', 'bfloat16', 'float16' (all in the given
+        dtype), 'mixed_bfloat16' or 'mixed_float16' (float32 parameters)"""
+        if name.startswith('mixed_'):
+            return cls('float32', name[len('mixed_'):])
+        return cls(name)
+
+    def _cast(self, x, dtype):
+        if x is None or not isinstance(x, T.Tensor) or x.dtype == dtype or\
+                not jnp.issubdtype(x.dtype, jnp.floating):
+            return x
+        return T.cast(x, dtype)
+
+    def cast_to_compute(self, x):
+        """the floating point tensor x cast to the compute dtype"""
+        return self._cast(x, self.compute_dtype)
+
+    def cast_to_param(self, x):
+        """the floating point tensor x cast to the param dtype"""
+        return self._cast(x, self.param_dtype)
+
+    def cast_to_output(self, x):
+        """the floating point tensor x cast to the output dtype"""
+        return self._cast(x, self.output_dtype)
+
+    def __repr__(self):
+        return 'Policy(param_dtype={}, compute_dtype={}, output_dtype={})'\
+            .format(self.param_dtype, self.compute_dtype, self.output_dtype)
+
+
+_policy = Policy()
+
+
+def set_policy(policy):
+    """set the precision policy of the layers created afterwards
+
+    Parameters:
+    -----------
+
+        policy: Policy or str
+            the policy or its name, see :meth:`Policy.from_name`
+    """
+    global _policy
+    if isinstance(policy, str):
+        policy = Policy.from_name(policy)
+    _policy = policy
+
+
+def get_policy():
+    """the current precision policy"""
+    return _policy
+
+
+def all_finite(tensors):
+    """boolean scalar, whether all the values of the tensors are finite"""
+    return T.all(T.stack([T.all(T.isfinite(tensor)) for tensor in tensors]))
+
+
+class DynamicLossScale:
+    """loss scaling adjusted during training
+
+    The scale is divided by factor whenever the scaled gradients overflow
+    (the update is then skipped by the optimizer) and multiplied by factor
+    after period consecutive steps without overflow.
+
+    Parameters:
+    -----------
+
+        init: float
+            the initial scale
+
+        factor: float
+            the growth and backoff factor of the scale
+
+        period: int
+            the number of steps without overflow before increasing the scale
+
+        minimum: float
+            the smallest value of the scale
+
+    Attributes:
+    -----------
+
+        scale: Variable
+            the current scale
+
+        variables: list of variables
+    """
+
+    def __init__(self, init=2. ** 15, factor=2., period=2000, minimum=1.):
+        self.factor = factor
+        self.period = period
+        self.minimum = minimum
+        self.scale = T.Variable(numpy.float32(init), trainable=False,
+                                name='loss_scale')
+        self.counter = T.Variable(numpy.int32(0), trainable=False,
+                                  name='loss_scale_counter')
+        self.variables = [self.scale, self.counter]
+
+    def adjust(self, finite):
+        """the updates of the scale given whether the gradients of the step
+        are all finite"""
+        grow = T.greater_equal(self.counter + 1, self.period)
+        scale = T.where(finite,
+                        T.where(grow, self.scale * self.factor, self.scale),
+                        T.maximum(self.scale / self.factor, self.minimum))
+        counter = T.where(T.logical_and(finite, T.logical_not(grow)),
+                          self.counter + 1, 0)
+        return {self.scale: T.cast(scale, 'float32'),
+                self.counter: T.cast(counter, 'int32')}
@@ -0,0 +1,137 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Named device meshes for the sharded variables.
+
+A variable can be given a sharding spec, one mesh axis name (or None, or a
+tuple of names) per dimension of its value, see :class:`symjax.tensor.Variable`.
+The functions using sharded variables are compiled over a named device mesh
+(the one given to :class:`symjax.function` or the default one set here),
+each device only holds its block of the variable and XLA partitions the
+matrix multiplications and convolutions accordingly.
+
+Example:
+--------
+
+    >>> mesh = symjax.sharding.create_mesh({'batch': 2, 'model': 4})
+    >>> symjax.sharding.set_mesh(mesh)
+    >>> layer = symjax.layers.Dense(x, 4096, W_sharding=(None, 'model'))
+    >>> f = symjax.function(x, outputs=layer)  # W split over 4 devices
+"""
+
+import numpy
+import jax
+
+try:
+    from jax.sharding import Mesh, NamedSharding, PartitionSpec
+except ImportError:
+    Mesh = NamedSharding = PartitionSpec = None
+
+__all__ = ['create_mesh', 'set_mesh', 'get_mesh', 'named_sharding',
+           'check_spec', 'partition_spec', 'device_bytes']
+
+_mesh = None
+
+
+def _check_support():
+    if Mesh is None:
+        raise RuntimeError("sharding requires a jax version with "
+                           "jax.sharding")
+
+
+def create_mesh(axes, devices=None):
+    """a named mesh of devices
+
+    Parameters:
+    -----------
+
+        axes: dict or list of (name, size)
+            the axes of the mesh in order, at most one size can be -1 in
+            which case it takes all the remaining devices
+
+        devices: list (optional)
+            the devices of the mesh, defaults to all the devices
+
+    Returns:
+    --------
+
+        mesh: jax.sharding.Mesh
+    """
+    _check_support()
+    if devices is None:
+        devices = jax.devices()
+    axes = list(axes.items()) if isinstance(axes, dict) else list(axes)
+    names = tuple(name for name, size in axes)
+    sizes = [size for name, size in axes]
+    if sizes.count(-1) > 1:
+        raise ValueError("at most one axis size can be -1")
+    if -1 in sizes:
+        known = int(numpy.prod([size for size in sizes if size != -1]))
+        sizes[sizes.index(-1)] = len(devices) // known
+    total = int(numpy.prod(sizes))
+    if total > len(devices):
+        raise ValueError("a mesh of shape {} needs {} devices, only {} are "
+                         "available".format(tuple(sizes), total, len(devices)))
+    return Mesh(numpy.array(devices[:total]).reshape(sizes), names)
+
+
+def set_mesh(mesh):
+    """set the default mesh of the functions using sharded variables, None
+    to unset it"""
+    global _mesh
+    _mesh = mesh
+
+
+def get_mesh():
+    """the default mesh, None if not set"""
+    return _mesh
+
+
+def check_spec(spec, ndim):
+    """the sharding spec as a tuple, checking it has at most one entry per
+    dimension"""
+    if spec is None:
+        return None
+    spec = tuple(spec)
+    if len(spec) > ndim:
+        raise ValueError("the sharding {} has more entries than the {} "
+                         "dimensions of the value".format(spec, ndim))
+    return spec
+
+
+def partition_spec(shape, size, axis='batch'):
+    """the spec splitting a value of the given shape over the mesh axis of
+    the given size along its first dimension divisible by size, None if
+    there is none (the value is then replicated)"""
+    for dim, length in enumerate(shape):
+        if length >= size and length % size == 0:
+            return (None,) * dim + (axis,)
+    return None
+
+
+def named_sharding(mesh, spec=None):
+    """the sharding over a mesh of a value with the given spec, replicated if
+    spec is None"""
+    _check_support()
+    if spec is None:
+        return NamedSharding(mesh, PartitionSpec())
+    missing = set(name for axis in spec if axis is not None
+                  for name in (axis if isinstance(axis, tuple) else (axis,))
+                  if name not in mesh.axis_names)
+    if missing:
+        raise ValueError("the axes {} are not in the mesh {}".format(
+            sorted(missing), mesh.axis_names))
+    return NamedSharding(mesh, PartitionSpec(*spec))
+
+
+def device_bytes(values):
+    """the number of bytes of the given arrays held on each device, as a
+    dict device: bytes"""
+    usage = dict()
+    for value in values:
+        shards = getattr(value, 'addressable_shards', None)
+        if shards is None:
+            continue
+        for shard in shards:
+            usage[shard.device] = usage.get(shard.device, 0) +\
+                shard.data.nbytes
+    return usage
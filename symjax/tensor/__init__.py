@@ -4,9 +4,11 @@
 __all__ = ["random",
         "signal",
         "linalg",
-        "pdfs"]
+        "pdfs",
+        "passes"]
 
 from .base import *
+from .executor import *
 from .numpy import *
 from .control_flow import *
 from .index_ops import *
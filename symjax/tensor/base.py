@@ -1,11 +1,12 @@
 import jax
 import jax.numpy as jnp
 import jax.random as jnr
-from jax.random import _is_prng_key
 import numpy
 import inspect
 import copy
 from functools import wraps
+from collections import OrderedDict
+from types import MappingProxyType
 import re
 #from ..base import gradients
 #print(base.gradient)
@@ -25,6 +26,14 @@ def _add_method(cls):
     return decorator
 
 
+def _is_function(item):
+    """whether the module member is a function, the jax.numpy functions
+    being also jitted (wrapped) functions"""
+    return inspect.isfunction(item) or (
+        callable(item) and hasattr(item, '__wrapped__') and
+        not isinstance(item, type))
+
+
 def _args_formatting(args, extra_args, indices):
     """ utility function to be used in the Tensor class to correctly join the
     args and extra_args based on the indices
@@ -62,30 +71,108 @@ def reset(item):
             reset(i)
 
 
+# shared by all the nodes created without keyword arguments
+_EMPTY_KWARGS = MappingProxyType({})
+
+
+class RootSet:
+    """set of the roots (variables, placeholders, random tensors) a node
+    depends on
+
+    Root sets are immutable and shared between nodes: a node whose inputs all
+    depend on the same roots simply references the root set of its inputs, and
+    a node joining inputs with different roots creates a new root set only
+    linking to the ones of its inputs. Building a node is thus O(1) in the
+    number of roots and the actual set of roots is only materialized (and
+    cached) when it is asked for, by walking the links iteratively.
+
+    Parameters:
+    -----------
+
+        root: Tensor (optional)
+            the root node for a root set containing a single root
+
+        parents: tuple of RootSet (optional)
+            the root sets that are joined
+    """
+    __slots__ = ('root', 'parents', '_roots')
+
+    def __init__(self, root=None, parents=()):
+        self.root = root
+        self.parents = parents
+        self._roots = None
+
+    def materialize(self):
+        """return the roots as a frozenset"""
+        if self._roots is not None:
+            return self._roots
+        roots = set()
+        visited = set()
+        stack = [self]
+        while stack:
+            rootset = stack.pop()
+            if id(rootset) in visited:
+                continue
+            visited.add(id(rootset))
+            if rootset._roots is not None:
+                roots.update(rootset._roots)
+                continue
+            if rootset.root is not None:
+                roots.add(rootset.root)
+            stack.extend(rootset.parents)
+        self._roots = frozenset(roots)
+        return self._roots
+
+    def __len__(self):
+        return len(self.materialize())
+
+    def __iter__(self):
+        return iter(self.materialize())
+
+
+def _join_rootsets(rootsets):
+    """join root sets without materializing them, identical root sets or root
+    sets directly linked to by another one are only referenced once"""
+    unique = list()
+    for rootset in rootsets:
+        if rootset is None or any(rootset is other for other in unique):
+            continue
+        unique.append(rootset)
+    if len(unique) == 0:
+        return None
+    elif len(unique) == 1:
+        return unique[0]
+    parents = tuple(rootset for rootset in unique
+                    if not any(any(rootset is p for p in other.parents)
+                               for other in unique))
+    if len(parents) == 1:
+        return parents[0]
+    return RootSet(parents=parents)
+
+
+def _collect_rootsets(items):
+    """gather the root sets of all the tensors in (possibly nested) items"""
+    rootsets = list()
+    stack = list(items)
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Tensor):
+            rootsets.append(item._roots)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return rootsets
+
+
 def getroots(item, roots=[]):
-    if isinstance(item, list) or isinstance(item, tuple):
-        return roots + sum([getroots(i, roots) for i in item], [])
-    elif hasattr(item, 'roots'):
-        return roots + item.roots
-    else:
-        return []
+    rootset = _join_rootsets(_collect_rootsets([item]))
+    if rootset is None:
+        return list(roots)
+    return list(roots) + list(rootset.materialize())
 
 
 def get(item, tracker):
-    if isinstance(item, slice) or isinstance(item, numpy.ndarray):
-        return item
-    elif isinstance(item, list):
-        current = [get(i, tracker) for i in item]
-        return current
-    elif isinstance(item, tuple):
-        current = [get(i, tracker) for i in item]
-        return tuple(current)
-    elif item in tracker:
-        return tracker[item]
-    elif hasattr(item, 'get'):
-        return item.get(tracker)
-    else:
-        return item
+    from .executor import evaluate
+    return evaluate(item, tracker)
 
 
 def isvar(item):
@@ -107,12 +194,24 @@ def isvar(item):
 
 class Tensor:
     __array_priority__ = 1000
-    def __init__(self, shape, dtype, roots=[], copyof=None):
+    __slots__ = ('copyof', '_roots', '_shape', '_dtype', '__weakref__')
+
+    def __init__(self, shape, dtype, roots=None, copyof=None):
         self.copyof = copyof
-        self.roots = roots
+        if roots is None or isinstance(roots, RootSet):
+            self._roots = roots
+        else:
+            self._roots = _join_rootsets([RootSet(root=root)
+                                          for root in roots])
         self._shape = tuple(shape)
         self._dtype = dtype
 
+    @property
+    def roots(self):
+        if self._roots is None:
+            return []
+        return list(self._roots.materialize())
+
     def __repr__(self):
         return '(Tensor: shape={}, dtype={})'.format(self.shape, self.dtype)
 
@@ -137,9 +236,7 @@ class Tensor:
             to the original get method. Otherwise, there should never be a call
             of get on a Tensor but always on an Op etc"""
         if self.copyof is not None:
-            output = self.copyof.get(tracker)
-            tracker[self] = output
-            return output
+            return get(self, tracker)
 
 _numpy_signature_re = re.compile(r'^([\w., ]+=)?\s*[\w\.]+\(.*\)$')
 
@@ -171,6 +268,355 @@ def update_numpydoc(docstr, fun, op):
     parameters = '\n'.join(param_list).replace('@@', '\n    ')
     return docstr[:begin_idx + 1] + parameters + docstr[end_idx - 2:]
 
+class ShapeCache:
+    """bounded cache of the shapes and dtypes infered by :func:`jax_wrap`
+
+    An entry is keyed on the wrapped function, the static arguments and the
+    shapes/dtypes of the tensor arguments. Once full, the least recently
+    used entry is evicted. Calls with arguments that can not be used as a key
+    (large arrays, arbitrary objects) simply bypass the cache.
+
+    Parameters:
+    -----------
+
+        maxsize: int
+            the maximum number of entries kept in the cache
+
+    Attributes:
+    -----------
+
+        hits: int
+            the number of inferences answered by the cache
+
+        misses: int
+            the number of inferences that required a jax trace
+
+        fast: int
+            the number of inferences answered by a fast shape rule
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.fast = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return value
+
+    def insert(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.fast = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'fast': self.fast,
+                'size': len(self._entries), 'maxsize': self.maxsize}
+
+
+shape_cache = ShapeCache()
+
+
+class _Unhashable(Exception):
+    pass
+
+
+# numpy arrays given as static arguments are only used in a cache key if they
+# are small, larger ones (windows, filterbanks) bypass the cache
+_MAX_KEY_ARRAY_SIZE = 64
+_KEY_SCALAR_TYPES = (str, bool, int, float, complex, type(None),
+                     type(Ellipsis), numpy.dtype, type)
+
+
+def _abstract_key(item):
+    """hashable description of an argument, tensors are only described by
+    their shape and dtype while static values are described by their type
+    and value"""
+    if isinstance(item, Tensor):
+        return ('tensor', item.shape, numpy.dtype(item.dtype))
+    elif isinstance(item, (list, tuple)):
+        return (type(item).__name__,) + tuple(_abstract_key(i) for i in item)
+    elif isinstance(item, slice):
+        return ('slice', _abstract_key(item.start), _abstract_key(item.stop),
+                _abstract_key(item.step))
+    elif isinstance(item, numpy.ndarray):
+        if item.size > _MAX_KEY_ARRAY_SIZE:
+            raise _Unhashable
+        return ('ndarray', item.shape, item.dtype, item.tobytes())
+    elif isinstance(item, numpy.generic):
+        return ('scalar', item.dtype, item.item())
+    elif isinstance(item, _KEY_SCALAR_TYPES):
+        return (type(item), item)
+    elif callable(item):
+        return ('callable', item)
+    raise _Unhashable
+
+
+def _shape_cache_key(func, args, kwargs):
+    try:
+        key = (func, _abstract_key(args),
+               tuple((name, _abstract_key(kwargs[name]))
+                     for name in sorted(kwargs)))
+        hash(key)
+    except (_Unhashable, TypeError):
+        return None
+    return key
+
+
+def _eval_shape(func, args, kwargs, random_func):
+    """infer the output shape(s) and dtype(s) of func by tracing it with
+    jax.eval_shape, returns a (is_tuple, shape(s), dtype(s)) triplet"""
+
+    # we need to remove the static arguments first
+    # we first do it for the kwars
+    static_kwargs = {}
+    var_kwargs = {}
+    for name, arg in list(kwargs.items()):
+        if not isvar(arg):
+            static_kwargs.update({name: arg})
+        else:
+            var_kwargs.update({name: arg})
+
+    # we need to do the same for the args
+    indices = list()
+    for i, arg in enumerate(args):
+        if not isvar(arg):
+            indices.append(1)
+        else:
+            indices.append(0)
+    static_args = [arg for i, arg in zip(indices, args) if i]
+    var_args = [arg for i, arg in zip(indices, args) if not i]
+
+    # this is just to get shape and dtype so we do not bother
+    # to use the correct seed yet
+    if random_func:
+        key = jax.random.PRNGKey(0)
+        static_args = [key] + static_args
+        indices.insert(0, 1)
+
+    # we need to define an abstract function that only takes as input the
+    # non-static arguments, internally join them with the static ones
+    # and return the output. This is because the jax shape inference
+    # functions does not work with static arguments (such as the dimensions
+    # of the transpose function)
+    def abstract_func(*args, **kwargs):
+        all_args = _args_formatting(args, static_args, indices)
+        return func(*all_args, **kwargs, **static_kwargs)
+
+    # now we evaluate the shape from the jax built-in function, if some
+    # dimensions are unknown the function is traced twice with different
+    # sizes given to those dimensions and the output dimensions that differ
+    # are unknown as well
+    if _has_unknown_dims([var_args, var_kwargs]):
+        trees = [jax.eval_shape(abstract_func, *_probe(var_args, size),
+                                **_probe(var_kwargs, size))
+                 for size in _PROBE_SIZES]
+        tree = _merge_probes(*trees)
+    else:
+        tree = jax.eval_shape(abstract_func, *var_args, **var_kwargs)
+
+    if isinstance(tree, (list, tuple)):
+        return (True, tuple(t.shape for t in tree),
+                tuple(t.dtype for t in tree))
+    return (False, tree.shape, tree.dtype)
+
+
+# sizes given to the unknown (None) dimensions of the tensors when infering
+# the output shapes of an op, all the unknown dimensions of a call get the
+# same size such that they can be broadcasted together
+_PROBE_SIZES = (4096, 6144)
+
+
+def _has_unknown_dims(item):
+    stack = [item]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Tensor):
+            if None in item.shape:
+                return True
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+    return False
+
+
+def _probe(item, size):
+    """replace the tensors with unknown dimensions by abstract arrays where
+    those dimensions have the given size"""
+    if isinstance(item, Tensor):
+        if None not in item.shape:
+            return item
+        shape = tuple(size if dim is None else dim for dim in item.shape)
+        return jax.ShapeDtypeStruct(shape, numpy.dtype(item.dtype))
+    elif isinstance(item, (list, tuple)):
+        return type(item)([_probe(i, size) for i in item])
+    elif isinstance(item, dict):
+        return dict((name, _probe(i, size)) for name, i in item.items())
+    return item
+
+
+def _merge_probes(first, second):
+    if isinstance(first, (list, tuple)):
+        return type(first)([_merge_probes(a, b)
+                            for a, b in zip(first, second)])
+    if len(first.shape) != len(second.shape):
+        raise ValueError('the number of dimensions of the output depends on '
+                         'the unknown dimensions of the inputs')
+    shape = tuple(a if a == b else None
+                  for a, b in zip(first.shape, second.shape))
+    return jax.ShapeDtypeStruct(shape, first.dtype)
+
+
+# fast shape rules for the most common elementwise and reduction ops, they
+# return None whenever the arguments are not the simple case they handle, in
+# which case the inference falls back to the cache/jax. To stay exact w.r.t.
+# the jax type promotion they only deal with floating point tensors
+
+def _floating_dtype(item):
+    dtype = jax.dtypes.canonicalize_dtype(numpy.dtype(item.dtype))
+    if dtype.kind == 'f':
+        return dtype
+    return None
+
+
+def _broadcast_shapes(shapes):
+    ndim = max(len(shape) for shape in shapes)
+    padded = [(1,) * (ndim - len(shape)) + tuple(shape) for shape in shapes]
+    output = []
+    for dims in zip(*padded):
+        sizes = set(dim for dim in dims if dim != 1)
+        if len(sizes) > 1:
+            return None
+        output.append(sizes.pop() if len(sizes) else 1)
+    return tuple(output)
+
+
+def _unary_rule(args, kwargs):
+    if len(args) != 1 or len(kwargs) or not isinstance(args[0], Tensor):
+        return None
+    dtype = _floating_dtype(args[0])
+    if dtype is None:
+        return None
+    return (False, args[0].shape, dtype)
+
+
+def _elementwise_dtype(args, kwargs):
+    if len(args) != 2 or len(kwargs):
+        return None
+    tensors = [arg for arg in args if isinstance(arg, Tensor)]
+    if len(tensors) == 0:
+        return None
+    dtypes = set(_floating_dtype(tensor) for tensor in tensors)
+    if len(dtypes) != 1 or None in dtypes:
+        return None
+    # python scalars are only allowed if they can not promote the tensor
+    for arg in args:
+        if isinstance(arg, Tensor):
+            continue
+        if type(arg) not in (int, float) or not abs(arg) < 1e38:
+            return None
+    shape = _broadcast_shapes([tensor.shape for tensor in tensors])
+    if shape is None:
+        return None
+    return shape, dtypes.pop()
+
+
+def _binary_rule(args, kwargs):
+    inferred = _elementwise_dtype(args, kwargs)
+    if inferred is None:
+        return None
+    return (False,) + inferred
+
+
+def _comparison_rule(args, kwargs):
+    inferred = _elementwise_dtype(args, kwargs)
+    if inferred is None:
+        return None
+    return (False, inferred[0], numpy.dtype('bool'))
+
+
+def _reduction_rule(args, kwargs):
+    if len(args) not in [1, 2] or not isinstance(args[0], Tensor):
+        return None
+    if len(set(kwargs) - set(['axis', 'keepdims'])):
+        return None
+    if len(args) == 2 and 'axis' in kwargs:
+        return None
+    dtype = _floating_dtype(args[0])
+    if dtype is None:
+        return None
+    axis = args[1] if len(args) == 2 else kwargs.get('axis', None)
+    keepdims = kwargs.get('keepdims', False)
+    if not isinstance(keepdims, bool):
+        return None
+
+    shape = args[0].shape
+    ndim = len(shape)
+    if axis is None:
+        axes = list(range(ndim))
+    else:
+        if not isinstance(axis, (list, tuple)):
+            axis = (axis,)
+        for ax in axis:
+            if type(ax) != int or not -ndim <= ax < ndim:
+                return None
+        axes = [ax % ndim for ax in axis]
+        if len(set(axes)) != len(axes):
+            return None
+    if keepdims:
+        shape = tuple(1 if i in axes else dim for i, dim in enumerate(shape))
+    else:
+        shape = tuple(dim for i, dim in enumerate(shape) if i not in axes)
+    return (False, shape, dtype)
+
+
+_SHAPE_RULES = {}
+for _names, _rule in [
+        (['abs', 'absolute', 'arctan', 'ceil', 'cos', 'cosh', 'exp', 'expm1',
+          'floor', 'log', 'log1p', 'sin', 'sinh', 'sqrt', 'square', 'tan',
+          'tanh'], _unary_rule),
+        (['add', 'divide', 'maximum', 'minimum', 'multiply', 'power',
+          'subtract', 'true_divide'], _binary_rule),
+        (['equal', 'greater', 'greater_equal', 'less', 'less_equal',
+          'not_equal'], _comparison_rule),
+        (['amax', 'amin', 'max', 'mean', 'min', 'prod', 'std', 'sum', 'var'],
+         _reduction_rule)]:
+    for _name in _names:
+        if hasattr(jnp, _name):
+            _SHAPE_RULES[getattr(jnp, _name)] = _rule
+for _name in ['relu', 'sigmoid', 'softplus', 'swish', 'silu']:
+    if hasattr(jax.nn, _name):
+        _SHAPE_RULES[getattr(jax.nn, _name)] = _unary_rule
+
+
+def _fast_shape(func, args, kwargs):
+    try:
+        rule = _SHAPE_RULES.get(func, None)
+    except TypeError:
+        return None
+    if rule is None:
+        return None
+    return rule(args, kwargs)
+
+
 def jax_wrap(func, insert_default_kwargs=True, doc_func=None):
     if doc_func is None:
         doc_func=func
@@ -184,58 +630,32 @@ def jax_wrap(func, insert_default_kwargs=True, doc_func=None):
         from . import random
         random_func = func in random._RANDOM_FUNCTIONS
 
-        # we need to remove the static arguments first
-        # we first do it for the kwars
-        static_kwargs = {}
-        var_kwargs = {}
-        for name, arg in list(kwargs.items()):
-            if not isvar(arg):
-                static_kwargs.update({name: arg})
-            else:
-                var_kwargs.update({name: arg})
-
-        # we need to do the same for the args
-        indices = list()
-        for i, arg in enumerate(args):
-            if not isvar(arg):
-                indices.append(1)
-            else:
-                indices.append(0)
-        static_args = [arg for i, arg in zip(indices, args) if i]
-        var_args = [arg for i, arg in zip(indices, args) if not i]
-
-        # this is just to get shape and dtype so we do not bother
-        # to use the correct seed yet
-        if random_func:
-            key = jax.random.PRNGKey(0)
-            static_args = [key] + static_args
-            indices.insert(0, 1)
-
-        # we need to define an abstract function that only takes as input the
-        # non-static arguments, internally join them with the static ones
-        # and return the output. This is because the jax shape inference
-        # functions does not work with static arguments (such as the dimensions
-        # of the transpose function)
-        def abstract_func(*args, **kwargs):
-            all_args = _args_formatting(args, static_args, indices)
-            return func(*all_args, **kwargs, **static_kwargs)
-
-        # now we evaluate the shape from the jax built-in function
-        tree = jax.eval_shape(abstract_func, *var_args, **var_kwargs)
+        # the output shapes only depend on the function, the static arguments
+        # and the shapes/dtypes of the tensor arguments, we thus first try the
+        # fast rules, then the cache and only then trace with jax
+        inferred = _fast_shape(func, args, kwargs)
+        if inferred is None:
+            key = _shape_cache_key(func, args, kwargs)
+            if key is not None:
+                inferred = shape_cache.lookup(key)
+            if inferred is None:
+                inferred = _eval_shape(func, args, kwargs, random_func)
+                if key is not None:
+                    shape_cache.insert(key, inferred)
+        else:
+            shape_cache.fast += 1
 
         # now we determine if it is an Op or a Tuple object based on the
         # infered shape
-        if type(tree) == list or type(tree) == tuple:
-            shapes = [t.shape for t in tree]
-            dtypes = [t.dtype for t in tree]
+        is_tuple, shape, dtype = inferred
+        if is_tuple:
             return Tuple(
                 *args,
                 _jax_function=func,
-                _shapes=shapes,
-                _dtypes=dtypes,
+                _shapes=shape,
+                _dtypes=dtype,
                 **kwargs)
         elif random_func:
-            shape, dtype = tree.shape, tree.dtype
             return RandomOp(
                 *args,
                 _jax_function=func,
@@ -244,7 +664,6 @@ def jax_wrap(func, insert_default_kwargs=True, doc_func=None):
                 _seed=seed,
                 **kwargs)
         else:
-            shape, dtype = tree.shape, tree.dtype
             return Op(*args, _jax_function=func, _shape=shape, _dtype=dtype,
                       **kwargs)
 
@@ -293,18 +712,21 @@ def jax_wrap(func, insert_default_kwargs=True, doc_func=None):
 
 class Op(Tensor):
     """an Op generates a Tensor object obtained from a function"""
+    __slots__ = ('args', 'kwargs', 'jax_function')
 
-    def __init__(self, *args, _jax_function, _shape, _dtype, roots=[], **kwargs):
+    def __init__(self, *args, _jax_function, _shape, _dtype, roots=(),
+                 **kwargs):
 
-        # save args and kwargs
-        self.kwargs = kwargs
+        # save args and kwargs, nodes without kwargs share the same empty
+        # mapping
+        self.kwargs = kwargs if len(kwargs) else _EMPTY_KWARGS
         self.args = args
         self.jax_function = _jax_function
 
         # set roots
-        roots = list(set(getroots(list(kwargs.values())+ list(args)) + roots))
+        rootsets = _collect_rootsets([args, list(kwargs.values()), roots])
 
-        super().__init__(_shape, _dtype, roots)
+        super().__init__(_shape, _dtype, _join_rootsets(rootsets))
 
     def __repr__(self):
         name = 'Tensor(Op={}, shape={}, dtype={})'
@@ -318,14 +740,7 @@ class Op(Tensor):
             tracker = dict()
         elif self in tracker:
             return tracker[self]
-
-        # evaluate the function kwargs as explicit jax arrays
-        kwargs = dict()
-        for name, var in list(self.kwargs.items()):
-            kwargs.update({name: get(var, tracker)})
-        args = [get(var, tracker) for var in self.args]
-        tracker[self] = self.jax_function(*args, **kwargs)
-        return tracker[self]
+        return get(self, tracker)
 
 
 class RandomOp(Tensor):
@@ -355,51 +770,46 @@ class RandomOp(Tensor):
         (Tensor, dtype=int32, shape=(3, 3))
     """
 
+    __slots__ = ('args', 'kwargs', 'jax_function', 'seed', 'state', 'uid')
+
     def __init__(self, *args, _jax_function, _shape, _dtype, _seed, **kwargs):
 
-        self.kwargs = kwargs
+        self.kwargs = kwargs if len(kwargs) else _EMPTY_KWARGS
         self.args = args
         self.jax_function = _jax_function
-#        if _seed is None:
-#            self.seed = numpy.random.randint(0, 1000000)
-#        else:
         self.seed = _seed
 
+        # the key is derived from the rng state variable (advanced by the
+        # functions at each call) and a stable id, the seed if given
+        from .random import get_state, _next_uid
+        self.state = get_state()
+        self.uid = _next_uid() if _seed is None else _seed
+
         # set roots
-        roots = getroots([i for i in kwargs.values()] + list(args))
-        roots = list(set(roots)) + [self]
+        rootsets = _collect_rootsets([args, list(kwargs.values())])
+        rootsets.append(self.state._roots)
 
-        super().__init__(_shape, _dtype, roots)
+        super().__init__(_shape, _dtype, _join_rootsets(rootsets))
 
     def __repr__(self):
         name = 'RandomTensor(Op={}, shape={}, dtype={})'
         return name.format(self.jax_function.__name__, self.shape, self.dtype)
 
+    def get_key(self, state):
+        """the PRNGKey used to sample the random tensor given the value of
+        the rng state"""
+        return jax.random.fold_in(state, self.uid)
+
     def get(self, tracker=None):
         if tracker is None:
             tracker = dict()
         elif self in tracker:
             return tracker[self]
-        # argument list
-        seed = self.seed or numpy.random.randint(0, 1000000)
-        if 'rng' in tracker:
-            key = jax.random.PRNGKey(seed + tracker['rng'])
-        else:
-            key = jax.random.PRNGKey(seed)
-
-        # evaluate the function kwargs as explicit jax arrays
-        kwargs = dict()
-        for name, var in list(self.kwargs.items()):
-            kwargs.update({name: get(var, tracker)})
-        args = [get(var, tracker) for var in self.args]
-        tracker[self] = self.jax_function(key, *args, **kwargs)
-        return tracker[self]
-
-        self.args[0] = key
-        return super().get(tracker)
+        return get(self, tracker)
 
 
 class TupleItem(Tensor):
+    __slots__ = ('parent', 'index')
 
     def __init__(self, shape, dtype, index, parent, roots, name=''):
         self.parent = parent
@@ -407,14 +817,19 @@ class TupleItem(Tensor):
         super().__init__(shape, dtype, roots=roots)
 
     def get(self, tracker=None):
-        return self.parent.get(tracker)[self.index]
+        if tracker is None:
+            tracker = dict()
+        elif self in tracker:
+            return tracker[self]
+        return get(self, tracker)
 
 
 class Tuple(tuple):
 
     def __new__(cls, *args, _jax_function, _shapes, _dtypes, **kwargs):
 
-        roots = list(set(getroots(list(kwargs.values())+ list(args))))
+        roots = _join_rootsets(
+            _collect_rootsets([args, list(kwargs.values())]))
 
         items = [TupleItem(shape, dtype, i, None, roots=roots)
                  for i, (shape, dtype) in enumerate(zip(_shapes, _dtypes))]
@@ -450,22 +865,9 @@ class Tuple(tuple):
         if self in tracker:
             return tracker[self]
 
-        # kwarg dictionnary
-        args = list()
-        for var in self.args:
-            args.append(get(var, tracker))
-
-        kwargs = dict()
-        for name, var in self.kwargs.items():
-            kwargs.update({name: get(var, tracker)})
-
-        # we add the list object itself into the dictionnary first
-        tracker[self] = tuple(self.jax_function(*args, **kwargs))
-
-        # then we add each element of the list into the dictionnary
-        for i in range(len(self)):
-            tracker[self[i]] = tracker[self][i]
-
+        # the items are evaluated (and added into the tracker) along with
+        # the list object itself
+        get(list(self), tracker)
         return tracker[self]
 
 
@@ -495,10 +897,25 @@ class Variable(Tensor):
         trainable: bool
             whether the variable is trainable or not. It is set as an
             attribute and can be accessed.
+
+        sharding: tuple (optional)
+            how the value is split over a named device mesh (see
+            :mod:`symjax.sharding`), one entry per leading dimension: the
+            name of the mesh axis the dimension is split over, a tuple of
+            names, or None if not split. The functions using the variable
+            hold a block of its value per device, by default the value is
+            replicated
+
+        mesh: jax.sharding.Mesh (optional)
+            the mesh the sharding refers to, used by the functions not
+            given a mesh when no default mesh is set
     """
 
-    def __init__(self, tensor, name='', trainable=True):
-        
+    __slots__ = ('trainable', 'name', 'tensor', 'value', 'sharding', 'mesh')
+
+    def __init__(self, tensor, name='', trainable=True, sharding=None,
+                 mesh=None):
+
         self.trainable = trainable
         from symjax import get_graph
         self.name = self.generate_name(name)
@@ -516,8 +933,11 @@ class Variable(Tensor):
 
         self._shape = shape
         self._dtype = dtype
+        from symjax.sharding import check_spec
+        self.sharding = check_spec(sharding, len(shape))
+        self.mesh = mesh
 
-        super().__init__(shape, dtype, roots=[self])
+        super().__init__(shape, dtype, roots=RootSet(root=self))
 
     def generate_name(self, name):
 
@@ -554,11 +974,12 @@ class Variable(Tensor):
         nothing guarantees that the reset will give back the original value
         as opposed to the array case
         """
-        self.value = jnp.asarray(self._get_value())
+        self.value = jnp.array(self._get_value())
 
     def assign(self, value):
-        """assign a new value ot the variable"""
-        self.value = jnp.asarray(value)
+        """assign a new value ot the variable, the value is copied as the
+        buffer of a variable can be donated to the functions updating it"""
+        self.value = jnp.array(value)
 
 
     def __repr__(self):
@@ -583,7 +1004,10 @@ class Placeholder(Tensor):
     -----------
 
         shape: tuple
-            the shape of the placeholder
+            the shape of the placeholder, a dimension can be None in which
+            case any size is accepted by the compiled functions (one
+            executable is compiled per size), e.g. (None, 1, 16000) for
+            batches of variable size
 
         dtype: dtype
             the dtype of the placeholder
@@ -592,9 +1016,11 @@ class Placeholder(Tensor):
             the name of the variable, there is no test of name duplication
     """
 
+    __slots__ = ('name',)
+
     def __init__(self, shape, dtype, name=''):
         self.name = name
-        super().__init__(shape, dtype, roots=[self])
+        super().__init__(shape, dtype, roots=RootSet(root=self))
 
     def __repr__(self):
         return '(Placeholder: ' + self.name + 'dtype=' + str(self.dtype) + \
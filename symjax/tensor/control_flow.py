@@ -1,11 +1,99 @@
+import jax
 import jax.lax as jla
-from .base import jax_wrap, symjax_to_jax_fn
+from .base import (jax_wrap, symjax_to_jax_fn, Tensor, Variable,
+                   Placeholder)
 
 cond = jax_wrap(jla.cond)
 fori_loop = jax_wrap(jla.fori_loop)
 while_loop = jax_wrap(jla.while_loop)
 
 
+def _save_matmul_conv(primitive, *args, **params):
+    return primitive in (jla.dot_general_p, jla.conv_general_dilated_p)
+
+
+def _checkpoint_policies():
+    policies = getattr(jax, 'checkpoint_policies', None)
+    if policies is None:
+        return {'nothing': None}
+    return {'nothing': policies.nothing_saveable,
+            'matmul_conv': _save_matmul_conv,
+            'dots': policies.dots_saveable,
+            'dots_no_batch': policies.dots_with_no_batch_dims_saveable}
+
+
+CHECKPOINT_POLICIES = _checkpoint_policies()
+
+
+def checkpoint(outputs, inputs=(), policy=None):
+    """recompute a segment of the graph in the backward pass instead of
+    keeping its intermediate values alive (gradient checkpointing)
+
+    The segment is made of the nodes needed to compute the outputs from the
+    inputs (the graph is cut at the inputs, the variables and placeholders
+    it depends on are inputs as well). Only the inputs and outputs of the
+    segment, and the intermediate values selected by the policy, are kept
+    for the gradients, the others are recomputed through
+    :func:`jax.checkpoint`. The values of the outputs are unchanged.
+
+    Parameters:
+    -----------
+
+        outputs: Tensor or list of Tensor
+            the outputs of the segment
+
+        inputs: list of Tensor (optional)
+            the tensors at which the segment starts, by default the segment
+            goes back to the variables and placeholders
+
+        policy: str or callable (optional)
+            which intermediate values are kept, one of CHECKPOINT_POLICIES:
+            'nothing' (default, everything is recomputed), 'matmul_conv'
+            (the outputs of the matrix multiplications and convolutions are
+            kept, the elementwise ops are recomputed), 'dots' and
+            'dots_no_batch', or a jax checkpoint policy
+
+    Returns:
+    --------
+
+        outputs: Tensor or list of Tensor
+            the checkpointed outputs
+
+    Example:
+    --------
+
+        >>> h = x
+        >>> for i in range(4):
+        >>>     h = T.relu(T.dot(h, W[i]))
+        >>> h = T.checkpoint(h, [x], policy='matmul_conv')
+    """
+    from .executor import Executor, topological_sort
+    from .passes import NESTED_PASSES
+    if isinstance(policy, str):
+        policy = CHECKPOINT_POLICIES[policy]
+    inputs = list(inputs)
+    given = set(id(node) for node in inputs)
+    leaves = [node for node in topological_sort(outputs, inputs)
+              if id(node) not in given and
+              isinstance(node, (Variable, Placeholder))]
+    args = inputs + leaves
+    executor = Executor(outputs, args)
+    executor.optimize(NESTED_PASSES)
+
+    def fn(*values):
+        return executor(*values)
+
+    remat = getattr(jax, 'checkpoint', None) or jax.remat
+    if policy is None:
+        checkpointed = remat(fn)
+    else:
+        checkpointed = remat(fn, policy=policy)
+    result = jax_wrap(checkpointed, False)(*args)
+    if isinstance(outputs, Tensor):
+        return result
+    return list(result)
+
+
 
 def _scan(f, init, sequences, non_sequences=None, length=None, reverse=False):
     """Scan a function over leading array axes while carrying along state.
@@ -0,0 +1,290 @@
+"""Iterative evaluation of symbolic graphs.
+
+The graph reachable from some outputs is sorted topologically once and turned
+into a flat program: each node gets a slot in an array of values and is
+evaluated by an instruction reading the slots of its inputs. Evaluating the
+program is a simple loop, there is no recursion, thus arbitrarily deep graphs
+(unrolled RNNs, very deep networks) can be evaluated and traced by jax.
+"""
+
+from .base import (Tensor, Op, RandomOp, Tuple, TupleItem, Variable,
+                   Placeholder)
+
+__all__ = ['Executor', 'evaluate', 'topological_sort']
+
+
+# instruction kinds
+_GIVEN = 0
+_VARIABLE = 1
+_CONSTANT = 2
+_OP = 3
+_RANDOM = 4
+_TUPLE = 5
+_ITEM = 6
+_COPY = 7
+
+
+class _Slot:
+    """reference to the value of a node in the program"""
+    __slots__ = ('index',)
+
+    def __init__(self, index):
+        self.index = index
+
+
+class _Constant:
+    """(possibly nested) argument that does not contain any node"""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def _resolve(spec, values):
+    kind = type(spec)
+    if kind is _Slot:
+        return values[spec.index]
+    elif kind is _Constant:
+        return spec.value
+    elif kind is list:
+        return [_resolve(item, values) for item in spec]
+    else:
+        return tuple([_resolve(item, values) for item in spec])
+
+
+def _contains_node(item):
+    stack = [item]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Tensor):
+            return True
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return False
+
+
+def _spec(item, slots):
+    """replace the nodes of a (possibly nested) argument by their slots"""
+    if isinstance(item, Tensor):
+        return _Slot(slots[id(item)])
+    elif not _contains_node(item):
+        return _Constant(item)
+    elif isinstance(item, list):
+        return [_spec(i, slots) for i in item]
+    else:
+        return tuple([_spec(i, slots) for i in item])
+
+
+def _nodes(items):
+    """the nodes contained in (possibly nested) items"""
+    nodes = list()
+    stack = [items]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Tensor):
+            nodes.append(item)
+        elif isinstance(item, (list, tuple)):
+            stack.extend(reversed(item))
+    return nodes
+
+
+def _parents(node):
+    """the nodes a node directly depends on"""
+    if isinstance(node, RandomOp):
+        return _nodes([node.state, node.args, list(node.kwargs.values())])
+    elif isinstance(node, (Op, Tuple)):
+        return _nodes([node.args, list(node.kwargs.values())])
+    elif isinstance(node, TupleItem):
+        return [node.parent]
+    elif isinstance(node, Tensor) and node.copyof is not None:
+        return [node.copyof]
+    return []
+
+
+def topological_sort(outputs, givens=()):
+    """sort the nodes needed to compute the outputs, each node comes after
+    all its inputs. The inputs of the nodes in givens are not visited as
+    their value will be given.
+
+    Parameters:
+    -----------
+
+        outputs: Tensor or (nested) list/tuple of Tensor
+            the nodes to compute
+
+        givens: list of Tensor
+            the nodes whose values will be given
+
+    Returns:
+    --------
+
+        nodes: list
+            the sorted nodes
+    """
+    given_ids = set(id(node) for node in givens)
+    order = list()
+    visited = set()
+    stack = [(node, False) for node in reversed(_nodes(outputs))]
+    while stack:
+        node, expanded = stack.pop()
+        if expanded:
+            order.append(node)
+            continue
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        stack.append((node, True))
+        if id(node) in given_ids:
+            continue
+        for parent in reversed(_parents(node)):
+            if id(parent) not in visited:
+                stack.append((parent, False))
+    return order
+
+
+def _execute(instruction, values, inputs):
+    """evaluate a single instruction and store its value"""
+    kind, index, a, b, c = instruction
+    if kind == _OP:
+        if c is None:
+            values[index] = a(*_resolve(b, values))
+        else:
+            values[index] = a(*_resolve(b, values),
+                              **dict((name, _resolve(spec, values))
+                                     for name, spec in c.items()))
+    elif kind == _ITEM:
+        values[index] = values[a][b]
+    elif kind == _GIVEN:
+        values[index] = inputs[a]
+    elif kind == _VARIABLE:
+        values[index] = a.value
+    elif kind == _RANDOM:
+        kwargs = dict() if c is None else dict(
+            (name, _resolve(spec, values)) for name, spec in c.items())
+        state, *args = _resolve(b, values)
+        values[index] = a.jax_function(a.get_key(state), *args, **kwargs)
+    elif kind == _TUPLE:
+        kwargs = dict() if c is None else dict(
+            (name, _resolve(spec, values)) for name, spec in c.items())
+        values[index] = tuple(a(*_resolve(b, values), **kwargs))
+    elif kind == _COPY:
+        values[index] = values[a]
+    else:
+        values[index] = a
+
+
+class Executor:
+    """compiled evaluation schedule of a symbolic graph
+
+    The schedule is computed once at construction, calling the executor
+    evaluates the graph iteratively from a flat array of values. This is
+    used by :class:`symjax.function` (where the call is traced by jax),
+    :func:`symjax.gradients`, :func:`symjax.jacobians` and the eager
+    ``.get()`` of the tensors.
+
+    Parameters:
+    -----------
+
+        outputs: Tensor or (nested) list/tuple of Tensor
+            the nodes to evaluate, the structure is kept in the returned
+            values
+
+        inputs: list of Tensor (optional)
+            the nodes whose values are given (positionally) when calling
+            the executor, they can be placeholders, variables or any other
+            node in which case its inputs are not evaluated
+
+    Examples:
+    ---------
+
+        >>> x = T.Placeholder((3,), 'float32')
+        >>> executor = Executor([x * 2, x.sum()], [x])
+        >>> executor(numpy.ones(3))
+        [DeviceArray([2., 2., 2.], dtype=float32), DeviceArray(3., dtype=float32)]
+    """
+
+    def __init__(self, outputs, inputs=()):
+        self.inputs = list(inputs)
+        self.nodes = topological_sort(outputs, self.inputs)
+
+        positions = dict((id(node), i) for i, node in enumerate(self.inputs))
+        slots = dict()
+        program = list()
+        for index, node in enumerate(self.nodes):
+            slots[id(node)] = index
+            program.append(self._instruction(node, index, slots, positions))
+        self.program = program
+        self.outputs = _spec(outputs, slots)
+
+    def _instruction(self, node, index, slots, positions):
+        if id(node) in positions:
+            return (_GIVEN, index, positions[id(node)], None, None)
+        elif isinstance(node, Variable):
+            return (_VARIABLE, index, node, None, None)
+        elif isinstance(node, Placeholder):
+            raise ValueError(' no value given for placeholder {}'.format(node))
+        elif isinstance(node, (Op, RandomOp, Tuple)):
+            args = _spec(node.args, slots)
+            if len(node.kwargs):
+                kwargs = dict((name, _spec(var, slots))
+                              for name, var in node.kwargs.items())
+            else:
+                kwargs = None
+            if isinstance(node, RandomOp):
+                # the value of the rng state is read as the first argument
+                args = _spec((node.state,) + tuple(node.args), slots)
+                return (_RANDOM, index, node, args, kwargs)
+            elif isinstance(node, Tuple):
+                return (_TUPLE, index, node.jax_function, args, kwargs)
+            return (_OP, index, node.jax_function, args, kwargs)
+        elif isinstance(node, TupleItem):
+            return (_ITEM, index, slots[id(node.parent)], node.index, None)
+        elif node.copyof is not None:
+            return (_COPY, index, slots[id(node.copyof)], None, None)
+        return (_CONSTANT, index, None, None, None)
+
+    def __len__(self):
+        return len(self.program)
+
+    def optimize(self, passes=None):
+        """rewrite the program with a pipeline of graph passes, see
+        :func:`symjax.tensor.passes.optimize`"""
+        from .passes import optimize
+        return optimize(self, passes)
+
+    def run(self, inputs):
+        """evaluate the program and return the values of all its nodes"""
+        values = [None] * len(self.nodes)
+        for instruction in self.program:
+            _execute(instruction, values, inputs)
+        return values
+
+    def __call__(self, *inputs):
+        return _resolve(self.outputs, self.run(inputs))
+
+
+def evaluate(outputs, tracker=None):
+    """evaluate nodes given a dictionnary of known values
+
+    The tracker maps nodes to their values, it is filled with the values of
+    all the evaluated nodes. The random tensors are sampled from the current
+    value of the rng state (see :func:`symjax.tensor.random.get_state`),
+    which is then advanced (unless given in the tracker) as by each call of
+    a function: every evaluation draws new samples.
+    """
+    if tracker is None:
+        tracker = dict()
+    inputs = [node for node in tracker if not isinstance(node, str)]
+    executor = Executor(outputs, inputs)
+    values = executor.run([tracker[node] for node in inputs])
+    for node, value in zip(executor.nodes, values):
+        tracker[node] = value
+    given = set(id(node) for node in inputs)
+    states = dict((id(a.state), a.state) for kind, index, a, b, c
+                  in executor.program if kind == _RANDOM and
+                  id(a.state) not in given)
+    if states:
+        from .random import _advance
+        for state in states.values():
+            state.value = _advance(state.value)
+    return _resolve(executor.outputs, values)
@@ -1,9 +1,20 @@
-import jax
+import numpy
 import sys
 from .base import jax_wrap
 module = sys.modules[__name__]
 
-index = jax.ops.index
-for name in ['index_update', 'index_min', 'index_add', 'index_max']:
-    setattr(module, name, jax_wrap(jax.ops.__dict__[name]))
+index = numpy.index_exp
+
+
+def _index_op(name, method):
+    # the functional index updates of jax arrays (x.at[idx].method(y))
+    def op(x, idx, y):
+        return getattr(x.at[idx], method)(y)
+    op.__name__ = name
+    return op
+
+
+for name, method in [('index_update', 'set'), ('index_min', 'min'),
+                     ('index_add', 'add'), ('index_max', 'max')]:
+    setattr(module, name, jax_wrap(_index_op(name, method)))
 
@@ -3,13 +3,13 @@ import jax.numpy.linalg as jnpl
 import numpy
 import jax
 import jax.lax as jla
-from .base import Op, Tuple, jax_wrap
+from .base import Op, Tuple, jax_wrap, _is_function
 import ast
 import inspect
 import sys
 
 
-NAMES = [c[0] for c in inspect.getmembers(jnpl, inspect.isfunction)]
+NAMES = [c[0] for c in inspect.getmembers(jnpl, _is_function)]
 module = sys.modules[__name__]
 for name in NAMES:
     module.__dict__.update(
@@ -2,7 +2,7 @@ import jax.numpy as jnp
 import numpy
 import jax
 import jax.lax as jla
-from .base import Op, Tuple, jax_wrap
+from .base import Op, Tuple, jax_wrap, _is_function
 from .other import stop_gradient
 from .control_flow import cond
 import ast
@@ -12,7 +12,7 @@ from .ops_nn import relu
 
 module = sys.modules[__name__]
 
-_JNP_NAMES = [c[0] for c in inspect.getmembers(jnp, inspect.isfunction)]
+_JNP_NAMES = [c[0] for c in inspect.getmembers(jnp, _is_function)]
 _TO_SKIP = [
     '<lambda>',
     'blackman',
@@ -153,6 +153,8 @@ def flatten2d(input):
     assert input.ndim > 1
     if input.ndim == 2:
         return input
+    if input.shape[0] is None:
+        return reshape(input, (-1, int(numpy.prod(input.shape[1:]))))
     return reshape(input, (input.shape[0], -1))
 
 def logsumexp(x, axis):
@@ -2,7 +2,7 @@ import jax.numpy as jnp
 import numpy
 import jax
 import jax.lax as jla
-from .base import Op, Tuple, jax_wrap
+from .base import Op, Tuple, jax_wrap, _is_function
 from .control_flow import cond
 import ast
 import inspect
@@ -12,7 +12,7 @@ from .ops_nn import relu
 module = sys.modules[__name__]
 
 
-index = jax.ops.index
+index = numpy.index_exp
 
 def hat_1D(x, t_left, t_center, t_right):
     """hat basis function in 1-D
@@ -156,7 +156,7 @@ def one_hot(i, N, dtype='float32'):
 #        raise ValueError('Not Implemented upsample')
 
 
-_JNP_NAMES = [c[0] for c in inspect.getmembers(jnp, inspect.isfunction)]
+_JNP_NAMES = [c[0] for c in inspect.getmembers(jnp, _is_function)]
 _TO_SKIP = [
     '<lambda>',
     'blackman',
@@ -285,8 +285,7 @@ for name in _JNP_NAMES:
         continue
     module.__dict__.update({name: jax_wrap(jnp.__dict__[name])})
 
-for name in ['index_update', 'index_min', 'index_add', 'index_max']:
-    module.__dict__.update({name: jax_wrap(jax.ops.__dict__[name])})
+from .index_ops import index_update, index_min, index_add, index_max
 
 
 
@@ -305,6 +304,8 @@ def flatten2d(input):
     assert input.ndim > 1
     if input.ndim == 2:
         return input
+    if input.shape[0] is None:
+        return reshape(input, (-1, int(numpy.prod(input.shape[1:]))))
     return reshape(input, (input.shape[0], -1))
 
 def logsumexp(x, axis):
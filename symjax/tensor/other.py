@@ -136,7 +136,7 @@ def _one_hot(i, N, dtype='float32'):
 
     if len(s) == 0:
         z = jnp.zeros((N,), dtype)
-        return jax.ops.index_add(z, i, 1)
+        return z.at[i].add(1)
     else:
         return (i[:, None] == jnp.arange(N)).astype(dtype)
 
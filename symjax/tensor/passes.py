@@ -0,0 +1,430 @@
+"""Graph passes rewriting the program of an :class:`Executor` before it is
+traced.
+
+A pass is any callable taking the executor and rewriting in place its
+program (the list of instructions) and its outputs. The default pipeline
+shares the forward pass of the values computed along their gradients,
+merges common subexpressions, applies simple algebraic simplifications,
+folds the constant subgraphs (the ones not depending on any placeholder,
+variable or random tensor) and finally removes the nodes that are not needed
+anymore.
+"""
+
+import time
+import numpy
+import jax
+import jax.numpy as jnp
+import jax.lax as jla
+
+from .executor import (_Slot, _Constant, _execute, _GIVEN, _VARIABLE,
+                       _CONSTANT, _OP, _RANDOM, _TUPLE, _ITEM, _COPY)
+
+__all__ = ['optimize', 'PassReport', 'PASSES', 'DEFAULT_PASSES',
+           'NESTED_PASSES',
+           'fuse_value_and_gradients', 'common_subexpression_elimination', 'algebraic_simplification',
+           'constant_folding', 'dead_node_elimination']
+
+
+def _slots(specs):
+    """slots of a (nested) list of specs"""
+    slots = list()
+    stack = list(specs)
+    while stack:
+        spec = stack.pop()
+        if type(spec) is _Slot:
+            slots.append(spec.index)
+        elif type(spec) in [list, tuple]:
+            stack.extend(spec)
+    return slots
+
+
+def _inputs(instruction):
+    """slots read by an instruction"""
+    kind, index, a, b, c = instruction
+    if kind in [_ITEM, _COPY]:
+        return [a]
+    elif kind in [_OP, _RANDOM, _TUPLE]:
+        return _slots([b] + ([] if c is None else list(c.values())))
+    return []
+
+
+def _remap_spec(spec, alias):
+    kind = type(spec)
+    if kind is _Slot:
+        if spec.index in alias:
+            return _Slot(alias[spec.index])
+        return spec
+    elif kind is _Constant:
+        return spec
+    return kind([_remap_spec(item, alias) for item in spec])
+
+
+def _remap(instruction, alias):
+    kind, index, a, b, c = instruction
+    if kind in [_ITEM, _COPY]:
+        return (kind, index, alias.get(a, a), b, c)
+    elif kind in [_OP, _RANDOM, _TUPLE]:
+        if c is not None:
+            c = dict((name, _remap_spec(spec, alias))
+                     for name, spec in c.items())
+        return (kind, index, a, _remap_spec(b, alias), c)
+    return instruction
+
+
+def _rewrite(executor, program, alias):
+    """set the new program, replacing each aliased slot by its target"""
+    executor.program = [_remap(instruction, alias)
+                        for instruction in program]
+    executor.outputs = _remap_spec(executor.outputs, alias)
+
+
+def _constant_key(value):
+    """hashable (and equality safe) description of a constant argument"""
+    if isinstance(value, (list, tuple)):
+        return (type(value).__name__,) + tuple(_constant_key(v)
+                                               for v in value)
+    elif isinstance(value, slice):
+        return ('slice', _constant_key(value.start),
+                _constant_key(value.stop), _constant_key(value.step))
+    elif isinstance(value, numpy.ndarray):
+        return ('ndarray', value.shape, value.dtype.str, value.tobytes())
+    elif isinstance(value, numpy.generic):
+        return ('scalar', value.dtype.str, value.tobytes())
+    elif isinstance(value, (float, complex)):
+        # the bit patterns tell 0. and -0. apart
+        return (type(value), numpy.asarray(value).tobytes())
+    elif isinstance(value, (str, bool, int, type(None), type(Ellipsis),
+                            numpy.dtype, type)):
+        return (type(value), value)
+    # anything else is only equal to itself
+    return ('object', id(value))
+
+
+def _spec_key(spec):
+    kind = type(spec)
+    if kind is _Slot:
+        return ('slot', spec.index)
+    elif kind is _Constant:
+        return ('constant', _constant_key(spec.value))
+    return (kind.__name__,) + tuple(_spec_key(item) for item in spec)
+
+
+def common_subexpression_elimination(executor):
+    """merge the nodes computing the same function of the same inputs, the
+    nodes are hashed structurally from their function, their constant
+    arguments and their (already merged) input nodes. Random tensors are
+    never merged"""
+    alias = dict()
+    seen = dict()
+    program = list()
+    for instruction in executor.program:
+        instruction = _remap(instruction, alias)
+        kind, index, a, b, c = instruction
+        if kind == _COPY:
+            alias[index] = a
+            continue
+        if kind in [_OP, _TUPLE]:
+            kwargs = () if c is None else tuple(
+                (name, _spec_key(c[name])) for name in sorted(c))
+            key = (kind, a, _spec_key(b), kwargs)
+        elif kind == _ITEM:
+            key = (kind, a, b)
+        else:
+            key = None
+        if key is not None:
+            try:
+                if key in seen:
+                    alias[index] = seen[key]
+                    continue
+                seen[key] = index
+            except TypeError:
+                pass
+        program.append(instruction)
+    _rewrite(executor, program, alias)
+
+
+def fuse_value_and_gradients(executor):
+    """compute the tensors whose value is also given by a value and
+    gradients node (see :func:`symjax.value_and_gradients`) from that node,
+    the forward pass is then traced once for the outputs and the gradients.
+    The node is moved before the first of those tensors, this is only done if
+    all its inputs are computed before it. This pass must be applied before
+    the common subexpression elimination which could merge those tensors
+    with others"""
+    slots = dict((id(node), i) for i, node in enumerate(executor.nodes))
+    program = list(executor.program)
+    for instruction in executor.program:
+        kind, index = instruction[:2]
+        values = getattr(executor.nodes[index], 'value_of', None)
+        if kind != _TUPLE or values is None:
+            continue
+        positions = dict((instr[1], p) for p, instr in enumerate(program))
+        targets = [(item, slots[id(value)]) for item, value in
+                   enumerate(values) if value is not None and
+                   slots.get(id(value), None) in positions]
+        if len(targets) == 0:
+            continue
+        first = min(positions[slot] for item, slot in targets)
+        tuple_instruction = program[positions[index]]
+        if any(positions.get(slot, len(program)) >= first
+               for slot in _inputs(tuple_instruction)):
+            continue
+        fused = dict((slot, (_ITEM, slot, index, item, None))
+                     for item, slot in targets)
+        new_program = list()
+        for instr in program:
+            slot = instr[1]
+            if slot == index:
+                continue
+            elif slot in fused:
+                if positions[slot] == first:
+                    new_program.append(tuple_instruction)
+                new_program.append(fused[slot])
+            else:
+                new_program.append(instr)
+        program = new_program
+    executor.program = program
+
+
+def _is_scalar(spec, value):
+    if type(spec) is not _Constant or numpy.ndim(spec.value) != 0:
+        return False
+    try:
+        return bool(spec.value == value)
+    except Exception:
+        return False
+
+
+# (function, identity value, positions where the identity can be)
+_IDENTITIES = [(jnp.add, 0, [0, 1]), (jnp.subtract, 0, [1]),
+               (jnp.multiply, 1, [0, 1]), (jnp.true_divide, 1, [1]),
+               (jnp.divide, 1, [1]), (jnp.power, 1, [1])]
+
+
+def algebraic_simplification(executor):
+    """remove the ops that leave their input unchanged: addition or
+    subtraction of 0, multiplication or division by 1, power of 1, cast to
+    the same dtype and reshape to the same shape. An op is only removed if its
+    output has the same shape and dtype as its input"""
+    nodes = executor.nodes
+    alias = dict()
+    program = list()
+
+    def same(index, slot):
+        return nodes[index].shape == nodes[slot].shape and\
+            numpy.dtype(nodes[index].dtype) == numpy.dtype(nodes[slot].dtype)
+
+    for instruction in executor.program:
+        instruction = _remap(instruction, alias)
+        kind, index, a, b, c = instruction
+        target = None
+        if kind == _OP and c is None and type(b) is tuple:
+            for func, value, positions in _IDENTITIES:
+                if a is not func or len(b) != 2:
+                    continue
+                for position in positions:
+                    other = b[1 - position]
+                    if _is_scalar(b[position], value) and\
+                            type(other) is _Slot:
+                        target = other.index
+            if a in [jla.convert_element_type, jnp.reshape] and\
+                    len(b) == 2 and type(b[0]) is _Slot:
+                target = b[0].index
+        if target is not None and same(index, target):
+            alias[index] = target
+            continue
+        program.append(instruction)
+    _rewrite(executor, program, alias)
+
+
+def _size(node):
+    """the static number of elements of a node, None if unknown"""
+    shape = getattr(node, 'shape', None)
+    if shape is None:
+        return None
+    try:
+        return int(numpy.prod(shape))
+    except TypeError:
+        return None
+
+
+def constant_folding(executor, max_size=2 ** 18):
+    """evaluate once the nodes that do not depend on any input, variable or
+    random tensor and replace them by their value. The constant subgraph is
+    evaluated in a single jitted call, only the constants read by the rest
+    of the graph (or by the outputs) are kept. Constants larger than
+    max_size elements (including the items of the multiple outputs nodes)
+    are kept symbolic and computed from their own constant inputs"""
+    constant = set()
+    for instruction in executor.program:
+        kind, index = instruction[:2]
+        if kind == _CONSTANT:
+            constant.add(index)
+        elif kind not in [_GIVEN, _VARIABLE, _RANDOM] and\
+                all(slot in constant for slot in _inputs(instruction)):
+            constant.add(index)
+
+    # going backward, a constant read by a kept node is folded if it is
+    # small enough, otherwise it is kept and its inputs are read. The
+    # constants read by no kept node are only needed by folded ones
+    read = set(_slots([executor.outputs]))
+    folded, dropped = list(), set()
+    for instruction in reversed(executor.program):
+        kind, index = instruction[:2]
+        if index in constant and kind != _CONSTANT:
+            if index not in read:
+                dropped.add(index)
+                continue
+            size = _size(executor.nodes[index])
+            if kind != _TUPLE and size is not None and size <= max_size:
+                folded.append(index)
+                continue
+        read.update(_inputs(instruction))
+    if not folded:
+        return
+
+    # the constant instructions needed to compute the folded values
+    needed = set(folded)
+    subprogram = list()
+    for instruction in reversed(executor.program):
+        if instruction[1] in needed:
+            needed.update(_inputs(instruction))
+            subprogram.append(instruction)
+    subprogram = subprogram[::-1]
+
+    def evaluate():
+        values = [None] * len(executor.nodes)
+        for instruction in subprogram:
+            _execute(instruction, values, ())
+        return [values[index] for index in folded]
+
+    try:
+        results = jax.jit(evaluate)()
+    except Exception:
+        # ops requiring concrete values can not be traced
+        try:
+            results = evaluate()
+        except Exception:
+            return
+    results = dict(zip(folded, results))
+
+    program = list()
+    for instruction in executor.program:
+        index = instruction[1]
+        if index in results:
+            program.append((_CONSTANT, index, results[index], None, None))
+        elif index not in dropped:
+            program.append(instruction)
+    executor.program = program
+
+
+def dead_node_elimination(executor):
+    """remove the nodes that are not needed to compute the outputs"""
+    needed = set()
+    stack = [executor.outputs]
+    while stack:
+        spec = stack.pop()
+        if type(spec) is _Slot:
+            needed.add(spec.index)
+        elif type(spec) in [list, tuple]:
+            stack.extend(spec)
+    program = list()
+    for instruction in reversed(executor.program):
+        if instruction[1] in needed:
+            needed.update(_inputs(instruction))
+            program.append(instruction)
+    executor.program = program[::-1]
+
+
+PASSES = {'value_and_gradients': fuse_value_and_gradients,
+          'cse': common_subexpression_elimination,
+          'simplify': algebraic_simplification,
+          'constant_folding': constant_folding,
+          'dce': dead_node_elimination}
+
+DEFAULT_PASSES = ['value_and_gradients', 'cse', 'simplify',
+                  'constant_folding', 'dce']
+
+# the passes of the graphs wrapped at construction (gradients, jacobians,
+# checkpoints), which are traced again within the compiled functions. The
+# constants are folded by XLA when the function is compiled rather than
+# evaluated (and compiled) while the graph is built
+NESTED_PASSES = ['value_and_gradients', 'cse', 'simplify', 'dce']
+
+
+class PassReport:
+    """number of nodes removed and time spent by each pass of a pipeline
+
+    Attributes:
+    -----------
+
+        passes: list of (name, nodes before, nodes after, seconds)
+
+        nodes_before: int
+
+        nodes_after: int
+    """
+
+    def __init__(self):
+        self.passes = list()
+
+    @property
+    def nodes_before(self):
+        return self.passes[0][1] if len(self.passes) else 0
+
+    @property
+    def nodes_after(self):
+        return self.passes[-1][2] if len(self.passes) else 0
+
+    @property
+    def removed(self):
+        return self.nodes_before - self.nodes_after
+
+    def __repr__(self):
+        lines = ['{:<20}{:>8}{:>8}{:>12}'.format('pass', 'before', 'after',
+                                                 'time (ms)')]
+        for name, before, after, seconds in self.passes:
+            lines.append('{:<20}{:>8}{:>8}{:>12.2f}'.format(
+                name, before, after, seconds * 1000))
+        lines.append('removed {} nodes out of {}'.format(self.removed,
+                                                          self.nodes_before))
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.__repr__()
+
+
+def optimize(executor, passes=None):
+    """apply a pipeline of passes to the program of an executor
+
+    Parameters:
+    -----------
+
+        executor: Executor
+            the executor to rewrite in place
+
+        passes: list (optional)
+            the passes to apply in order, given either by their name in
+            PASSES or as callables taking the executor, defaults to
+            DEFAULT_PASSES
+
+    Returns:
+    --------
+
+        report: PassReport
+            the number of nodes before and after each pass
+    """
+    if passes is None:
+        passes = DEFAULT_PASSES
+    report = PassReport()
+    for p in passes:
+        if isinstance(p, str):
+            name, p = p, PASSES[p]
+        else:
+            name = getattr(p, '__name__', str(p))
+        before = len(executor.program)
+        t0 = time.time()
+        p(executor)
+        report.passes.append((name, before, len(executor.program),
+                              time.time() - t0))
+    return report
@@ -1,16 +1,17 @@
+import jax
 import jax.random as jnp
-from .base import jax_wrap
+from .base import jax_wrap, Variable
 import sys
 
 
 
-_RANDOM_FUNCTIONS = [jnp.bernoulli, jnp.beta, jnp.categorical, jnp.cauchy,
-                     jnp.dirichlet, jnp.exponential, jnp.gamma, jnp.gumbel,
-                     jnp.laplace, jnp.logistic,
-                     jnp.multivariate_normal, jnp.normal,
-                     jnp.pareto, jnp.permutation, jnp.poisson, jnp.randint,
-                     jnp.shuffle, jnp.t, jnp.threefry_2x32, jnp.truncated_normal,
-                     jnp.uniform]
+# the samplers of jax.random (shuffle and threefry_2x32 are only in older
+# versions)
+_RANDOM_FUNCTIONS = [getattr(jnp, name) for name in [
+    'bernoulli', 'beta', 'categorical', 'cauchy', 'dirichlet', 'exponential',
+    'gamma', 'gumbel', 'laplace', 'logistic', 'multivariate_normal', 'normal',
+    'pareto', 'permutation', 'poisson', 'randint', 'shuffle', 't',
+    'threefry_2x32', 'truncated_normal', 'uniform'] if hasattr(jnp, name)]
 
 
 
@@ -22,3 +23,57 @@ for name in _RANDOM_FUNCTIONS:
 
 randn = jax_wrap(jnp.normal)
 
+
+# the keys of the random tensors are derived from a single rng state, a
+# variable holding a PRNGKey that the functions (and the eager evaluations)
+# advance at each call, and the stable id of each random tensor: its seed if
+# given, otherwise its creation order counted from 2 ** 31 (thus never
+# colliding with seeds below 2 ** 31)
+_state = None
+_seed = 0
+_uid = 2 ** 31
+
+
+def get_state(create=True):
+    """the variable holding the rng state of all the random tensors
+
+    Parameters:
+    -----------
+
+        create: bool
+            whether the state is created if it does not exist yet, if False
+            None is returned in that case
+
+    Returns:
+    --------
+
+        state: Variable or None
+    """
+    global _state
+    if _state is None and create:
+        _state = Variable(jax.random.PRNGKey(_seed), name='rng_state',
+                          trainable=False)
+    return _state
+
+
+def seed(value):
+    """set the rng state to the PRNGKey of a seed, the random tensors drawn
+    afterwards (at each call of the functions) are reproducible"""
+    global _seed
+    _seed = value
+    if _state is not None:
+        _state.assign(jax.random.PRNGKey(value))
+
+
+def _next_uid():
+    global _uid
+    _uid += 1
+    return _uid
+
+
+def _advance(state):
+    return jax.random.split(state)[0]
+
+
+next_state = jax_wrap(_advance)
+